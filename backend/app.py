@@ -2,61 +2,279 @@
 API Flask en français pour l'Explorateur de Criminalité NYC.
 """
 
-from flask import Flask, request, jsonify
+import json
+import os
+import time
+from datetime import datetime
+from flask import Flask, Response, request, jsonify, stream_with_context
 from pymongo import MongoClient
 from math import ceil
-from query_utils import build_query
+from query_utils import build_filters, combine_filters
+from pagination import fetch_keyset_page, InvalidCursor
+from cache import DatasetGeneration, ResultCache, canonical_key
+from facettes import (
+    FacetStore, IndexCatalog, crossfilter_pipeline, crossfilter_pipelines, run_pipelines, should_fan_out,
+)
+from concurrence import en_parallele, en_parallele_dict, POOL_SIZE
+import metriques
+from metriques import MongoListener, phase
+from requetes_lentes import SlowQueryRecorder, SLOW_COLL_NAME, ranking as classement_lentes
+from vocabulaire import Vocabulary
+from serie import DailyRollup, GRANULARITES, ROLLUP_DIMENSIONS
+from bitmaps import BitmapStore, bitmap_dir
+from formes import ShapeRecorder
+from formats import (
+    ndjson_stream, arrow_stream, coords_buffer,
+    NDJSON_MIMETYPE, ARROW_MIMETYPE, COORDS_MIMETYPE, STREAM_BATCH_SIZE,
+)
+from memoire import (
+    MemoryBackend, FileGeneration, UnsupportedQuery, load_from_mongo, load_from_parquet,
+    BACKEND_ENV, SOURCE_ENV,
+)
+from spatial import (
+    cell_size_for_zoom, square_bins, hex_bins, tile_geojson,
+    MIN_CELL, MAX_CELL, TILES_COLL_NAME,
+)
 
-MONGO_URI = "mongodb://localhost:27017"
-DB_NAME = "nyc_crime"
+MONGO_URI = os.environ.get("NYC_CRIME_MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("NYC_CRIME_DB", "nyc_crime")
 COLL_NAME = "complaints"
 
+# Connexions MongoDB par processus : à dimensionner avec les threads du
+# serveur (gunicorn.conf.py) et le pool de fan-out (concurrence.py)
+MONGO_POOL_SIZE = int(os.environ.get("NYC_CRIME_MONGO_POOL", 100))
+
+# Moteur de /api/recherche, /api/carte et /api/facettes (cf. memoire.py)
+BACKEND = os.environ.get(BACKEND_ENV, "mongo")            # mongo | memoire
+MEMORY_SOURCE = os.environ.get(SOURCE_ENV, "mongo")       # mongo | chemin .parquet
+
 MAX_PAGE_SIZE = 10000  # Sécurité pagination
+COUNT_CAP = 100_000  # count=fast : au-delà, total plafonné (approximatif)
+
+# Champs d'un point de la carte (/api/carte, /api/recherche?mode=carte)
+CARTE_PROJECTION = {
+    "_id": 0,
+    "latitude": 1,
+    "longitude": 1,
+    "boro_nm": 1,
+    "ofns_desc": 1,
+    "cmplnt_fr_dt": 1,
+}
+
+# Cache de résultats (recherche, carte, agrégations)
+RESULT_CACHE_MAX_ENTRIES = 5_000
+RESULT_CACHE_MAX_WEIGHT = 2_000_000  # documents / cellules cumulés en mémoire
+RESULT_CACHE_TTL = 600               # secondes
 
 app = Flask(__name__)
-client = MongoClient(MONGO_URI)
-coll = client[DB_NAME][COLL_NAME]
+# Journal des requêtes lentes : alimenté par le listener de commandes
+listener = MongoListener()
+client = MongoClient(MONGO_URI, maxPoolSize=MONGO_POOL_SIZE, event_listeners=[listener])
+db = client[DB_NAME]
+slow_queries = SlowQueryRecorder(db)
+listener.observateur = slow_queries
+coll = db[COLL_NAME]
+
+tiles = db[TILES_COLL_NAME]
+
+if BACKEND == "memoire" and MEMORY_SOURCE != "mongo":
+    generation = FileGeneration(MEMORY_SOURCE)  # aucun accès MongoDB
+else:
+    generation = DatasetGeneration(db)
+count_cache = ResultCache(generation, max_entries=10_000, ttl=RESULT_CACHE_TTL, name="totaux")
+result_cache = ResultCache(
+    generation,
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    max_weight=RESULT_CACHE_MAX_WEIGHT,
+    ttl=RESULT_CACHE_TTL,
+)
+# fan-out : sous-requêtes indépendantes en parallèle (pool > 1 thread)
+fan_out = en_parallele_dict if POOL_SIZE > 1 else None
+facet_store = FacetStore(coll, db, generation)
+index_catalog = IndexCatalog(coll)
+vocabulary = Vocabulary(coll, generation)
+rollup = DailyRollup(db, generation)
+bitmaps = BitmapStore(generation, bitmap_dir(DB_NAME))
+shapes = ShapeRecorder(db)
+
+memory = None
+if BACKEND == "memoire":
+    if MEMORY_SOURCE == "mongo":
+        memory = MemoryBackend(lambda: load_from_mongo(coll), generation)
+    else:
+        memory = MemoryBackend(lambda: load_from_parquet(MEMORY_SOURCE), generation)
+    memory.store()  # chargement au démarrage plutôt qu'à la première requête
+
+
+# ------------------------------------------------------------
+# Instrumentation : durée par endpoint, phases -> en-tête Server-Timing
+#    (cf. metriques.py ; /api/metrics pour Prometheus)
+# ------------------------------------------------------------
+@app.before_request
+def debut_requete():
+    metriques.demarrer(request.url_rule.rule if request.url_rule else None)
+
+
+@app.after_request
+def fin_requete(response):
+    chrono = metriques.chrono_courant()
+    if chrono is None:
+        return response
+    total = time.perf_counter() - chrono.debut
+    endpoint = request.url_rule.rule if request.url_rule else "inconnu"
+    metriques.http_duree.observe(total, endpoint=endpoint, method=request.method, status=response.status_code)
+    for nom, (secondes, _) in list(chrono.phases.items()):
+        metriques.http_phase.observe(secondes, endpoint=endpoint, phase=nom)
+    response.headers["Server-Timing"] = chrono.server_timing(total)
+    return response
+
+
+@app.teardown_request
+def nettoyage_requete(exc=None):
+    metriques.terminer()
+
+
+@app.route("/api/metrics")
+def api_metrics():
+    return Response(metriques.registre.exposition(), mimetype=metriques.METRICS_MIMETYPE)
+
+
+# ------------------------------------------------------------
+# Requêtes lentes (au-delà de NYC_CRIME_SLOW_MS), classées par forme
+#    ?limit=20 &depuis=AAAA-MM-JJ
+# ------------------------------------------------------------
+@app.route("/api/requetes-lentes")
+def api_requetes_lentes():
+    limit = min(max(int(request.args.get("limit", 20)), 1), 500)
+    depuis = request.args.get("depuis")
+    try:
+        since = datetime.strptime(depuis, "%Y-%m-%d") if depuis else None
+    except ValueError:
+        return jsonify({"error": "depuis invalide (AAAA-MM-JJ)"}), 400
+    return jsonify({
+        "seuil_ms": slow_queries.seuil * 1000,
+        "ignorees": slow_queries.ignores,
+        "formes": classement_lentes(db[SLOW_COLL_NAME], limit, since),
+    })
+
+
+# ------------------------------------------------------------
+# Filtres de requête (build_filters + vocabulaire pour q_mode=vocab)
+# ------------------------------------------------------------
+def filtres_requete(args):
+    vocab = None
+    if args.get("q", "").strip():
+        vocab = memory.store().vocabulary() if memory else vocabulary.get()
+    return build_filters(args, vocab, std_fields=generation.std_fields())
+
+
+def requete_filtres(args, endpoint=None, keyset=False):
+    """Filtres par champ ; si `endpoint`, la forme est enregistrée (index
+    advisor, sans objet pour le moteur en mémoire)."""
+    filters = filtres_requete(args)
+    if endpoint and memory is None:
+        shapes.record(endpoint, filters, args, keyset=keyset)
+    return filters
+
+
+def requete(args, endpoint=None, keyset=False):
+    """Filtre MongoDB (cf. requete_filtres)."""
+    return combine_filters(requete_filtres(args, endpoint, keyset).values())
+
+
+@app.errorhandler(UnsupportedQuery)
+def filtre_non_supporte(e):
+    return jsonify({"error": str(e)}), 400
+
+
+# ------------------------------------------------------------
+# Total des résultats
+#    count=exact (défaut) : count_documents, mis en cache par filtre
+#    count=fast : estimated_document_count sans filtre, sinon comptage
+#                 plafonné à COUNT_CAP (total_type="capped" si atteint)
+#    Filtres purement catégoriels : popcount sur l'index bitmap (exact,
+#    quel que soit count) s'il existe pour la génération courante
+# ------------------------------------------------------------
+def compter(q, fast=False, filters=None):
+    """Retourne (total, total_type) avec total_type in exact|estimated|capped.
+    `filters` : filtres par champ de `q`, pour tenter l'index bitmap."""
+    if memory:
+        return memory.store().count(q), "exact"  # masque : toujours exact
+
+    index = bitmaps.get() if filters is not None else None
+    if index is not None and index.can_answer(filters):
+        return index.count(filters), "exact"
+
+    cached = count_cache.get(q)
+    if cached is not None:
+        return cached, "exact"
+
+    def count():
+        if fast:
+            if not q:
+                return coll.estimated_document_count(), "estimated"
+            total = coll.count_documents(q, limit=COUNT_CAP)
+            if total >= COUNT_CAP:
+                return total, "capped"
+            count_cache.put(q, total)
+            return total, "exact"
+
+        total = coll.count_documents(q)
+        count_cache.put(q, total)
+        return total, "exact"
+
+    # requêtes identiques simultanées : un seul count_documents
+    return count_cache.flight.do(canonical_key(("compte", q, fast)), count)
 
 
 # ------------------------------------------------------------
 # Facettes : valeurs distinctes pour alimenter les filtres UI
+#    Une seule passe ($facet), en cache jusqu'au prochain rechargement
 # ------------------------------------------------------------
 @app.route("/api/facettes")
 def api_facettes():
-    def agg(field, limit=None):
-        pipeline = [
-            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-        ]
-        if limit:
-            pipeline.append({"$limit": limit})
-        return list(coll.aggregate(pipeline))
-
-    facettes = {
-        "boro_nm": agg("boro_nm"),
-        "law_cat_cd": agg("law_cat_cd"),
-        "crm_atpt_cptd_cd": agg("crm_atpt_cptd_cd"),
-        # Victime (brut)
-        "vic_race": agg("vic_race"),
-        "vic_sex": agg("vic_sex"),
-        "vic_age_group": agg("vic_age_group"),
-        # Suspect (brut)
-        "susp_race": agg("susp_race"),
-        "susp_sex": agg("susp_sex"),
-        "susp_age_group": agg("susp_age_group"),
-        # Infractions
-        "ofns_desc": agg("ofns_desc", limit=100),
-    }
+    if memory:
+        return jsonify(memory.store().facets())
+    index = bitmaps.get()
+    if index is not None and index.serves_facets():
+        return jsonify(index.facets())
+    return jsonify(facet_store.get())
+
+
+# ------------------------------------------------------------
+# Facettes croisées : effectifs de chaque facette sous tous les
+# autres filtres actifs (mêmes paramètres que /api/recherche)
+# ------------------------------------------------------------
+@app.route("/api/facettes/filtrees")
+def api_facettes_filtrees():
+    filters = filtres_requete(request.args)
+    index = None if memory else bitmaps.get()
+    if memory:
+        compute = lambda: memory.store().crossfilter(filters)  # noqa: E731
+    elif index is not None and index.serves_facets() and index.can_answer(filters):
+        compute = lambda: index.crossfilter(filters)  # noqa: E731
+    elif fan_out and should_fan_out(filters, index_catalog.leading()):
+        compute = lambda: run_pipelines(coll, crossfilter_pipelines(filters), fan_out)  # noqa: E731
+    else:
+        compute = lambda: next(coll.aggregate(crossfilter_pipeline(filters), allowDiskUse=True))  # noqa: E731
+    with phase("facettes"):
+        facettes = result_cache.get_or_compute(("facettes", list(filters.values())), compute)
     return jsonify(facettes)
 
 
 # ------------------------------------------------------------
 # Recherche paginée (table)
+#    ?pagination=offset (défaut) : skip/limit classique, coût O(skip)
+#    ?pagination=keyset : tri (cmplnt_fr_dt, _id) + jetons next/prev
+#        &after=<next>  -> page suivante, coût constant
+#        &before=<prev> -> page précédente, coût constant
+#        &page=N seul   -> accès direct, coût O((N-1) * page_size)
 # ------------------------------------------------------------
 @app.route("/api/recherche")
 def api_recherche():
     args = request.args
-    q = build_query(args)
+    filters = requete_filtres(args, "recherche", keyset=args.get("pagination") == "keyset")
+    q = combine_filters(filters.values())
 
     page = int(float(args.get("page", 1)))
     page_size = int(float(args.get("page_size", 1000)))
@@ -69,14 +287,7 @@ def api_recherche():
     mode = args.get("mode", "table")
 
     if mode == "carte":
-        projection = {
-            "_id": 0,
-            "latitude": 1,
-            "longitude": 1,
-            "boro_nm": 1,
-            "ofns_desc": 1,
-            "cmplnt_fr_dt": 1,
-        }
+        projection = CARTE_PROJECTION
     elif mode == "table":
         projection = {
             "_id": 0,
@@ -86,47 +297,126 @@ def api_recherche():
             "crm_atpt_cptd_cd": 1,
             "vic_age_group": 1, "vic_sex": 1, "vic_race": 1,
             "susp_age_group": 1, "susp_sex": 1, "susp_race": 1,
+            "vic_age_approx": 1, "susp_age_approx": 1,  # champs du loader (si présents)
             "prem_typ_desc": 1,
             "latitude": 1, "longitude": 1,
         }
     else:
         projection = None
 
-    total = coll.count_documents(q)
+    pagination = args.get("pagination", "offset")
+    fast = args.get("count") == "fast"
+    after = args.get("after")
+    before = args.get("before")
 
-    cursor = coll.find(q, projection).skip(skip).limit(page_size)
-    docs = list(cursor)
+    def page_docs():
+        """(docs, next, prev) de la page demandée."""
+        if memory:
+            store = memory.store()
+            fields = _champs(projection, ()) if projection else None
+            if pagination == "keyset":
+                return store.keyset_page(
+                    q, fields, page_size, after=after, before=before, skip=skip,
+                )
+            return store.find(q, fields, skip=skip, limit=page_size), None, None
+        if pagination == "keyset":
+            return fetch_keyset_page(
+                coll, q, projection, page_size,
+                after=after,
+                before=before,
+                skip=skip,
+            )
+        cursor = coll.find(q, projection).skip(skip).limit(page_size)
+        return list(cursor), None, None
 
-    total_pages = ceil(total / page_size) if page_size else 1
+    def page_payload():
+        # total et page sont indépendants : lancés en parallèle
+        def compte():
+            with phase("compte"):
+                return compter(q, fast=fast, filters=filters)
 
-    return jsonify({
-        "total": total,
-        "page": page,
-        "page_size": page_size,
-        "total_pages": total_pages,
-        "mode": mode,
-        "data": docs,
-    })
+        def lire_page():
+            with phase("page"):
+                return page_docs()
+
+        (total, total_type), (docs, next_token, prev_token) = en_parallele(compte, lire_page)
+
+        total_pages = ceil(total / page_size) if page_size else 1
+
+        return {
+            "total": total,
+            "total_type": total_type,
+            "approximate": total_type != "exact",
+            "page": page,
+            "page_size": page_size,
+            "total_pages": total_pages,
+            "mode": mode,
+            "pagination": pagination,
+            "next": next_token,
+            "prev": prev_token,
+            "data": docs,
+        }
+
+    key = ("recherche", q, mode, pagination, page, page_size, after, before, fast)
+    try:
+        payload = result_cache.get_or_compute(key, page_payload, weigh=lambda p: len(p["data"]))
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    if args.get("format") == "arrow":
+        # page en colonnes ; le reste de l'enveloppe dans les métadonnées du schéma
+        docs = payload["data"]
+        meta = {k: v for k, v in payload.items() if k != "data"}
+        stream = arrow_stream(docs, _champs(projection, docs), meta)
+        return Response(stream, mimetype=ARROW_MIMETYPE)
+    with phase("serialisation"):
+        return jsonify(payload)
+
+
+def _champs(projection, docs):
+    """Champs d'une réponse colonnaire : ceux de la projection, sinon ceux
+    rencontrés dans les documents (dans l'ordre d'apparition)."""
+    if projection:
+        return [f for f, v in projection.items() if v and f != "_id"]
+    seen = {}
+    for d in docs:
+        seen.update(dict.fromkeys(d))
+    return [f for f in seen if f != "_id"]
 
 
 # ------------------------------------------------------------
 # Carte : tous les points filtrés (⚠️ perfs selon volume)
 #    Optionnel: ?sample=N pour limiter
+#    Optionnel: ?format=ndjson pour un flux (un point par ligne),
+#               ?format=arrow pour un flux Arrow IPC (colonnes typées),
+#               mémoire serveur constante quel que soit le volume
 # ------------------------------------------------------------
+def _carte_response(cursor, fmt):
+    """`cursor` : curseur Mongo ou liste de documents déjà en cache."""
+    if fmt == "ndjson":
+        stream = ndjson_stream(cursor, app.json.dumps)
+        return Response(stream_with_context(stream), mimetype=NDJSON_MIMETYPE)
+    if fmt == "arrow":
+        stream = arrow_stream(cursor, _champs(CARTE_PROJECTION, ()))
+        return Response(stream_with_context(stream), mimetype=ARROW_MIMETYPE)
+    with phase("lecture"):
+        docs = list(cursor)
+    with phase("serialisation"):
+        return jsonify(docs)
+
+
 @app.route("/api/carte")
 def api_carte():
     args = request.args
-    q = build_query(args)
+    q = requete(args, "carte")
 
+    fmt = args.get("format", "json")
     sample = args.get("sample")
-    projection = {
-        "_id": 0,
-        "latitude": 1,
-        "longitude": 1,
-        "boro_nm": 1,
-        "ofns_desc": 1,
-        "cmplnt_fr_dt": 1,
-    }
+    projection = CARTE_PROJECTION
+
+    if memory:
+        # masque + décodage des seules colonnes utiles : pas de cache nécessaire
+        s = int(sample) if sample and sample.isdigit() and int(sample) > 0 else None
+        return _carte_response(memory.store().find(q, _champs(projection, ()), sample=s), fmt)
 
     if sample:
         try:
@@ -137,14 +427,210 @@ def api_carte():
                     {"$sample": {"size": s}},
                     {"$project": projection},
                 ]
-                docs = list(coll.aggregate(pipeline))
-                return jsonify(docs)
+                cursor = coll.aggregate(pipeline, batchSize=STREAM_BATCH_SIZE)
+                return _carte_response(cursor, fmt)
         except Exception:
             pass
 
-    # Full
-    docs = list(coll.find(q, projection))
-    return jsonify(docs)
+    # Full : depuis le cache si présent ; les flux (NDJSON, Arrow) ne
+    # matérialisent jamais le résultat, ils n'alimentent donc pas le cache
+    # (ni la coalescence : chaque flux a son propre curseur)
+    key = ("carte", q)
+    docs = result_cache.get(key)
+    if docs is not None:
+        return _carte_response(docs, fmt)
+    if fmt in ("ndjson", "arrow"):
+        cursor = coll.find(q, projection).batch_size(STREAM_BATCH_SIZE)
+        return _carte_response(cursor, fmt)
+    docs = result_cache.get_or_compute(
+        key, lambda: list(coll.find(q, projection).batch_size(STREAM_BATCH_SIZE)), weigh=len,
+    )
+    return _carte_response(docs, fmt)
+
+
+# ------------------------------------------------------------
+# Carte : coordonnées seules, en binaire
+#    Corps : float32 little-endian (lon, lat) x N, puis, avec
+#    ?categorie=<champ>, N codes uint8. En-têtes :
+#      X-Points : N
+#      X-Categories : JSON [valeur du code 0, du code 1, ...]
+#    8 octets par point (9 avec catégorie) contre ~150 en JSON.
+# ------------------------------------------------------------
+COORDS_CATEGORY_FIELDS = {"boro_nm", "law_cat_cd", "crm_atpt_cptd_cd", "ofns_desc"}
+
+
+@app.route("/api/carte/coords")
+def api_carte_coords():
+    args = request.args
+    q = requete(args, "carte")
+
+    categorie = args.get("categorie") or None
+    if categorie and categorie not in COORDS_CATEGORY_FIELDS:
+        return jsonify({"error": f"categorie parmi {sorted(COORDS_CATEGORY_FIELDS)}"}), 400
+
+    def compute():
+        if memory:
+            return memory.store().coords(q, categorie)
+        projection = {"_id": 0, "longitude": 1, "latitude": 1}
+        if categorie:
+            projection[categorie] = 1
+        cursor = coll.find(q, projection).batch_size(STREAM_BATCH_SIZE)
+        return coords_buffer(cursor, categorie)
+
+    body, n, categories = result_cache.get_or_compute(
+        ("carte_coords", q, categorie), compute, weigh=lambda r: r[1]
+    )
+    resp = Response(body, mimetype=COORDS_MIMETYPE)
+    resp.headers["X-Points"] = str(n)
+    if categorie:
+        resp.headers["X-Categories"] = json.dumps(categories)
+    return resp
+
+
+# ------------------------------------------------------------
+# Densité : comptes agrégés par cellule (carte de chaleur)
+#    ?zoom=Z (défaut 11) ou ?cell=<degrés> ; ?shape=square|hex
+#    Mêmes filtres que /api/recherche.
+# ------------------------------------------------------------
+@app.route("/api/densite")
+def api_densite():
+    args = request.args
+    q = requete(args, "densite")
+
+    shape = args.get("shape", "square")
+    if shape not in ("square", "hex"):
+        return jsonify({"error": f"shape inconnu : {shape}"}), 400
+
+    try:
+        if args.get("cell"):
+            cell = min(max(float(args["cell"]), MIN_CELL), MAX_CELL)
+        else:
+            cell = cell_size_for_zoom(int(float(args.get("zoom", 11))))
+    except ValueError:
+        return jsonify({"error": "zoom/cell invalide"}), 400
+
+    binner = hex_bins if shape == "hex" else square_bins
+    cells = result_cache.get_or_compute(
+        ("densite", q, shape, cell),
+        lambda: binner(coll, q, cell),
+        weigh=len,
+    )
+
+    return jsonify({
+        "shape": shape,
+        "cell": cell,
+        "total": sum(c["count"] for c in cells),
+        "cells": cells,
+    })
+
+
+# ------------------------------------------------------------
+# Série temporelle : nombre de plaintes par période
+#    ?granularite=jour|semaine|mois|annee (défaut mois)
+#    ?par=boro_nm|law_cat_cd|ofns_desc|crm_atpt_cptd_cd : une série par valeur
+#    Mêmes filtres que /api/recherche ; servie par l'agrégat journalier
+#    (serie_jour) si les filtres le permettent, sinon par $dateTrunc.
+# ------------------------------------------------------------
+@app.route("/api/serie")
+def api_serie():
+    args = request.args
+    filters = filtres_requete(args)
+    if not rollup.serves(filters):
+        # forme enregistrée seulement si la série est lue sur complaints
+        shapes.record("serie", filters, args)
+    q = combine_filters(filters.values())
+
+    granularite = args.get("granularite", "mois")
+    if granularite not in GRANULARITES:
+        return jsonify({"error": f"granularite parmi {list(GRANULARITES)}"}), 400
+    par = args.get("par") or None
+    if par and par not in ROLLUP_DIMENSIONS:
+        return jsonify({"error": f"par parmi {ROLLUP_DIMENSIONS}"}), 400
+
+    points, source = result_cache.get_or_compute(
+        ("serie", q, granularite, par),
+        lambda: rollup.series(coll, filters, q, GRANULARITES[granularite], par),
+        weigh=lambda r: len(r[0]),
+    )
+    return jsonify({
+        "granularite": granularite,
+        "par": par,
+        "source": source,
+        "total": sum(p["count"] for p in points),
+        "points": points,
+    })
+
+
+# ------------------------------------------------------------
+# Caches : statistiques et invalidation explicite
+#    (le rechargement des données les invalide déjà via la génération)
+# ------------------------------------------------------------
+@app.route("/api/cache")
+def api_cache():
+    return jsonify({
+        "generation": generation.current(),
+        "resultats": result_cache.stats(),
+        "totaux": count_cache.stats(),
+        "facettes": facet_store.flight.stats(),
+        "bitmaps": None if memory else _bitmaps_stats(),
+    })
+
+
+def _bitmaps_stats():
+    index = bitmaps.get()
+    if index is None:
+        return None
+    return {"documents": index.n, "bitmaps": sum(len(v) for v in index.bitmaps.values())}
+
+
+@app.route("/api/cache/invalider", methods=["POST"])
+def api_cache_invalider():
+    generation.refresh()
+    result_cache.clear()
+    count_cache.clear()
+    facet_store.clear()
+    vocabulary.clear()
+    rollup.clear()
+    bitmaps.clear()
+    if memory:
+        memory.clear()
+    return jsonify({"generation": generation.current(), "ok": True})
+
+
+# ------------------------------------------------------------
+# Tuiles précalculées (scripts/build_tiles.py)
+#    /api/tuiles/{z}/{x}/{y}?borough=...&law_cat_cd=...&year=2019,2020
+#    Lecture d'un seul document par _id : latence constante.
+# ------------------------------------------------------------
+TILE_MAX_AGE = 3600  # Cache-Control navigateur (s)
+
+
+@app.route("/api/tuiles/meta")
+def api_tuiles_meta():
+    meta = db["meta"].find_one({"_id": TILES_COLL_NAME}, {"_id": 0}) or {}
+    meta["a_jour"] = bool(meta) and meta.get("generation") == generation.current()
+    return jsonify(meta)
+
+
+@app.route("/api/tuiles/<int:z>/<int:x>/<int:y>")
+def api_tuiles(z, x, y):
+    args = request.args
+
+    def _liste(name):
+        v = args.get(name)
+        return {s.strip().upper() for s in v.split(",") if s.strip()} if v else None
+
+    try:
+        years = {int(v) for v in _liste("year") or ()} or None
+    except ValueError:
+        return jsonify({"error": "year invalide"}), 400
+
+    doc = tiles.find_one({"_id": f"{z}/{x}/{y}"})
+    resp = jsonify(tile_geojson(doc, _liste("borough"), _liste("law_cat_cd"), years))
+    resp.headers["Cache-Control"] = f"public, max-age={TILE_MAX_AGE}"
+    # chargées directement par deck.gl depuis la page Streamlit (autre origine)
+    resp.headers["Access-Control-Allow-Origin"] = "*"
+    return resp
 
 
 if __name__ == "__main__":
@@ -0,0 +1,239 @@
+"""
+Index bitmap des dimensions catégorielles : comptes filtrés instantanés.
+
+Un bitmap par (champ, valeur) : bit i = le document i a cette valeur
+(np.packbits, 1 bit par document, non compressé en mémoire). Un filtre
+$in / égalité de build_filters (borough, catégorie, sexe, âge, race…)
+devient un OU des bitmaps de ses valeurs, les filtres se combinent par ET,
+et le total est un popcount : aucun document n'est relu.
+
+Champs indexés : ceux des facettes (bruts) et les champs standardisés.
+Un champ absent, null ou NaN est rangé sous la seule valeur None, comme
+le fait $group (facettes) ; build_filters ne filtre ces champs que sur des
+chaînes non nulles, donc aucun total ne dépend de cette confusion.
+
+Sert les totaux de /api/recherche et les facettes (globales et croisées)
+dès que tous les filtres actifs sont indexés ; sinon (dates, texte…)
+les requêtes passent par MongoDB.
+
+Construit à la demande par scripts/load_csv_to_mongo.py --bitmaps, et
+persisté (npz compressé) sous BITMAP_DIR/<base>, un fichier par génération
+du jeu de données ; le backend ne charge que celui de la génération courante
+(tant qu'il manque, sa présence est revérifiée toutes les BITMAP_RECHECK_S
+secondes).
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from facettes import FACET_FIELDS
+
+BITMAP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "bitmaps")
+READ_BATCH = 100_000
+BITMAP_RECHECK_S = 5  # index absent : fichier recherché au plus toutes les N secondes
+
+# Champs indexés : facettes + champs standardisés (filtres sexe / âge)
+BITMAP_FIELDS = list(FACET_FIELDS) + ["vic_sex_std", "vic_age_std", "susp_sex_std", "susp_age_std"]
+
+if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+    def popcount(bits):
+        return int(np.bitwise_count(bits).sum(dtype=np.int64))
+else:
+    _POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(bits):
+        return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+
+def bitmap_dir(db_name):
+    """Répertoire des index d'une base (une base de bench ne touche pas aux
+    fichiers de la base principale)."""
+    return os.path.join(BITMAP_DIR, db_name)
+
+
+def bitmap_path(generation, directory=BITMAP_DIR):
+    return os.path.join(directory, f"bitmaps-{generation}.npz")
+
+
+def _value(v):
+    """NaN -> None : une seule catégorie « absent » (NaN != NaN ferait une
+    clé de dictionnaire par document)."""
+    return None if v != v else v
+
+
+class BitmapIndex:
+    def __init__(self, n, bitmaps):
+        self.n = n
+        self.bitmaps = bitmaps  # champ -> {valeur (None = absent) -> bits}
+        self._nbytes = (n + 7) // 8
+        self._totals = {f: {v: popcount(b) for v, b in vals.items()} for f, vals in bitmaps.items()}
+
+    # ---------------- construction / persistance ----------------
+    @classmethod
+    def from_mongo(cls, coll, batch_size=READ_BATCH):
+        """Lecture des seuls BITMAP_FIELDS, par lots : en mémoire, un code
+        (int16) par document et par champ, puis les bitmaps."""
+        categories = {f: {} for f in BITMAP_FIELDS}  # champ -> {valeur -> code}
+        parts = {f: [] for f in BITMAP_FIELDS}
+        batch = []
+
+        def flush():
+            for field in BITMAP_FIELDS:
+                cats = categories[field]
+                parts[field].append(np.fromiter(
+                    (cats.setdefault(_value(d.get(field)), len(cats)) for d in batch),
+                    dtype=np.int16, count=len(batch),
+                ))
+            batch.clear()
+
+        projection = dict.fromkeys(BITMAP_FIELDS, 1)
+        for doc in coll.find({}, projection).batch_size(batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        n = sum(len(p) for p in parts[BITMAP_FIELDS[0]])
+        bitmaps = {}
+        for field in BITMAP_FIELDS:
+            codes = np.concatenate(parts.pop(field)) if n else np.empty(0, dtype=np.int16)
+            bitmaps[field] = {v: np.packbits(codes == c) for v, c in categories[field].items()}
+        return cls(n, bitmaps)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {"n": self.n, "fields": {}}
+        arrays = {}
+        for field, vals in self.bitmaps.items():
+            meta["fields"][field] = list(vals)
+            for i, bits in enumerate(vals.values()):
+                arrays[f"{field}__{i}"] = bits
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, path)  # jamais de fichier à moitié écrit
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            bitmaps = {
+                field: {v: data[f"{field}__{i}"] for i, v in enumerate(values)}
+                for field, values in meta["fields"].items()
+            }
+        return cls(meta["n"], bitmaps)
+
+    # ---------------- évaluation ----------------
+    @staticmethod
+    def _clause_values(clause):
+        """(champ, valeurs) d'une clause {champ: {"$in": [...]}} ou {champ: v}."""
+        if not isinstance(clause, dict) or len(clause) != 1:
+            return None, None
+        field, cond = next(iter(clause.items()))
+        if isinstance(cond, dict):
+            if list(cond) != ["$in"]:
+                return None, None
+            return field, cond["$in"]
+        return field, [cond]
+
+    def can_answer(self, filters):
+        for clause in filters.values():
+            field, values = self._clause_values(clause)
+            if field not in self.bitmaps:
+                return False
+        return True
+
+    def serves_facets(self):
+        """Toutes les facettes indexées ? (pas un index d'une version
+        antérieure limité aux champs standardisés)"""
+        return all(f in self.bitmaps for f in FACET_FIELDS)
+
+    def _clause_bits(self, clause):
+        field, values = self._clause_values(clause)
+        out = np.zeros(self._nbytes, dtype=np.uint8)
+        for v in values:
+            bits = self.bitmaps[field].get(v)
+            if bits is not None:
+                out |= bits
+        return out
+
+    def _and(self, clauses):
+        """ET des clauses ; None si aucune (tous les documents)."""
+        out = None
+        for clause in clauses:
+            bits = self._clause_bits(clause)
+            out = bits if out is None else out & bits
+        return out
+
+    def count(self, filters):
+        bits = self._and(filters.values())
+        return self.n if bits is None else popcount(bits)
+
+    def _counts(self, field, bits, limit=None):
+        if bits is None:
+            counts = self._totals[field]
+        else:
+            counts = {v: popcount(b & bits) for v, b in self.bitmaps[field].items()}
+        out = [{"_id": v, "count": c} for v, c in counts.items() if c]
+        out.sort(key=lambda d: -d["count"])
+        return out[:limit] if limit else out
+
+    def facets(self):
+        """Même forme que facettes.facet_pipeline (sans filtre)."""
+        return {f: self._counts(f, None, limit) for f, limit in FACET_FIELDS.items()}
+
+    def crossfilter(self, filters):
+        """Même résultat que facettes.crossfilter_pipeline : chaque facette
+        sous tous les autres filtres (ceux des champs standardisés compris)."""
+        return {
+            field: self._counts(field, self._and(c for f, c in filters.items() if f != field))
+            for field in FACET_FIELDS
+        }
+
+
+def build_and_save(coll, generation, directory=BITMAP_DIR):
+    """Construit l'index de `coll`, l'écrit pour `generation` et
+    supprime les fichiers des générations précédentes."""
+    index = BitmapIndex.from_mongo(coll)
+    path = bitmap_path(generation, directory)
+    index.save(path)
+    for old in glob.glob(os.path.join(directory, "bitmaps-*.npz")):
+        if os.path.abspath(old) != os.path.abspath(path):
+            os.remove(old)
+    return index
+
+
+class BitmapStore:
+    """Index de la génération courante, s'il a été construit (sinon None).
+
+    Une absence n'est pas mémorisée pour toute la génération : le loader
+    écrit le fichier après avoir changé de génération, et le backend ne
+    peut pas toujours être prévenu."""
+
+    def __init__(self, generation, directory=BITMAP_DIR, recheck=BITMAP_RECHECK_S):
+        self.generation = generation
+        self.directory = directory
+        self.recheck = recheck
+        self._gen = object()  # sentinelle : rien en cache
+        self._index = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        gen = self.generation.current()
+        now = time.monotonic()
+        with self._lock:
+            if gen != self._gen or (self._index is None and now - self._checked >= self.recheck):
+                path = bitmap_path(gen, self.directory)
+                self._index = BitmapIndex.load(path) if gen is not None and os.path.exists(path) else None
+                self._gen, self._checked = gen, now
+            return self._index
+
+    def clear(self):
+        with self._lock:
+            self._gen, self._index, self._checked = object(), None, 0.0
@@ -0,0 +1,208 @@
+"""
+Caches côté serveur pour l'API.
+
+- canonical_key : forme canonique (stable) d'un filtre MongoDB, pour que
+  deux requêtes équivalentes partagent la même entrée de cache.
+- DatasetGeneration : tampon de génération du jeu de données, écrit par
+  scripts/load_csv_to_mongo.py dans la collection `meta`. Tout cache
+  indexé par ce tampon est de fait invalidé à chaque rechargement.
+- ResultCache : résultats (totaux, pages, agrégations…) par clé
+  canonique, LRU borné en entrées et en poids, avec TTL et compteurs ;
+  les calculs simultanés d'une même clé sont coalescés (singleflight.py).
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date
+
+from singleflight import SingleFlight
+
+META_COLL_NAME = "meta"
+DATASET_META_ID = "dataset"
+
+
+# ------------------------------------------------------------
+# Clé canonique
+# ------------------------------------------------------------
+def _sort_key(v):
+    return json.dumps(v, sort_keys=True, default=str)
+
+
+def _canonical(obj):
+    if isinstance(obj, dict):
+        out = {}
+        for k in sorted(obj):
+            v = _canonical(obj[k])
+            if k in ("$in", "$nin", "$and", "$or", "$all") and isinstance(v, list):
+                # l'ordre des valeurs / clauses ne change pas le résultat
+                v = sorted(v, key=_sort_key)
+            out[k] = v
+        return out
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(v) for v in obj]
+    if isinstance(obj, (datetime, date)):
+        return {"$date": obj.isoformat()}
+    return obj
+
+
+def canonical_key(obj) -> str:
+    """Sérialisation JSON canonique d'un filtre (clés triées, $in triés…)."""
+    return json.dumps(_canonical(obj), sort_keys=True, separators=(",", ":"), default=str)
+
+
+# ------------------------------------------------------------
+# Génération du jeu de données
+# ------------------------------------------------------------
+class DatasetGeneration:
+    """Lit le tampon de génération dans `meta`, au plus toutes les
+    `check_interval` secondes (évite un aller-retour Mongo par requête)."""
+
+    def __init__(self, db, check_interval=5.0):
+        self.meta = db[META_COLL_NAME]
+        self.check_interval = check_interval
+        self._value = None
+        self._std_fields = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _read(self):
+        """À appeler sous verrou : relit le document meta si nécessaire."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            doc = self.meta.find_one({"_id": DATASET_META_ID}, {"generation": 1, "champs_std": 1}) or {}
+            self._value = doc.get("generation")
+            self._std_fields = bool(doc.get("champs_std"))
+            self._checked_at = now
+
+    def current(self):
+        with self._lock:
+            self._read()
+            return self._value
+
+    def std_fields(self):
+        """Vrai si tous les documents portent les champs standardisés
+        (vic_sex_std, vic_age_std…) écrits par le loader."""
+        with self._lock:
+            self._read()
+            return self._std_fields
+
+    def refresh(self):
+        """Force la relecture du tampon au prochain current()."""
+        with self._lock:
+            self._checked_at = 0.0
+
+
+# ------------------------------------------------------------
+# Cache de résultats (LRU + TTL + borne mémoire)
+# ------------------------------------------------------------
+class ResultCache:
+    """Résultats par clé canonique, pour la génération courante du jeu de données.
+
+    - LRU borné en nombre d'entrées ET en poids total (`weight` fourni à
+      put : nombre de documents / cellules du résultat) ;
+    - TTL : une entrée plus vieille que `ttl` secondes est ignorée ;
+    - vidé dès qu'une nouvelle génération est détectée (rechargement),
+      ou explicitement via clear() ;
+    - compteurs hits / misses / evictions (stats()) ;
+    - get_or_compute : un seul compute() à la fois par clé, les requêtes
+      concurrentes de même clé attendent et partagent son résultat.
+
+    `q` peut être tout objet canonisable : un filtre, ou un tuple
+    (usage, filtre, paramètres) pour séparer les endpoints.
+    """
+
+    def __init__(self, generation: DatasetGeneration, max_entries=10_000,
+                 max_weight=None, ttl=None, name="resultats"):
+        self.generation = generation
+        self.flight = SingleFlight(name)
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.ttl = ttl
+        self._data = OrderedDict()  # clé -> (valeur, poids, expire_at)
+        self._gen = None
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _sync_generation(self):
+        """À appeler sous verrou : purge tout si la génération a changé."""
+        gen = self.generation.current()
+        if gen != self._gen:
+            self._data.clear()
+            self._weight = 0
+            self._gen = gen
+
+    def get(self, q):
+        key = canonical_key(q)
+        with self._lock:
+            self._sync_generation()
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, q, value, weight=1):
+        if self.max_weight is not None and weight > self.max_weight:
+            return  # trop gros pour être mis en cache
+        key = canonical_key(q)
+        expire_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._sync_generation()
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, weight, expire_at)
+            self._weight += weight
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_weight is not None and self._weight > self.max_weight)
+            ):
+                old_key = next(iter(self._data))
+                self._remove(old_key)
+                self.evictions += 1
+
+    def get_or_compute(self, q, compute, weigh=None):
+        """Valeur en cache, sinon compute() (puis mise en cache), une seule
+        fois pour toutes les requêtes concurrentes de même clé."""
+        value = self.get(q)
+        if value is not None:
+            return value
+
+        def run():
+            value = compute()
+            self.put(q, value, weigh(value) if weigh else 1)
+            return value
+
+        return self.flight.do(canonical_key(q), run)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def _remove(self, key):
+        _, weight, _ = self._data.pop(key)
+        self._weight -= weight
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "weight": self._weight,
+                "max_entries": self.max_entries,
+                "max_weight": self.max_weight,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "single_flight": self.flight.stats(),
+            }
@@ -0,0 +1,73 @@
+"""
+Exécution concurrente des sous-requêtes indépendantes d'une requête HTTP.
+
+PyMongo est synchrone mais libère le GIL pendant l'attente réseau : lancer
+count + find, ou une agrégation par facette, sur un pool de threads borné
+ramène la latence d'un endpoint à celle de sa sous-requête la plus lente
+au lieu de leur somme.
+
+- Pool unique par processus, borné (NYC_CRIME_POOL, défaut FAN_OUT_DEFAULT) :
+  au-delà, les tâches attendent leur tour au lieu de saturer MongoDB.
+- Chaque tâche s'exécute dans une copie du contexte appelant (contextvars),
+  donc avec le même contexte de requête / d'application Flask.
+- Appelée depuis un thread du pool (fan-out imbriqué), l'exécution est
+  séquentielle : un parent qui attend ses enfants n'occupe pas les places
+  dont ils auraient besoin (pas d'interblocage).
+- NYC_CRIME_POOL=1 (ou 0) : tout est séquentiel, comme avant.
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+POOL_ENV = "NYC_CRIME_POOL"
+FAN_OUT_DEFAULT = 16
+
+POOL_SIZE = int(os.environ.get(POOL_ENV, FAN_OUT_DEFAULT))
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=POOL_SIZE,
+                thread_name_prefix="fan-out",
+                initializer=_mark_worker,
+            )
+        return _executor
+
+
+def _mark_worker():
+    _local.worker = True
+
+
+def en_parallele(*fns):
+    """Exécute les callables sans argument `fns` et renvoie leurs résultats
+    dans le même ordre. La première exception levée est propagée (après
+    la fin de toutes les tâches)."""
+    if len(fns) <= 1 or POOL_SIZE <= 1 or getattr(_local, "worker", False):
+        return [fn() for fn in fns]
+
+    pool = _pool()
+    futures = [pool.submit(contextvars.copy_context().run, fn) for fn in fns[1:]]
+    # la première tâche dans le thread appelant : une place de pool en moins
+    try:
+        first = fns[0]()
+    finally:
+        errors = [f.exception() for f in futures]
+    for e in errors:
+        if e is not None:
+            raise e
+    return [first] + [f.result() for f in futures]
+
+
+def en_parallele_dict(fns):
+    """{clé: callable} -> {clé: résultat}, cf. en_parallele."""
+    keys = list(fns)
+    return dict(zip(keys, en_parallele(*(fns[k] for k in keys))))
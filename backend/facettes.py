@@ -0,0 +1,242 @@
+"""
+Calcul des facettes (valeurs distinctes + effectifs) pour les filtres UI.
+
+Toutes les facettes sont calculées en UNE passe sur la collection via un
+pipeline `$facet` (au lieu d'un `$group` par champ = un scan par champ).
+
+Le résultat est versionné par le tampon de génération du jeu de données :
+- en mémoire dans le processus Flask ;
+- matérialisé dans `meta` (_id "facettes"), pour qu'un redémarrage ou un
+  autre worker n'ait pas à rescanner.
+Il n'est recalculé qu'après un rechargement (nouvelle génération).
+
+Facettes croisées (crossfilter_pipeline) : pour chaque champ, les effectifs
+sous tous les AUTRES filtres actifs (sémantique « drill-down » habituelle),
+toujours en un seul aller-retour.
+
+Avec un pool de fan-out (concurrence.py), les facettes croisées peuvent
+devenir une agrégation par facette ($match + $group), en parallèle : un
+sous-pipeline de $facet ne peut pas utiliser d'index, une agrégation
+séparée le peut. Ce n'est rentable que si le $match de CHAQUE facette
+passe par un index (should_fan_out) ; sinon dix parcours de la collection
+coûtent plus cher qu'une seule passe $facet, qui reste la règle (et
+toujours pour les facettes globales, sans $match).
+scripts/bench_facettes.py mesure les deux chemins sur chaque mélange de
+filtres du benchmark et indique lequel gagne.
+
+Requêtes simultanées sur une génération pas encore calculée : un seul
+calcul (single-flight), les autres attendent et partagent son résultat.
+"""
+
+import threading
+import time
+
+from cache import META_COLL_NAME
+from singleflight import SingleFlight
+
+FACETTES_META_ID = "facettes"
+INDEX_TTL = 60  # secondes : relecture des index (create_idexes peut en ajouter)
+
+# champ -> limite (None = toutes les valeurs)
+FACET_FIELDS = {
+    "boro_nm": None,
+    "law_cat_cd": None,
+    "crm_atpt_cptd_cd": None,
+    # Victime (brut)
+    "vic_race": None,
+    "vic_sex": None,
+    "vic_age_group": None,
+    # Suspect (brut)
+    "susp_race": None,
+    "susp_sex": None,
+    "susp_age_group": None,
+    # Infractions
+    "ofns_desc": 100,
+}
+
+
+def group_stages(field, limit=None):
+    stages = [
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+    ]
+    if limit:
+        stages.append({"$limit": limit})
+    return stages
+
+
+def facet_pipeline(match=None):
+    """Pipeline une passe : [$match] + $facet avec un sous-pipeline par champ."""
+    pipeline = [{"$match": match}] if match else []
+    pipeline.append({"$facet": {
+        field: group_stages(field, limit) for field, limit in FACET_FIELDS.items()
+    }})
+    return pipeline
+
+
+def crossfilter_pipeline(filters: dict):
+    """Pipeline $facet où chaque facette ignore son propre filtre.
+
+    `filters` : sortie de query_utils.build_filters (champ -> clause).
+    Le $match de tête (seule étape capable d'utiliser un index) contient :
+    - les filtres hors facettes (dates, texte), communs à tous ;
+    - si >= 2 facettes sont filtrées, un $or des « tous sauf un » : union
+      exacte des entrées de chaque sous-pipeline.
+    """
+    common = [c for f, c in filters.items() if f not in FACET_FIELDS]
+    faceted = {f: c for f, c in filters.items() if f in FACET_FIELDS}
+
+    head = list(common)
+    if len(faceted) >= 2:
+        head.append({"$or": [
+            _and([c for g, c in faceted.items() if g != f]) for f in faceted
+        ]})
+
+    pipeline = [{"$match": _and(head)}] if head else []
+    sub = {}
+    for field in FACET_FIELDS:
+        others = [c for g, c in faceted.items() if g != field]
+        stages = [{"$match": _and(others)}] if others else []
+        # pas de limite : une valeur absente signifie bien 0 sous ces filtres
+        sub[field] = stages + group_stages(field)
+    pipeline.append({"$facet": sub})
+    return pipeline
+
+
+def field_pipeline(field, clauses=(), limit=None):
+    """Agrégation d'une seule facette : [$match] + $group."""
+    clauses = list(clauses)
+    pipeline = [{"$match": _and(clauses)}] if clauses else []
+    return pipeline + group_stages(field, limit)
+
+
+def facet_pipelines():
+    """facet_pipeline éclaté : {champ: pipeline}, à lancer en parallèle."""
+    return {field: field_pipeline(field, limit=limit) for field, limit in FACET_FIELDS.items()}
+
+
+def crossfilter_pipelines(filters: dict):
+    """crossfilter_pipeline éclaté : {champ: pipeline} (mêmes résultats)."""
+    common = [c for f, c in filters.items() if f not in FACET_FIELDS]
+    faceted = {f: c for f, c in filters.items() if f in FACET_FIELDS}
+    return {
+        field: field_pipeline(field, common + [c for g, c in faceted.items() if g != field])
+        for field in FACET_FIELDS
+    }
+
+
+def _indexable(clause, indexed):
+    """Une clause de build_filters peut-elle passer par un index ?
+    `indexed` : premiers champs des index ("$text" : index texte)."""
+    if not isinstance(clause, dict):
+        return False
+    if "$and" in clause:
+        return any(_indexable(c, indexed) for c in clause["$and"])
+    if "$or" in clause:
+        return all(_indexable(c, indexed) for c in clause["$or"])
+    if len(clause) != 1:
+        return False
+    field, cond = next(iter(clause.items()))
+    if field == "$text":
+        return "$text" in indexed
+    if isinstance(cond, dict) and "$regex" in cond:
+        # regex non ancrée : parcours complet de l'index, pas sélectif
+        return field in indexed and str(cond["$regex"]).startswith("^")
+    return field in indexed
+
+
+def should_fan_out(filters: dict, indexed):
+    """Agrégations séparées (crossfilter_pipelines) plutôt qu'un $facet ?
+    Oui seulement si le $match de chaque facette contient une clause
+    indexée ; une facette sans $match sélectif relirait toute la collection."""
+    common = [c for f, c in filters.items() if f not in FACET_FIELDS]
+    faceted = {f: c for f, c in filters.items() if f in FACET_FIELDS}
+    return bool(filters) and all(
+        any(_indexable(c, indexed) for c in common + [c for g, c in faceted.items() if g != field])
+        for field in FACET_FIELDS
+    )
+
+
+class IndexCatalog:
+    """Premiers champs des index d'une collection, relus au plus toutes
+    les `ttl` secondes."""
+
+    def __init__(self, coll, ttl=INDEX_TTL):
+        self.coll = coll
+        self.ttl = ttl
+        self._fields = frozenset()
+        self._at = None
+        self._lock = threading.Lock()
+
+    def leading(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._at is None or now - self._at >= self.ttl:
+                try:
+                    fields = set()
+                    for info in self.coll.index_information().values():
+                        keys = [k for k, _ in info["key"]]
+                        fields.add("$text" if "_fts" in keys else keys[0])
+                    self._fields = frozenset(fields)
+                except Exception:
+                    pass  # liste précédente conservée
+                self._at = now
+            return self._fields
+
+
+def run_pipelines(coll, pipelines, fan_out):
+    """{champ: pipeline} -> {champ: [{_id, count}]}, via `fan_out`
+    (concurrence.en_parallele_dict)."""
+    return fan_out({
+        field: (lambda p=p: list(coll.aggregate(p, allowDiskUse=True)))
+        for field, p in pipelines.items()
+    })
+
+
+def _and(clauses):
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class FacetStore:
+    """Facettes globales, recalculées seulement quand la génération change
+    (une passe $facet : sans $match, rien à gagner à les éclater)."""
+
+    def __init__(self, coll, db, generation):
+        self.coll = coll
+        self.meta = db[META_COLL_NAME]
+        self.generation = generation
+        self._gen = object()  # sentinelle : rien en cache
+        self._value = None
+        self._lock = threading.Lock()
+        self.flight = SingleFlight("facettes")
+
+    def get(self):
+        gen = self.generation.current()
+        with self._lock:
+            if gen == self._gen:
+                return self._value
+        return self.flight.do(repr(gen), lambda: self._load(gen))
+
+    def _load(self, gen):
+        doc = self.meta.find_one({"_id": FACETTES_META_ID})
+        if doc and gen is not None and doc.get("generation") == gen:
+            value = doc["facettes"]
+        else:
+            value = self._compute()
+            if gen is not None:
+                self.meta.replace_one(
+                    {"_id": FACETTES_META_ID},
+                    {"generation": gen, "facettes": value},
+                    upsert=True,
+                )
+
+        with self._lock:
+            self._gen, self._value = gen, value
+        return value
+
+    def _compute(self):
+        return next(self.coll.aggregate(facet_pipeline(), allowDiskUse=True))
+
+    def clear(self):
+        with self._lock:
+            self._gen, self._value = object(), None
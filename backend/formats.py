@@ -0,0 +1,178 @@
+"""
+Formats de réponse en flux (streaming) pour les gros volumes.
+
+Le JSON classique (`jsonify(list(cursor))`) matérialise tous les documents
+puis une chaîne géante avant d'envoyer le premier octet. Ici on parcourt
+le curseur par lots et on émet au fil de l'eau : la mémoire du serveur
+reste bornée par la taille d'un lot.
+
+- ndjson : un document JSON par ligne ;
+- coordonnées binaires (coords_buffer) : float32 little-endian lon/lat
+  entrelacés, plus éventuellement un code uint8 de catégorie par point ;
+  8 (ou 9) octets par point au lieu d'un objet JSON ;
+- arrow : flux Arrow IPC, un RecordBatch colonnaire et typé par lot
+  (float64 pour les coordonnées, timestamp pour les dates, chaînes
+  encodées en dictionnaire pour les catégories). Le client le lit
+  directement en DataFrame (pyarrow.ipc.open_stream), sans parser ligne
+  à ligne ; les métadonnées de la réponse (total, jetons…) voyagent dans
+  celles du schéma.
+"""
+
+import json
+from itertools import islice
+
+import numpy as np
+import pyarrow as pa
+
+STREAM_BATCH_SIZE = 5000  # documents par lot (curseur Mongo et écriture)
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+COORDS_MIMETYPE = "application/octet-stream"
+COORDS_MISSING_CODE = 255  # catégorie absente ou au-delà de 255 valeurs
+
+# Types Arrow des champs non textuels ; tout autre champ est une chaîne
+ARROW_FIELD_TYPES = {
+    "latitude": pa.float64(),
+    "longitude": pa.float64(),
+    "cmplnt_fr_dt": pa.timestamp("ms"),
+    "vic_age_approx": pa.int16(),
+    "susp_age_approx": pa.int16(),
+}
+# Champs de faible cardinalité : encodés en dictionnaire (codes int32)
+ARROW_CATEGORICAL_FIELDS = {
+    "boro_nm", "ofns_desc", "law_cat_cd", "crm_atpt_cptd_cd", "prem_typ_desc",
+    "vic_age_group", "vic_sex", "vic_race",
+    "susp_age_group", "susp_sex", "susp_race",
+}
+_DICT_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+
+def batched(iterable, size=STREAM_BATCH_SIZE):
+    """Découpe un itérable (curseur) en listes de `size` éléments."""
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ndjson_stream(cursor, dumps, batch_size=STREAM_BATCH_SIZE):
+    """Un document JSON par ligne, émis par blocs de `batch_size` lignes.
+
+    `dumps` : sérialiseur d'un document (ex. app.json.dumps, pour garder
+    le même rendu des dates que jsonify).
+    """
+    for batch in batched(cursor, batch_size):
+        yield "".join(dumps(doc) + "\n" for doc in batch)
+
+
+# ------------------------------------------------------------
+# Arrow IPC
+# ------------------------------------------------------------
+def arrow_schema(fields, metadata=None):
+    """Schéma des champs projetés (`fields` : noms, dans l'ordre).
+    `metadata` : dict sérialisé en JSON sous la clé "meta"."""
+    def type_of(f):
+        if f in ARROW_FIELD_TYPES:
+            return ARROW_FIELD_TYPES[f]
+        return _DICT_TYPE if f in ARROW_CATEGORICAL_FIELDS else pa.string()
+
+    meta = {"meta": json.dumps(metadata, default=str)} if metadata is not None else None
+    return pa.schema([(f, type_of(f)) for f in fields], metadata=meta)
+
+
+def _missing(v):
+    return v is None or (isinstance(v, float) and v != v)  # null ou NaN
+
+
+def _arrow_column(docs, name, typ):
+    values = [d.get(name) for d in docs]
+    if pa.types.is_floating(typ):
+        return pa.array(values, type=typ, from_pandas=True)  # NaN -> null
+    if pa.types.is_integer(typ) or pa.types.is_timestamp(typ):
+        return pa.array([None if _missing(v) else v for v in values], type=typ)
+    # chaînes (éventuellement en dictionnaire) : valeurs non textuelles converties
+    return pa.array([None if _missing(v) else v if isinstance(v, str) else str(v)
+                     for v in values], type=typ)
+
+
+def arrow_batch(docs, schema):
+    """RecordBatch d'une liste de documents, colonne par colonne."""
+    return pa.record_batch([_arrow_column(docs, f.name, f.type) for f in schema], schema=schema)
+
+
+class _Chunks:
+    """Fichier minimal pour pa.ipc.new_stream : accumule les octets écrits,
+    vidés après chaque lot (drain) pour être émis dans la réponse."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        out, self._parts = b"".join(self._parts), []
+        return out
+
+
+def arrow_stream(cursor, fields, metadata=None, batch_size=STREAM_BATCH_SIZE):
+    """Flux Arrow IPC (format stream) : en-tête de schéma puis un
+    RecordBatch par lot de `batch_size` documents. Les dictionnaires
+    sont réémis à chaque lot (remplacement autorisé en format stream)."""
+    schema = arrow_schema(fields, metadata)
+    sink = _Chunks()
+    writer = pa.ipc.new_stream(sink, schema)
+    yield sink.drain()
+    for batch in batched(cursor, batch_size):
+        writer.write_batch(arrow_batch(batch, schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+# ------------------------------------------------------------
+# Coordonnées binaires
+# ------------------------------------------------------------
+def coords_buffer(cursor, category_field=None, batch_size=STREAM_BATCH_SIZE):
+    """Points -> (corps, nombre de points, catégories).
+
+    Corps : n paires (lon, lat) en float32 little-endian ('<f4'), suivies,
+    si `category_field`, de n codes uint8 ; `catégories[code]` donne la
+    valeur du champ (COORDS_MISSING_CODE : absente / hors dictionnaire).
+    Lecture côté client : np.frombuffer(corps, "<f4", count=2 * n).
+    """
+    xy_parts, code_parts = [], []
+    categories = {}
+    for batch in batched(cursor, batch_size):
+        xy = np.array([(d.get("longitude"), d.get("latitude")) for d in batch], dtype=np.float64)
+        keep = ~np.isnan(xy).any(axis=1)
+        xy_parts.append(xy[keep].astype("<f4"))
+        if category_field:
+            codes = np.array([_category_code(categories, d.get(category_field)) for d in batch], dtype=np.uint8)
+            code_parts.append(codes[keep])
+
+    xy = np.concatenate(xy_parts) if xy_parts else np.empty((0, 2), dtype="<f4")
+    body = xy.tobytes()
+    if category_field:
+        body += np.concatenate(code_parts).tobytes() if code_parts else b""
+    return body, len(xy), list(categories)
+
+
+def _category_code(categories, value):
+    if _missing(value):
+        return COORDS_MISSING_CODE
+    code = categories.get(value)
+    if code is None:
+        if len(categories) >= COORDS_MISSING_CODE:
+            return COORDS_MISSING_CODE
+        code = categories[value] = len(categories)
+    return code
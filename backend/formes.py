@@ -0,0 +1,91 @@
+"""
+Enregistrement des formes de requêtes réellement servies par l'API.
+
+Chaque requête est résumée par sa forme : endpoint, champs filtrés (clés
+de build_filters), mode de recherche libre et tri keyset éventuel. Les
+compteurs sont agrégés en mémoire puis poussés (upsert $inc) dans la
+collection `query_shapes`, avec un exemple de paramètres :
+- toutes les SHAPE_FLUSH_INTERVAL secondes par un thread dédié, même sans
+  nouvelle requête (les formes rares ne restent pas en attente) ;
+- à la sortie du processus (atexit, et worker_exit de gunicorn.conf.py).
+
+scripts/create_idexes.py --conseil rejoue ensuite ces exemples (explain)
+pour proposer des index composés ESR.
+"""
+
+import atexit
+import threading
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+SHAPES_COLL_NAME = "query_shapes"
+SHAPE_FLUSH_INTERVAL = 30  # secondes
+
+# Paramètres de navigation : ne changent pas la forme de la requête
+_NAV_PARAMS = {"page", "after", "before", "format", "count"}
+
+
+def shape_key(endpoint, filters, args, keyset=False):
+    parts = [endpoint] + sorted(filters)
+    if "q" in filters:
+        parts.append(f"q_mode={args.get('q_mode', 'vocab')}")
+    if keyset:
+        parts.append("sort=keyset")
+    return "|".join(parts)
+
+
+class ShapeRecorder:
+    def __init__(self, db, flush_interval=SHAPE_FLUSH_INTERVAL):
+        self.coll = db[SHAPES_COLL_NAME]
+        self.flush_interval = flush_interval
+        self._pending = {}  # clé -> [compte, exemple]
+        self._lock = threading.Lock()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def _demarrer(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._boucle, name="formes", daemon=True)
+                self._thread.start()
+
+    def _boucle(self):
+        stop = threading.Event()  # jamais levé : simple attente interruptible
+        while not stop.wait(self.flush_interval):
+            self.flush()
+
+    def record(self, endpoint, filters, args, keyset=False):
+        key = shape_key(endpoint, filters, args, keyset)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                example = {k: v for k, v in args.items() if k not in _NAV_PARAMS}
+                entry = self._pending[key] = [0, {
+                    "endpoint": endpoint,
+                    "fields": sorted(filters),
+                    "keyset": keyset,
+                    "example": example,
+                }]
+            entry[0] += 1
+        if self._thread is None:
+            self._demarrer()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"_id": key},
+                {"$inc": {"count": count}, "$set": {"last_seen": now}, "$setOnInsert": info},
+                upsert=True,
+            )
+            for key, (count, info) in pending.items()
+        ]
+        try:
+            self.coll.bulk_write(ops, ordered=False)
+        except Exception:
+            pass  # best effort : ne jamais faire échouer une requête API
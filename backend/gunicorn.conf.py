@@ -0,0 +1,31 @@
+"""
+Configuration gunicorn de l'API (gunicorn -c gunicorn.conf.py wsgi:app).
+
+Workers à threads (gthread) : chaque processus sert NYC_CRIME_THREADS
+requêtes à la fois, et chaque requête peut lancer ses sous-requêtes en
+parallèle sur le pool de fan-out (NYC_CRIME_POOL, cf. concurrence.py).
+Connexions MongoDB par processus : NYC_CRIME_MONGO_POOL (app.py).
+
+Pas de preload_app : le MongoClient doit être créé après le fork. Avec le
+moteur en mémoire (NYC_CRIME_BACKEND=memoire), chaque worker charge ses
+propres colonnes : garder peu de workers et plus de threads.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("NYC_CRIME_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("NYC_CRIME_WORKERS", min(multiprocessing.cpu_count(), 4)))
+worker_class = "gthread"
+threads = int(os.environ.get("NYC_CRIME_THREADS", 8))
+timeout = int(os.environ.get("NYC_CRIME_TIMEOUT", 120))  # premiers calculs de facettes / chargement
+keepalive = 5
+accesslog = "-"
+
+
+def worker_exit(server, worker):
+    """Formes de requêtes encore en mémoire poussées avant l'arrêt du worker."""
+    import sys
+    app = sys.modules.get("app")
+    if app is not None:
+        app.shapes.flush()
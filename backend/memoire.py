@@ -0,0 +1,531 @@
+"""
+Moteur de requêtes en mémoire : colonnes NumPy, alternative à MongoDB.
+
+Le jeu de données est lu une fois (depuis MongoDB ou un fichier Parquet
+produit par scripts/csv_to_parquet.py) et rangé par colonnes :
+- catégories (borough, infraction, sexe, âge, race…) en codes entiers
+  (int8/int16/int32 selon la cardinalité, -1 = absent) + table des valeurs ;
+- cmplnt_fr_dt en int64 (millisecondes epoch, NULL_DATE = absent) ;
+- latitude / longitude en float32 ; cmplnt_num en int64 (-1 = absent) ;
+- _id en deux entiers (ObjectId : 4 + 8 octets), départage du tri keyset.
+
+Les filtres produits par query_utils.build_query ($and, $or, égalités,
+$in / $nin / $ne, intervalles, $regex, $text) sont évalués en masques
+booléens. Sur une colonne catégorielle, le prédicat n'est évalué que sur
+la table des valeurs, puis projeté sur les lignes par les codes.
+
+Sélection (backend/app.py) :
+    NYC_CRIME_BACKEND=memoire
+    NYC_CRIME_SOURCE=mongo | chemin/vers/fichier.parquet   (défaut : mongo)
+
+Avec une source Parquet, aucun serveur MongoDB n'est nécessaire pour
+/api/recherche, /api/carte(/coords) et /api/facettes(/filtrees).
+"""
+
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bson import ObjectId
+
+from facettes import FACET_FIELDS
+from formats import COORDS_MISSING_CODE
+from normalization_maps import SEX_RAW_TO_STD, AGE_RAW_TO_STD, parse_age_group_to_bounds
+from pagination import encode_cursor, decode_cursor
+from query_utils import TEXT_SEARCH_FIELDS
+
+BACKEND_ENV = "NYC_CRIME_BACKEND"  # "mongo" (défaut) | "memoire"
+SOURCE_ENV = "NYC_CRIME_SOURCE"    # "mongo" (défaut) | chemin d'un .parquet
+
+LOAD_BATCH = 200_000  # documents / lignes lus par lot au chargement
+
+CATEGORICAL_FIELDS = [
+    "boro_nm", "ofns_desc", "law_cat_cd", "crm_atpt_cptd_cd", "prem_typ_desc",
+    "vic_age_group", "vic_sex", "vic_race",
+    "susp_age_group", "susp_sex", "susp_race",
+    "vic_sex_std", "vic_age_std", "susp_sex_std", "susp_age_std",
+    "vic_age_approx", "susp_age_approx",
+    "cmplnt_fr_tm",
+]
+DATE_FIELD = "cmplnt_fr_dt"
+COORD_FIELDS = ["latitude", "longitude"]
+NUM_FIELD = "cmplnt_num"
+
+# Champs dérivés si la source ne les porte pas (Parquet, base chargée
+# avant leur ajout) : calculés sur la table des valeurs, pas par ligne
+DERIVED_FIELDS = {
+    "vic_sex_std": ("vic_sex", SEX_RAW_TO_STD.get),
+    "vic_age_std": ("vic_age_group", AGE_RAW_TO_STD.get),
+    "susp_sex_std": ("susp_sex", SEX_RAW_TO_STD.get),
+    "susp_age_std": ("susp_age_group", AGE_RAW_TO_STD.get),
+    "vic_age_approx": ("vic_age_group", lambda v: parse_age_group_to_bounds(v)[2]),
+    "susp_age_approx": ("susp_age_group", lambda v: parse_age_group_to_bounds(v)[2]),
+}
+
+# Champs de l'index texte MongoDB (cf. scripts/create_idexes.py)
+TEXT_INDEX_FIELDS = ["ofns_desc", "prem_typ_desc"]
+
+NULL_DATE = np.iinfo(np.int64).min  # = NaT en datetime64
+
+
+class UnsupportedQuery(ValueError):
+    """Opérateur de filtre non pris en charge par le moteur en mémoire."""
+
+
+def _missing(v):
+    return v is None or (isinstance(v, float) and v != v)
+
+
+def _to_ms(dt):
+    return int(np.datetime64(dt, "ms").astype(np.int64))
+
+
+def _code_dtype(n):
+    for dt in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(dt).max:
+            return dt
+    return np.int64
+
+
+# ------------------------------------------------------------
+# Construction (lots de DataFrames -> colonnes)
+# ------------------------------------------------------------
+class _Builder:
+    def __init__(self):
+        self.values = {f: {} for f in CATEGORICAL_FIELDS}  # valeur -> code
+        self.codes = {f: [] for f in CATEGORICAL_FIELDS}
+        self.present = set()
+        self.dates, self.lat, self.lon, self.num = [], [], [], []
+        self.oid_hi, self.oid_lo = [], []
+        self.n = 0
+
+    def add(self, df, oid_hi, oid_lo):
+        """`df` : colonnes en minuscules ; oid_* : tableaux de même longueur."""
+        n = len(df)
+        for f in CATEGORICAL_FIELDS:
+            if f not in df.columns:
+                self.codes[f].append(np.full(n, -1, dtype=np.int32))
+                continue
+            self.present.add(f)
+            codes, uniques = pd.factorize(df[f], use_na_sentinel=True)
+            table = self.values[f]
+            lut = np.array([table.setdefault(u, len(table)) for u in uniques] + [-1], dtype=np.int32)
+            self.codes[f].append(lut[codes])  # code -1 -> dernier élément (-1)
+
+        if DATE_FIELD in df.columns:
+            dts = pd.to_datetime(df[DATE_FIELD], errors="coerce")
+            self.dates.append(dts.to_numpy(dtype="datetime64[ms]").astype(np.int64))
+        else:
+            self.dates.append(np.full(n, NULL_DATE, dtype=np.int64))
+        self.lat.append(pd.to_numeric(df["latitude"], errors="coerce").to_numpy(np.float32))
+        self.lon.append(pd.to_numeric(df["longitude"], errors="coerce").to_numpy(np.float32))
+        if NUM_FIELD in df.columns:
+            num = pd.to_numeric(df[NUM_FIELD], errors="coerce")
+            self.num.append(num.fillna(-1).to_numpy(np.int64))
+        else:
+            self.num.append(np.full(n, -1, dtype=np.int64))
+        self.oid_hi.append(np.asarray(oid_hi, dtype=np.uint32))
+        self.oid_lo.append(np.asarray(oid_lo, dtype=np.uint64))
+        self.n += n
+
+    def build(self):
+        def cat(parts, dtype):
+            return np.concatenate(parts).astype(dtype) if parts else np.empty(0, dtype=dtype)
+
+        columns = {}
+        for f in CATEGORICAL_FIELDS:
+            if f not in self.present:
+                continue
+            values = list(self.values[f])
+            if values and all(isinstance(v, float) and v.is_integer() for v in values):
+                values = [int(v) for v in values]  # ex. âges approx lus en float (NaN)
+            categories = np.empty(len(values) + 1, dtype=object)
+            categories[:-1] = values
+            categories[-1] = None  # code -1 -> None
+            columns[f] = (cat(self.codes[f], _code_dtype(len(values))), categories)
+
+        return ColumnStore(
+            columns,
+            dates=cat(self.dates, np.int64),
+            lat=cat(self.lat, np.float32),
+            lon=cat(self.lon, np.float32),
+            num=cat(self.num, np.int64),
+            oid_hi=cat(self.oid_hi, np.uint32),
+            oid_lo=cat(self.oid_lo, np.uint64),
+        )
+
+
+def _oid_parts(ids):
+    raw = np.frombuffer(b"".join(o.binary for o in ids), dtype=[("hi", ">u4"), ("lo", ">u8")])
+    return raw["hi"], raw["lo"]
+
+
+def load_from_mongo(coll, batch_size=LOAD_BATCH):
+    projection = dict.fromkeys(CATEGORICAL_FIELDS + [DATE_FIELD, NUM_FIELD] + COORD_FIELDS, 1)
+    builder = _Builder()
+    batch = []
+
+    def flush():
+        df = pd.DataFrame(batch)
+        hi, lo = _oid_parts(df["_id"])
+        builder.add(df, hi, lo)
+        batch.clear()
+
+    for doc in coll.find({}, projection).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return builder.build()
+
+
+def load_from_parquet(path, batch_size=LOAD_BATCH):
+    """Même nettoyage que le loader : lignes sans coordonnées ignorées.
+    Sans ObjectId, le départage keyset se fait sur le numéro de ligne."""
+    import pyarrow.parquet as pq
+
+    builder = _Builder()
+    row = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        df = batch.to_pandas()
+        df.columns = [c.lower() for c in df.columns]
+        df = df.dropna(subset=COORD_FIELDS)
+        lo = np.arange(row, row + len(df), dtype=np.uint64)
+        row += len(df)
+        builder.add(df, np.zeros(len(df), dtype=np.uint32), lo)
+    return builder.build()
+
+
+# ------------------------------------------------------------
+# Colonnes + évaluation des filtres
+# ------------------------------------------------------------
+class ColumnStore:
+    def __init__(self, columns, dates, lat, lon, num, oid_hi, oid_lo):
+        self.columns = columns  # champ -> (codes, valeurs + [None])
+        self.dates = dates
+        self.lat = lat
+        self.lon = lon
+        self.num = num
+        self.oid_hi = oid_hi
+        self.oid_lo = oid_lo
+        self.n = len(dates)
+        self._derive()
+        # Ordre keyset (SORT_NEXT) : date décroissante puis _id décroissant ;
+        # NULL_DATE étant le plus petit int64, les dates nulles finissent en queue
+        self.order = np.lexsort((oid_lo, oid_hi, dates))[::-1]
+
+    def _derive(self):
+        for field, (raw, fn) in DERIVED_FIELDS.items():
+            if field in self.columns or raw not in self.columns:
+                continue
+            codes, categories = self.columns[raw]
+            mapped = [fn(v) for v in categories]  # dernier : valeur absente
+            uniques = list(dict.fromkeys(v for v in mapped if v is not None))
+            index = {v: i for i, v in enumerate(uniques)}
+            lut = np.array([index.get(v, -1) for v in mapped], dtype=np.int32)
+            new_categories = np.empty(len(uniques) + 1, dtype=object)
+            new_categories[:-1] = uniques
+            new_categories[-1] = None
+            self.columns[field] = (lut[codes].astype(_code_dtype(len(uniques))), new_categories)
+
+    # ---------------- filtres ----------------
+    def mask(self, q):
+        if not q:
+            return np.ones(self.n, dtype=bool)
+        return self._eval(q)
+
+    def _eval(self, q):
+        m = np.ones(self.n, dtype=bool)
+        for key, val in q.items():
+            if key == "$and":
+                for c in val:
+                    m &= self._eval(c)
+            elif key == "$or":
+                part = np.zeros(self.n, dtype=bool)
+                for c in val:
+                    part |= self._eval(c)
+                m &= part
+            elif key == "$text":
+                m &= self._text(val["$search"])
+            elif key.startswith("$"):
+                raise UnsupportedQuery(f"opérateur non pris en charge : {key}")
+            else:
+                m &= self._field(key, val)
+        return m
+
+    def _field(self, field, cond):
+        if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            ops = {k: v for k, v in cond.items() if k != "$options"}
+            options = cond.get("$options", "")
+        else:
+            ops, options = {"$eq": cond}, ""
+
+        if field in self.columns:
+            codes, categories = self.columns[field]
+            hit = np.ones(len(categories), dtype=bool)
+            for op, arg in ops.items():
+                hit &= [_match(op, arg, v, options) for v in categories]
+            return hit[codes]  # code -1 -> dernière valeur (None)
+        if field == DATE_FIELD:
+            return self._range(self.dates, self.dates == NULL_DATE, ops, _to_ms)
+        if field in COORD_FIELDS:
+            col = self.lat if field == "latitude" else self.lon
+            return self._range(col, np.isnan(col), ops, float)
+        if field == NUM_FIELD:
+            return self._range(self.num, self.num == -1, ops, int)
+        if field in CATEGORICAL_FIELDS:
+            # champ absent de la source : toujours null
+            return np.full(self.n, all(_match(op, arg, None, options) for op, arg in ops.items()))
+        raise UnsupportedQuery(f"champ non disponible en mémoire : {field}")
+
+    def _range(self, col, null, ops, conv):
+        m = np.ones(self.n, dtype=bool)
+        for op, arg in ops.items():
+            if op == "$eq":
+                m &= null if arg is None else (col == conv(arg)) & ~null
+            elif op == "$ne":
+                m &= ~null if arg is None else (col != conv(arg)) | null
+            elif op in ("$in", "$nin"):
+                vals = [conv(a) for a in arg if a is not None]
+                part = np.isin(col, vals) & ~null
+                if any(a is None for a in arg):
+                    part |= null
+                m &= part if op == "$in" else ~part
+            elif op in _CMP:
+                # comme MongoDB : une comparaison n'inclut jamais les null
+                m &= _CMP[op](col, conv(arg)) & ~null
+            else:
+                raise UnsupportedQuery(f"opérateur non pris en charge : {op}")
+        return m
+
+    def _text(self, search):
+        """Approximation de $text : un des mots recherchés, en préfixe de
+        mot, insensible à la casse, dans les champs de l'index texte
+        (pas de racinisation, de phrase ni de négation)."""
+        terms = [t for t in re.split(r"\W+", search) if t]
+        if not terms:
+            return np.zeros(self.n, dtype=bool)
+        pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, terms)) + ")", re.IGNORECASE)
+        m = np.zeros(self.n, dtype=bool)
+        for field in TEXT_INDEX_FIELDS:
+            if field in self.columns:
+                codes, categories = self.columns[field]
+                hit = np.array([isinstance(v, str) and bool(pattern.search(v)) for v in categories])
+                m |= hit[codes]
+        return m
+
+    # ---------------- lecture ----------------
+    def fields(self):
+        return list(self.columns) + [DATE_FIELD, NUM_FIELD] + COORD_FIELDS
+
+    def decode(self, field, idx):
+        """Valeurs Python (liste) du champ pour les lignes `idx`."""
+        if field in self.columns:
+            codes, categories = self.columns[field]
+            return categories[codes[idx]].tolist()
+        if field == DATE_FIELD:
+            ms = self.dates[idx]
+            out = np.array(pd.to_datetime(ms, unit="ms").to_pydatetime(), dtype=object)
+            out[ms == NULL_DATE] = None
+            return out.tolist()
+        if field in COORD_FIELDS:
+            col = (self.lat if field == "latitude" else self.lon)[idx].astype(np.float64).round(6)
+            return [None if v != v else v for v in col.tolist()]
+        if field == NUM_FIELD:
+            return [None if v == -1 else v for v in self.num[idx].tolist()]
+        return [None] * len(idx)
+
+    def rows(self, idx, fields=None):
+        # comme une projection MongoDB : un champ absent de la source n'apparaît pas
+        available = set(self.fields())
+        fields = [f for f in (fields or self.fields()) if f in available]
+        cols = [self.decode(f, idx) for f in fields]
+        return [dict(zip(fields, vals)) for vals in zip(*cols)] if fields else [{} for _ in idx]
+
+    def count(self, q):
+        return int(np.count_nonzero(self.mask(q)))
+
+    def find(self, q, fields=None, skip=0, limit=None, sample=None, rng=None):
+        """Documents filtrés, dans l'ordre des lignes (comme un find() sans tri)."""
+        idx = np.flatnonzero(self.mask(q))
+        if sample is not None:
+            rng = rng or np.random.default_rng()
+            idx = np.sort(rng.choice(idx, size=min(sample, len(idx)), replace=False))
+        else:
+            idx = idx[skip:None if limit is None else skip + limit]
+        return self.rows(idx, fields)
+
+    def _key_doc(self, i):
+        oid = ObjectId(int(self.oid_hi[i]).to_bytes(4, "big") + int(self.oid_lo[i]).to_bytes(8, "big"))
+        return {"cmplnt_fr_dt": self.decode(DATE_FIELD, [i])[0], "_id": oid}
+
+    def _seek(self, token, after):
+        dt, oid = decode_cursor(token)
+        d = NULL_DATE if dt is None else _to_ms(dt)
+        b = oid.binary
+        hi, lo = int.from_bytes(b[:4], "big"), int.from_bytes(b[4:], "big")
+        if after:
+            same_oid = (self.oid_hi < hi) | ((self.oid_hi == hi) & (self.oid_lo < lo))
+            return (self.dates < d) | ((self.dates == d) & same_oid)
+        same_oid = (self.oid_hi > hi) | ((self.oid_hi == hi) & (self.oid_lo > lo))
+        return (self.dates > d) | ((self.dates == d) & same_oid)
+
+    def keyset_page(self, q, fields, page_size, after=None, before=None, skip=0):
+        """Équivalent de pagination.fetch_keyset_page : (docs, next, prev)."""
+        m = self.mask(q)
+        if after:
+            m &= self._seek(after, after=True)
+        elif before:
+            m &= self._seek(before, after=False)
+        pos = np.flatnonzero(m[self.order])  # rangs dans l'ordre keyset
+
+        if before:
+            has_more = len(pos) > page_size
+            pos = pos[-page_size:] if page_size else pos[:0]
+            has_next, has_prev = True, has_more
+        else:
+            start = 0 if after else skip  # accès direct « page N » seulement sans jeton
+            pos = pos[start:start + page_size + 1]
+            has_more = len(pos) > page_size
+            pos = pos[:page_size]
+            has_next, has_prev = has_more, bool(after) or skip > 0
+
+        if len(pos) == 0:
+            return [], None, None
+        idx = self.order[pos]
+        next_token = encode_cursor(self._key_doc(idx[-1])) if has_next else None
+        prev_token = encode_cursor(self._key_doc(idx[0])) if has_prev else None
+        return self.rows(idx, fields), next_token, prev_token
+
+    # ---------------- agrégations ----------------
+    def _counts(self, field, m, limit=None):
+        codes, categories = self.columns[field]
+        counts = np.bincount(codes[m].astype(np.int64) + 1, minlength=len(categories))
+        counts = np.roll(counts, -1)  # aligné sur `categories` (absent en dernier)
+        nz = np.flatnonzero(counts)
+        nz = nz[np.argsort(-counts[nz], kind="stable")]
+        if limit:
+            nz = nz[:limit]
+        return [{"_id": categories[i], "count": int(counts[i])} for i in nz]
+
+    def facets(self, q=None):
+        """Même forme que facettes.facet_pipeline : {champ: [{_id, count}]}."""
+        m = self.mask(q)
+        return {f: self._counts(f, m, limit) if f in self.columns else []
+                for f, limit in FACET_FIELDS.items()}
+
+    def crossfilter(self, filters):
+        """Même résultat que facettes.crossfilter_pipeline (sans limite)."""
+        masks = {f: self.mask(c) for f, c in filters.items()}
+        common = np.ones(self.n, dtype=bool)
+        for f, m in masks.items():
+            if f not in FACET_FIELDS:
+                common &= m
+        out = {}
+        for field in FACET_FIELDS:
+            m = common.copy()
+            for f, fm in masks.items():
+                if f in FACET_FIELDS and f != field:
+                    m &= fm
+            out[field] = self._counts(field, m) if field in self.columns else []
+        return out
+
+    def vocabulary(self):
+        """Valeurs distinctes des champs de recherche libre (cf. vocabulaire.py)."""
+        return {f: [v for v in self.columns[f][1][:-1]] if f in self.columns else []
+                for f in TEXT_SEARCH_FIELDS}
+
+    def coords(self, q, category_field=None):
+        """Même sortie que formats.coords_buffer : (corps, n, catégories)."""
+        m = self.mask(q) & ~np.isnan(self.lat) & ~np.isnan(self.lon)
+        xy = np.column_stack([self.lon[m], self.lat[m]]).astype("<f4")
+        body = xy.tobytes()
+        categories = []
+        if category_field:
+            codes = self.columns[category_field][0][m] if category_field in self.columns \
+                else np.full(len(xy), -1, dtype=np.int32)
+            present = np.unique(codes[codes >= 0])[:COORDS_MISSING_CODE]
+            local = np.full(len(codes), COORDS_MISSING_CODE, dtype=np.uint8)
+            pos = np.searchsorted(present, codes)
+            found = (pos < len(present)) & (present[np.minimum(pos, len(present) - 1)] == codes) \
+                if len(present) else np.zeros(len(codes), dtype=bool)
+            local[found] = pos[found]
+            body += local.tobytes()
+            categories = self.columns[category_field][1][present].tolist() if len(present) else []
+        return body, len(xy), categories
+
+
+_CMP = {
+    "$gt": np.greater,
+    "$gte": np.greater_equal,
+    "$lt": np.less,
+    "$lte": np.less_equal,
+}
+
+
+def _match(op, arg, v, options=""):
+    """Prédicat MongoDB d'un opérateur sur une valeur (None = absent)."""
+    if _missing(v):
+        v = None
+    if op == "$eq":
+        return v == arg
+    if op == "$ne":
+        return v != arg
+    if op == "$in":
+        return v in arg
+    if op == "$nin":
+        return v not in arg
+    if op == "$regex":
+        flags = re.IGNORECASE if "i" in options else 0
+        return isinstance(v, str) and re.search(arg, v, flags) is not None
+    if op in _CMP:
+        return v is not None and bool(_CMP[op](v, arg))
+    raise UnsupportedQuery(f"opérateur non pris en charge : {op}")
+
+
+# ------------------------------------------------------------
+# Sources et rechargement
+# ------------------------------------------------------------
+class FileGeneration:
+    """Génération d'une source fichier (taille + date de modification) :
+    remplace DatasetGeneration quand aucune base MongoDB n'est utilisée."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def current(self):
+        st = os.stat(self.path)
+        return f"{st.st_size}-{st.st_mtime_ns}"
+
+    def refresh(self):
+        pass
+
+    def std_fields(self):
+        return True  # dérivés au chargement (DERIVED_FIELDS)
+
+
+class MemoryBackend:
+    """ColumnStore de la génération courante, rechargé quand elle change."""
+
+    def __init__(self, load, generation):
+        self._load = load  # () -> ColumnStore
+        self.generation = generation
+        self._gen = object()  # sentinelle : rien en mémoire
+        self._store = None
+        self._lock = threading.Lock()
+
+    def store(self):
+        gen = self.generation.current()
+        with self._lock:
+            if gen != self._gen:
+                self._store = self._load()
+                self._gen = gen
+            return self._store
+
+    def clear(self):
+        with self._lock:
+            self._gen, self._store = object(), None
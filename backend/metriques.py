@@ -0,0 +1,280 @@
+"""
+Instrumentation du backend : durée des requêtes HTTP, des commandes MongoDB
+et des phases de chaque requête.
+
+- Histogrammes / compteurs au format texte Prometheus (exposés par
+  /api/metrics), sans dépendance : quelques classes thread-safe suffisent.
+- MongoListener (pymongo.monitoring.CommandListener) : durée, collection et
+  documents renvoyés de chaque commande (find, getMore, aggregate, count…).
+- Chronométrage par requête : un Chrono par requête Flask, porté par une
+  ContextVar. Les commandes MongoDB exécutées pendant la requête s'y ajoutent,
+  y compris celles lancées sur le pool de fan-out (concurrence.py copie le
+  contexte), et les phases explicites (`with phase("compte"):`) aussi.
+  Le tout devient l'en-tête Server-Timing de la réponse.
+- Le listener transmet aussi chaque commande à un observateur optionnel
+  (journal des requêtes lentes, cf. requetes_lentes.py).
+
+Chaque processus a ses propres métriques : avec plusieurs workers gunicorn,
+chaque scrape voit celles du worker qui répond.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pymongo import monitoring
+
+METRICS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+BUCKETS_SECONDES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_DOCUMENTS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+# ------------------------------------------------------------
+# Métriques (format d'exposition Prometheus)
+# ------------------------------------------------------------
+def _echapper(v):
+    return str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(noms, valeurs, extra=None):
+    paires = list(zip(noms, valeurs)) + ([extra] if extra else [])
+    if not paires:
+        return ""
+    return "{" + ",".join(f'{k}="{_echapper(v)}"' for k, v in paires) + "}"
+
+
+def _nombre(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Compteur:
+    type = "counter"
+
+    def __init__(self, nom, aide, labels=()):
+        self.nom, self.aide, self.labels = nom, aide, tuple(labels)
+        self._valeurs = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valeur=1, **labels):
+        cle = tuple(labels[k] for k in self.labels)
+        with self._lock:
+            self._valeurs[cle] = self._valeurs.get(cle, 0) + valeur
+
+    def valeur(self, **labels):
+        with self._lock:
+            return self._valeurs.get(tuple(labels[k] for k in self.labels), 0)
+
+    def lignes(self):
+        with self._lock:
+            items = sorted(self._valeurs.items())
+        return [f"{self.nom}{_labels(self.labels, cle)} {_nombre(v)}" for cle, v in items]
+
+
+class Histogramme:
+    type = "histogram"
+
+    def __init__(self, nom, aide, labels=(), buckets=BUCKETS_SECONDES):
+        self.nom, self.aide, self.labels = nom, aide, tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # labels -> [comptes par bucket, somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, valeur, **labels):
+        cle = tuple(labels[k] for k in self.labels)
+        with self._lock:
+            serie = self._series.get(cle)
+            if serie is None:
+                serie = self._series[cle] = [[0] * len(self.buckets), 0.0, 0]
+            for i, borne in enumerate(self.buckets):
+                if valeur <= borne:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valeur
+            serie[2] += 1
+
+    def lignes(self):
+        with self._lock:
+            items = sorted((cle, (list(s[0]), s[1], s[2])) for cle, s in self._series.items())
+        out = []
+        for cle, (comptes, somme, total) in items:
+            cumul = 0
+            for borne, n in zip(self.buckets, comptes):
+                cumul += n
+                out.append(f"{self.nom}_bucket{_labels(self.labels, cle, ('le', _nombre(borne)))} {cumul}")
+            out.append(f"{self.nom}_sum{_labels(self.labels, cle)} {_nombre(somme)}")
+            out.append(f"{self.nom}_count{_labels(self.labels, cle)} {total}")
+        return out
+
+
+class Registre:
+    def __init__(self):
+        self._metriques = []
+
+    def ajouter(self, metrique):
+        self._metriques.append(metrique)
+        return metrique
+
+    def exposition(self):
+        lignes = []
+        for m in self._metriques:
+            lignes.append(f"# HELP {m.nom} {m.aide}")
+            lignes.append(f"# TYPE {m.nom} {m.type}")
+            lignes.extend(m.lignes())
+        return "\n".join(lignes) + "\n"
+
+
+registre = Registre()
+
+http_duree = registre.ajouter(Histogramme(
+    "nyc_http_request_duration_seconds", "Durée des requêtes HTTP (hors corps streamé)",
+    ("endpoint", "method", "status"),
+))
+http_phase = registre.ajouter(Histogramme(
+    "nyc_http_phase_duration_seconds", "Durée des phases d'une requête (compte, page, serialisation, mongo…)",
+    ("endpoint", "phase"),
+))
+mongo_duree = registre.ajouter(Histogramme(
+    "nyc_mongo_command_duration_seconds", "Durée des commandes MongoDB",
+    ("command", "collection"),
+))
+mongo_documents = registre.ajouter(Histogramme(
+    "nyc_mongo_command_documents", "Documents renvoyés par commande MongoDB",
+    ("command", "collection"), buckets=BUCKETS_DOCUMENTS,
+))
+mongo_echecs = registre.ajouter(Compteur(
+    "nyc_mongo_command_failures_total", "Commandes MongoDB en échec",
+    ("command", "collection"),
+))
+
+
+# ------------------------------------------------------------
+# Chronométrage d'une requête (-> Server-Timing)
+# ------------------------------------------------------------
+class Chrono:
+    """Durées cumulées par phase pour une requête (thread-safe : les
+    commandes du pool de fan-out s'y ajoutent en parallèle)."""
+
+    def __init__(self, endpoint=None):
+        self.debut = time.perf_counter()
+        self.endpoint = endpoint
+        self.phases = {}  # phase -> [secondes, nombre]
+        self._lock = threading.Lock()
+
+    def ajouter(self, phase, secondes):
+        with self._lock:
+            p = self.phases.setdefault(phase, [0.0, 0])
+            p[0] += secondes
+            p[1] += 1
+
+    def server_timing(self, total):
+        """Valeur de l'en-tête Server-Timing (durées en ms)."""
+        with self._lock:
+            phases = sorted(self.phases.items())
+        parts = [f"total;dur={total * 1000:.1f}"]
+        for nom, (s, n) in phases:
+            desc = f';desc="{n} commandes"' if nom.startswith("mongo") else ""
+            parts.append(f"{nom};dur={s * 1000:.1f}{desc}")
+        return ", ".join(parts)
+
+
+_chrono = ContextVar("chrono", default=None)
+
+
+def demarrer(endpoint=None):
+    """Nouveau Chrono pour la requête en cours (before_request)."""
+    chrono = Chrono(endpoint)
+    _chrono.set(chrono)
+    return chrono
+
+
+def chrono_courant():
+    return _chrono.get()
+
+
+def terminer():
+    """Fin de requête (teardown) : les threads du serveur sont réutilisés,
+    le Chrono ne doit pas déborder sur la requête suivante."""
+    _chrono.set(None)
+
+
+@contextmanager
+def phase(nom):
+    """Chronomètre un bloc dans la requête en cours (sans effet hors requête)."""
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        chrono = _chrono.get()
+        if chrono is not None:
+            chrono.ajouter(nom, time.perf_counter() - t)
+
+
+# ------------------------------------------------------------
+# Commandes MongoDB
+# ------------------------------------------------------------
+_CURSEURS = ("find", "aggregate", "getMore")
+_REQUETES = ("find", "aggregate", "count", "distinct")  # transmises à l'observateur
+
+
+def _documents(nom, reponse):
+    curseur = reponse.get("cursor")
+    if isinstance(curseur, dict):
+        return len(curseur.get("firstBatch") or curseur.get("nextBatch") or ())
+    if nom in ("count", "distinct"):
+        return 1
+    return 0
+
+
+class MongoListener(monitoring.CommandListener):
+    """Durée / documents / collection de chaque commande, ajoutés aux
+    métriques et au Chrono de la requête en cours.
+
+    `observateur` : objet avec observer(nom, base, collection, commande,
+    secondes, endpoint), appelé pour chaque find / aggregate / count /
+    distinct réussi (dans le thread de la commande : doit rester O(1))."""
+
+    def __init__(self, observateur=None):
+        self.observateur = observateur
+        self._en_cours = {}  # (connexion, request_id) -> (collection, commande | None)
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        cmd = event.command
+        if event.command_name == "getMore":
+            collection = cmd.get("collection")
+        else:
+            collection = cmd.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        garder = self.observateur is not None and event.command_name in _REQUETES
+        with self._lock:
+            self._en_cours[(event.connection_id, event.request_id)] = (collection, cmd if garder else None)
+
+    def _fin(self, event):
+        with self._lock:
+            return self._en_cours.pop((event.connection_id, event.request_id), ("", None))
+
+    def succeeded(self, event):
+        collection, cmd = self._fin(event)
+        secondes = event.duration_micros / 1e6
+        nom = event.command_name
+        mongo_duree.observe(secondes, command=nom, collection=collection)
+        if nom in _CURSEURS or nom in ("count", "distinct"):
+            mongo_documents.observe(_documents(nom, event.reply), command=nom, collection=collection)
+        chrono = _chrono.get()
+        if chrono is not None:
+            chrono.ajouter(f"mongo-{nom}", secondes)
+        if cmd is not None:
+            self.observateur.observer(nom, event.database_name, collection, cmd, secondes,
+                                      chrono.endpoint if chrono is not None else None)
+
+    def failed(self, event):
+        collection, _ = self._fin(event)
+        mongo_echecs.inc(command=event.command_name, collection=collection)
+        chrono = _chrono.get()
+        if chrono is not None:
+            chrono.ajouter(f"mongo-{event.command_name}", event.duration_micros / 1e6)
@@ -1,7 +1,9 @@
 """
 Mappings de normalisation pour sexe et âges (victime & suspect).
 Utilisés par query_utils pour traduire les choix UI (F/M/U, 0-17, etc.)
-en valeurs brutes présentes dans la base NYPD.
+en valeurs brutes présentes dans la base NYPD, et en sens inverse par
+scripts/load_csv_to_mongo.py pour stocker les champs standardisés
+(vic_sex_std, vic_age_std…) dès le chargement.
 """
 
 # --- Sexe ---
@@ -24,6 +26,24 @@ AGE_STD_TO_RAW = {
     "80+": ["65+", "65-"],
 }
 
+# Alias d'interface -> valeur standard réellement stockée
+AGE_STD_ALIASES = {"80+": "65+"}
+
+
+def _invert(mapping: dict, skip=()):
+    out = {}
+    for std, raws in mapping.items():
+        if std in skip:
+            continue
+        for raw in raws:
+            out.setdefault(raw, std)
+    return out
+
+
+# Valeur brute -> valeur standard (None / "" inclus : inconnus)
+SEX_RAW_TO_STD = _invert(SEX_STD_TO_RAW)
+AGE_RAW_TO_STD = _invert(AGE_STD_TO_RAW, skip=AGE_STD_ALIASES)
+
 # Ordres & libellés (facultatif, utilisé côté front)
 SEX_STD_ORDER = ["F", "M", "U"]
 AGE_STD_ORDER = ["0-17", "18-24", "25-44", "45-64", "65+", "INCONNU"]
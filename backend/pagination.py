@@ -0,0 +1,145 @@
+"""
+Pagination par curseur (« keyset » / seek) pour /api/recherche.
+
+Au lieu de `skip((page - 1) * page_size)`, qui oblige MongoDB à parcourir
+toutes les lignes sautées, on trie sur une clé indexée
+(cmplnt_fr_dt décroissant, _id décroissant) et on repart de la dernière
+(ou première) clé vue. Chaque changement de page coûte alors O(page_size),
+quelle que soit la profondeur.
+
+Les jetons `next` / `prev` renvoyés au client sont opaques : JSON encodé
+en base64 url-safe contenant la clé de tri du document frontière.
+
+NOTE: les documents sans date (cmplnt_fr_dt null) sont placés en fin de
+parcours, comme le fait MongoDB pour un tri décroissant.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+# Ordre de parcours « page suivante » (le plus récent d'abord)
+SORT_NEXT = [("cmplnt_fr_dt", -1), ("_id", -1)]
+# Ordre inverse, utilisé pour remonter vers la page précédente
+SORT_PREV = [("cmplnt_fr_dt", 1), ("_id", 1)]
+
+
+class InvalidCursor(ValueError):
+    """Jeton de pagination illisible ou falsifié."""
+
+
+# ------------------------------------------------------------
+# Encodage / décodage des jetons
+# ------------------------------------------------------------
+def encode_cursor(doc):
+    """Construit le jeton opaque à partir de la clé de tri d'un document."""
+    dt = doc.get("cmplnt_fr_dt")
+    payload = {
+        "d": dt.isoformat() if isinstance(dt, datetime) else None,
+        "id": str(doc["_id"]),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Retourne (date|None, ObjectId) depuis un jeton produit par encode_cursor."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        d = payload.get("d")
+        dt = datetime.fromisoformat(d) if d else None
+        return dt, ObjectId(payload["id"])
+    except Exception as e:
+        raise InvalidCursor(f"curseur invalide : {token!r}") from e
+
+
+# ------------------------------------------------------------
+# Prédicats de reprise (seek)
+# ------------------------------------------------------------
+def seek_after(dt, oid):
+    """Documents strictement *après* (dt, oid) dans l'ordre SORT_NEXT."""
+    if dt is None:
+        # Déjà dans la queue des dates nulles : seul _id départage
+        return {"cmplnt_fr_dt": None, "_id": {"$lt": oid}}
+    return {"$or": [
+        {"cmplnt_fr_dt": {"$lt": dt}},
+        {"cmplnt_fr_dt": dt, "_id": {"$lt": oid}},
+        # $lt sur une date n'inclut pas les null (type bracketing)
+        {"cmplnt_fr_dt": None},
+    ]}
+
+
+def seek_before(dt, oid):
+    """Documents strictement *avant* (dt, oid) dans l'ordre SORT_NEXT."""
+    if dt is None:
+        return {"$or": [
+            {"cmplnt_fr_dt": None, "_id": {"$gt": oid}},
+            {"cmplnt_fr_dt": {"$ne": None}},
+        ]}
+    return {"$or": [
+        {"cmplnt_fr_dt": {"$gt": dt}},
+        {"cmplnt_fr_dt": dt, "_id": {"$gt": oid}},
+    ]}
+
+
+def with_seek(q: dict, seek: dict):
+    """Ajoute le prédicat de reprise au filtre issu de build_query."""
+    if not q:
+        return seek
+    return {"$and": [q, seek]}
+
+
+# ------------------------------------------------------------
+# Lecture d'une page
+# ------------------------------------------------------------
+def fetch_keyset_page(coll, q, projection, page_size, after=None, before=None, skip=0):
+    """Lit une page en mode keyset.
+
+    - after=jeton  : page suivante (coût constant)
+    - before=jeton : page précédente (coût constant)
+    - sinon        : page atteinte par skip (accès direct « page N »),
+                     coût O(skip) mais les pages voisines redeviennent
+                     ensuite à coût constant via les jetons renvoyés.
+
+    Retourne (docs, next_token, prev_token). `_id` est retiré des docs.
+    """
+    if projection is not None:
+        projection = dict(projection)
+        projection.pop("_id", None)
+        projection["cmplnt_fr_dt"] = 1
+
+    backwards = False
+    if after:
+        dt, oid = decode_cursor(after)
+        cursor = coll.find(with_seek(q, seek_after(dt, oid)), projection).sort(SORT_NEXT)
+    elif before:
+        dt, oid = decode_cursor(before)
+        cursor = coll.find(with_seek(q, seek_before(dt, oid)), projection).sort(SORT_PREV)
+        backwards = True
+    else:
+        cursor = coll.find(q, projection).sort(SORT_NEXT).skip(skip)
+
+    # Un document de plus pour savoir s'il existe une page au-delà
+    docs = list(cursor.limit(page_size + 1))
+    has_more = len(docs) > page_size
+    docs = docs[:page_size]
+    if backwards:
+        docs.reverse()
+
+    if not docs:
+        return [], None, None
+
+    if backwards:
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, bool(after) or skip > 0
+
+    next_token = encode_cursor(docs[-1]) if has_next else None
+    prev_token = encode_cursor(docs[0]) if has_prev else None
+
+    for d in docs:
+        d.pop("_id", None)
+    return docs, next_token, prev_token
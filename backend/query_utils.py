@@ -14,13 +14,25 @@ Paramètres acceptés (tous optionnels) :
 - susp_race=...
 - start=YYYY-MM-DD
 - end=YYYY-MM-DD
-- q= texte (recherche plein texte)
+- q= texte (recherche libre)
+- q_mode=vocab|text|regex  (défaut : vocab si un vocabulaire est fourni, sinon regex)
+    vocab : le mot-clé est confronté (regex, insensible à la casse) au
+            vocabulaire des descriptions (quelques centaines de valeurs
+            distinctes), puis transformé en $in exacts -> index utilisables
+    text  : index texte (ofns_desc, prem_typ_desc) via $text
+    regex : $regex non ancré sur les champs (scan complet, repli explicite)
+
+Sexe / âge normalisés : si les documents portent les champs standardisés
+du loader (std_fields=True, cf. meta "dataset".champs_std), le filtre est
+une égalité (ou un petit $in) sur vic_sex_std, vic_age_std… au lieu d'un
+$in sur toutes les variantes brutes, "" et null compris.
 
 NOTE: Ce module ne modifie pas les données ; il construit seulement le filtre.
 """
 
+import re
 from datetime import datetime
-from normalization_maps import SEX_STD_TO_RAW, AGE_STD_TO_RAW
+from normalization_maps import SEX_STD_TO_RAW, AGE_STD_TO_RAW, AGE_STD_ALIASES
 
 
 def _csv(v):
@@ -55,59 +67,115 @@ def _filter_in(field: str, raw_vals):
     return {field: {"$in": raw_vals}}
 
 
-def build_query(args):
-    structured_filters = []
+def _filter_std(field: str, mapping: dict, std_list, aliases=None):
+    """Filtre sur un champ standardisé : égalité si une seule valeur,
+    sinon $in des seules valeurs standard (alias résolus)."""
+    vals = []
+    for s in std_list or []:
+        s = (aliases or {}).get(s, s)
+        if s in mapping and s not in vals:
+            vals.append(s)
+    if not vals:
+        return None
+    if len(vals) == 1:
+        return {field: vals[0]}
+    return {field: {"$in": vals}}
+
+
+def _filter_norm(field: str, std_field: str, mapping: dict, std_list, std_fields: bool, aliases=None):
+    """Filtre d'un champ normalisé (sexe / âge) : sur le champ standardisé
+    `std_field` si disponible, sinon sur les valeurs brutes de `field`."""
+    if std_fields:
+        return _filter_std(std_field, mapping, std_list, aliases)
+    return _filter_in(field, _expand(mapping, std_list))
+
+
+# Champs couverts par la recherche libre
+TEXT_SEARCH_FIELDS = ["ofns_desc", "prem_typ_desc", "boro_nm"]
+
+
+def _text_filter(q_text: str, mode: str, vocab=None):
+    """Clause de recherche libre selon le mode (cf. q_mode)."""
+    if mode == "text":
+        return {"$text": {"$search": q_text}}
+
+    if mode == "vocab" and vocab is not None:
+        try:
+            pattern = re.compile(q_text, re.IGNORECASE)
+        except re.error:
+            pattern = re.compile(re.escape(q_text), re.IGNORECASE)
+        branches = []
+        for field in TEXT_SEARCH_FIELDS:
+            vals = [v for v in vocab.get(field, []) if isinstance(v, str) and pattern.search(v)]
+            if vals:
+                branches.append({field: {"$in": vals}})
+        if not branches:
+            # aucun terme du vocabulaire : filtre vide, résolu par l'index
+            return {TEXT_SEARCH_FIELDS[0]: {"$in": []}}
+        return branches[0] if len(branches) == 1 else {"$or": branches}
+
+    regex_filter = {"$regex": q_text, "$options": "i"}
+    return {"$or": [{field: regex_filter} for field in TEXT_SEARCH_FIELDS]}
+
+
+def build_filters(args, vocab=None, std_fields=False):
+    """Clauses de filtre indexées par champ (dans l'ordre de build_query).
+
+    Clés : nom du champ MongoDB brut filtré (boro_nm, vic_age_group,
+    cmplnt_fr_dt…) ou "q" pour la recherche texte. Permet de retirer le
+    filtre d'un champ (facettes croisées) avant de recombiner.
+
+    `vocab` : {champ: [valeurs distinctes]} pour q_mode=vocab.
+    `std_fields` : filtrer sexe / âge sur les champs *_std du loader.
+    """
+    filters = {}
 
     # ---------------- Base ----------------
     b = _csv(args.get("borough"))
     if b:
-        structured_filters.append({"boro_nm": {"$in": b}})
+        filters["boro_nm"] = {"boro_nm": {"$in": b}}
 
     o = _csv(args.get("ofns_desc"))
     if o:
-        structured_filters.append({"ofns_desc": {"$in": o}})
+        filters["ofns_desc"] = {"ofns_desc": {"$in": o}}
 
     l = _csv(args.get("law_cat_cd"))
     if l:
-        structured_filters.append({"law_cat_cd": {"$in": l}})
+        filters["law_cat_cd"] = {"law_cat_cd": {"$in": l}}
 
     ca = _csv(args.get("crm_atpt_cptd_cd"))
     if ca:
-        structured_filters.append({"crm_atpt_cptd_cd": {"$in": ca}})
+        filters["crm_atpt_cptd_cd"] = {"crm_atpt_cptd_cd": {"$in": ca}}
 
     # ---------------- Victime ----------------
     vs_std = _csv(args.get("vic_sex"))  # F/M/U
     if vs_std:
-        raw = _expand(SEX_STD_TO_RAW, vs_std)
-        f = _filter_in("vic_sex", raw)
-        if f: structured_filters.append(f)
+        f = _filter_norm("vic_sex", "vic_sex_std", SEX_STD_TO_RAW, vs_std, std_fields)
+        if f: filters["vic_sex"] = f
 
     va_std = _csv(args.get("vic_age"))  # 0-17, 18-24...
     if va_std:
-        raw = _expand(AGE_STD_TO_RAW, va_std)
-        f = _filter_in("vic_age_group", raw)
-        if f: structured_filters.append(f)
+        f = _filter_norm("vic_age_group", "vic_age_std", AGE_STD_TO_RAW, va_std, std_fields, AGE_STD_ALIASES)
+        if f: filters["vic_age_group"] = f
 
     vr = _csv(args.get("vic_race"))
     if vr:
-        structured_filters.append({"vic_race": {"$in": vr}})
+        filters["vic_race"] = {"vic_race": {"$in": vr}}
 
     # ---------------- Suspect ----------------
     ss_std = _csv(args.get("susp_sex"))
     if ss_std:
-        raw = _expand(SEX_STD_TO_RAW, ss_std)
-        f = _filter_in("susp_sex", raw)
-        if f: structured_filters.append(f)
+        f = _filter_norm("susp_sex", "susp_sex_std", SEX_STD_TO_RAW, ss_std, std_fields)
+        if f: filters["susp_sex"] = f
 
     sa_std = _csv(args.get("susp_age"))
     if sa_std:
-        raw = _expand(AGE_STD_TO_RAW, sa_std)
-        f = _filter_in("susp_age_group", raw)
-        if f: structured_filters.append(f)
+        f = _filter_norm("susp_age_group", "susp_age_std", AGE_STD_TO_RAW, sa_std, std_fields, AGE_STD_ALIASES)
+        if f: filters["susp_age_group"] = f
 
     sr = _csv(args.get("susp_race"))
     if sr:
-        structured_filters.append({"susp_race": {"$in": sr}})
+        filters["susp_race"] = {"susp_race": {"$in": sr}}
 
     # ---------------- Dates ----------------
     start = args.get("start")
@@ -116,26 +184,46 @@ def build_query(args):
         try:
             sd = datetime.strptime(start, "%Y-%m-%d")
             ed = datetime.strptime(end, "%Y-%m-%d")
-            structured_filters.append({
+            filters["cmplnt_fr_dt"] = {
                 "cmplnt_fr_dt": {"$gte": sd, "$lte": ed}
-            })
+            }
         except Exception:
             pass
 
-    # ---------------- Texte (recherche libre via $regex) ----------------
+    # ---------------- Texte (recherche libre) ----------------
     q_text = args.get("q", "").strip()
     if q_text:
-        regex_filter = {"$regex": q_text, "$options": "i"}
-        structured_filters.append({
-            "$or": [
-                {"ofns_desc": regex_filter},
-                {"prem_typ_desc": regex_filter},
-                {"boro_nm": regex_filter}
-            ]
-        })
-
-    # ---------------- Final Query ----------------
-    if structured_filters:
-        return {"$and": structured_filters}
+        mode = args.get("q_mode") or ("vocab" if vocab is not None else "regex")
+        filters["q"] = _text_filter(q_text, mode, vocab)
+
+    return filters
+
+
+def combine_filters(clauses):
+    """Recompose une requête MongoDB à partir d'une liste de clauses."""
+    clauses = list(clauses)
+    if clauses:
+        return {"$and": clauses}
     else:
-        return {}
\ No newline at end of file
+        return {}
+
+
+def build_query(args, vocab=None, std_fields=False):
+    return combine_filters(build_filters(args, vocab, std_fields).values())
+
+
+def query_shape(q):
+    """Forme normalisée d'un filtre MongoDB : champs et opérateurs conservés,
+    valeurs remplacées par "?" (ex. pour regrouper les requêtes par forme)."""
+    if isinstance(q, dict):
+        out = {}
+        for k in sorted(q):
+            v = q[k]
+            if k in ("$and", "$or", "$nor") and isinstance(v, list):
+                out[k] = [query_shape(c) for c in v]
+            elif isinstance(v, dict):
+                out[k] = query_shape(v)
+            else:
+                out[k] = "?"
+        return out
+    return "?"
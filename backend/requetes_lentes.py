@@ -0,0 +1,253 @@
+"""
+Journal des requêtes lentes, avec leur plan d'exécution.
+
+Toute commande find / aggregate / count / distinct qui dépasse le seuil
+(NYC_CRIME_SLOW_MS, défaut SEUIL_MS_DEFAUT) est relevée par le
+CommandListener de metriques.py puis, hors du chemin de la requête (thread
+dédié, file bornée) :
+- résumée par sa forme : champs et opérateurs, valeurs retirées
+  (query_utils.query_shape ; pour un pipeline, forme du $match et nom des
+  étapes suivantes) ;
+- rejouée en explain("executionStats"), au plus une fois par forme et par
+  EXPLAIN_INTERVAL : plan gagnant, clés / documents examinés, COLLSCAN ;
+- écrite dans la collection plafonnée `slow_queries` (les plus anciennes
+  entrées disparaissent d'elles-mêmes).
+
+/api/requetes-lentes et `scripts/create_idexes.py --lentes` classent les
+formes par temps total : ce sont les premières candidates à un index.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo import DESCENDING
+
+from query_utils import query_shape
+
+SLOW_COLL_NAME = "slow_queries"
+SLOW_COLL_SIZE = 32 << 20   # octets (collection plafonnée)
+SLOW_COLL_MAX = 50_000      # documents
+SEUIL_ENV = "NYC_CRIME_SLOW_MS"
+SEUIL_MS_DEFAUT = 250
+EXPLAIN_INTERVAL = 300      # secondes entre deux explain d'une même forme
+EXPLAIN_SHAPES_MAX = 10_000  # formes dont on retient le dernier explain
+FILE_MAX = 1_000            # relevés en attente ; au-delà, ignorés
+
+# commande -> champs rejoués dans l'explain
+COMMANDES = {
+    "find": ("filter", "sort", "projection", "skip", "limit", "hint", "collation"),
+    "aggregate": ("pipeline", "hint", "collation"),
+    "count": ("query", "skip", "limit", "hint", "collation"),
+    "distinct": ("key", "query", "collation"),
+}
+
+
+# ------------------------------------------------------------
+# Formes et plans
+# ------------------------------------------------------------
+def command_shape(name, command):
+    """Forme normalisée d'une commande (sans aucune valeur de filtre)."""
+    if name == "aggregate":
+        stages = []
+        for stage in command.get("pipeline") or ():
+            op = next(iter(stage), "?")
+            stages.append({op: query_shape(stage[op])} if op == "$match" else op)
+        return {"pipeline": stages}
+    shape = {"filter": query_shape(command.get("filter") or command.get("query") or {})}
+    if command.get("sort"):
+        shape["sort"] = dict(command["sort"])
+    if name == "distinct":
+        shape["key"] = command.get("key")
+    return shape
+
+
+def shape_key(name, collection, shape):
+    return f"{name} {collection} " + json.dumps(shape, sort_keys=True, separators=(",", ":"))
+
+
+def plan_stages(plan, out=None):
+    """Étapes d'un plan (winningPlan), de la racine aux feuilles."""
+    out = [] if out is None else out
+    stage = plan.get("stage")
+    if stage == "IXSCAN":
+        out.append(f"IXSCAN {plan.get('indexName')}")
+    elif stage:
+        out.append(stage)
+    for child_key in ("inputStage", "inputStages", "queryPlan"):
+        child = plan.get(child_key)
+        if isinstance(child, dict):
+            plan_stages(child, out)
+        elif isinstance(child, list):
+            for c in child:
+                plan_stages(c, out)
+    return out
+
+
+def _find_key(doc, key):
+    """Premier sous-document contenant `key` (explain d'aggregate : le plan
+    est sous stages[0].$cursor selon les versions)."""
+    if isinstance(doc, dict):
+        if key in doc:
+            return doc
+        children = doc.values()
+    elif isinstance(doc, list):
+        children = doc
+    else:
+        return None
+    for v in children:
+        found = _find_key(v, key)
+        if found is not None:
+            return found
+    return None
+
+
+def explain_summary(explain):
+    """Résumé d'une sortie explain("executionStats")."""
+    planner = _find_key(explain, "queryPlanner") or {}
+    winning = (planner.get("queryPlanner") or {}).get("winningPlan") or {}
+    stages = plan_stages(winning)
+    stats = (_find_key(explain, "executionStats") or {}).get("executionStats") or {}
+    return {
+        "plan": " > ".join(stages),
+        "collscan": any(s == "COLLSCAN" for s in stages),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "n_returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+    }
+
+
+# ------------------------------------------------------------
+# Enregistrement
+# ------------------------------------------------------------
+class SlowQueryRecorder:
+    def __init__(self, db, seuil_ms=None):
+        self.db = db
+        self.coll = db[SLOW_COLL_NAME]
+        if seuil_ms is None:
+            seuil_ms = float(os.environ.get(SEUIL_ENV, SEUIL_MS_DEFAUT))
+        self.seuil = seuil_ms / 1000
+        self.ignores = 0
+        self._explained = OrderedDict()  # forme -> instant du dernier explain (du plus ancien au plus récent)
+        self._file = queue.Queue(maxsize=FILE_MAX)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._pret = False
+
+    # appelé par metriques.MongoListener (thread de la requête) : O(1)
+    def observer(self, name, database, collection, command, secondes, endpoint=None):
+        if name not in COMMANDES or secondes < self.seuil:
+            return
+        try:
+            self._file.put_nowait((name, database, collection, command, secondes, endpoint, datetime.utcnow()))
+        except queue.Full:
+            self.ignores += 1
+            return
+        self._demarrer()
+
+    def _demarrer(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._boucle, name="requetes-lentes", daemon=True)
+                self._thread.start()
+
+    def _boucle(self):
+        while True:
+            item = self._file.get()
+            try:
+                self._traiter(*item)
+            except Exception:
+                pass  # best effort : le journal ne doit jamais gêner l'API
+
+    def _creer_collection(self):
+        if self._pret:
+            return
+        if SLOW_COLL_NAME not in self.db.list_collection_names():
+            try:
+                self.db.create_collection(SLOW_COLL_NAME, capped=True, size=SLOW_COLL_SIZE, max=SLOW_COLL_MAX)
+            except Exception:
+                pass  # créée entre-temps par un autre worker
+        self.coll.create_index([("shape_key", 1), ("ts", DESCENDING)])
+        self._pret = True
+
+    def _traiter(self, name, database, collection, command, secondes, endpoint, ts):
+        self._creer_collection()
+        shape = command_shape(name, command)
+        key = shape_key(name, collection, shape)
+        now = time.monotonic()
+        explain = None
+        if now - self._explained.get(key, -EXPLAIN_INTERVAL) >= EXPLAIN_INTERVAL:
+            self._explained[key] = now
+            self._explained.move_to_end(key)
+            self._oublier(now)
+            explain = self._explain(name, database, collection, command)
+        self.coll.insert_one({
+            "ts": ts,
+            "command": name,
+            "collection": collection,
+            "endpoint": endpoint,
+            "duration_ms": round(secondes * 1000, 1),
+            "shape": json.dumps(shape, sort_keys=True),  # chaîne : les clés "$…" restent valides
+            "shape_key": key,
+            "explain": explain,
+        })
+
+    def _oublier(self, now):
+        """Retire les formes dont l'explain a expiré (elles seraient de toute
+        façon réexpliquées) et, au-delà de EXPLAIN_SHAPES_MAX, les plus anciennes."""
+        while self._explained:
+            key, t = next(iter(self._explained.items()))
+            if now - t < EXPLAIN_INTERVAL and len(self._explained) <= EXPLAIN_SHAPES_MAX:
+                break
+            del self._explained[key]
+
+    def _explain(self, name, database, collection, command):
+        cmd = {name: collection}
+        cmd.update({k: command[k] for k in COMMANDES[name] if k in command})
+        if name == "aggregate":
+            cmd["cursor"] = {}
+        try:
+            res = self.db.client[database].command("explain", cmd, verbosity="executionStats")
+        except Exception as e:
+            return {"error": str(e)}
+        return explain_summary(res)
+
+
+def ranking(coll, limit=20, since=None):
+    """Formes classées par temps total passé au-dessus du seuil."""
+    pipeline = [{"$match": {"ts": {"$gte": since}}}] if since else []
+    pipeline += [
+        # entrées avec explain en dernier, chacune dans l'ordre chronologique :
+        # $last donne l'explain le plus récent (un seul document par forme,
+        # quel que soit le nombre d'entrées)
+        {"$set": {"_explique": {"$cond": [{"$ifNull": ["$explain", False]}, 1, 0]}}},
+        {"$sort": {"_explique": 1, "ts": 1}},
+        {"$group": {
+            "_id": "$shape_key",
+            "command": {"$last": "$command"},        # constants pour une forme
+            "collection": {"$last": "$collection"},
+            "shape": {"$last": "$shape"},
+            "endpoints": {"$addToSet": "$endpoint"},
+            "count": {"$sum": 1},
+            "total_ms": {"$sum": "$duration_ms"},
+            "max_ms": {"$max": "$duration_ms"},
+            "avg_ms": {"$avg": "$duration_ms"},
+            "last_seen": {"$max": "$ts"},
+            "explain": {"$last": "$explain"},
+        }},
+        {"$sort": {"total_ms": -1}},
+        {"$limit": limit},
+    ]
+    out = []
+    for d in coll.aggregate(pipeline, allowDiskUse=True):
+        d["shape"] = json.loads(d["shape"])
+        d["avg_ms"] = round(d["avg_ms"], 1)
+        d["total_ms"] = round(d["total_ms"], 1)
+        d["endpoints"] = sorted(e for e in d["endpoints"] if e)
+        out.append(d)
+    return out
@@ -0,0 +1,191 @@
+"""
+Séries temporelles : nombre de plaintes par jour / semaine / mois / année.
+
+Le loader matérialise un agrégat journalier (collection `serie_jour`) :
+un document par (jour, boro_nm, law_cat_cd, ofns_desc, crm_atpt_cptd_cd)
+avec son effectif. Une série de dix ans se calcule alors sur quelques
+milliers de documents d'agrégat au lieu de millions de plaintes.
+
+Seuls les filtres portant sur ces dimensions (et sur les dates) peuvent
+être servis par l'agrégat ; pour tout autre filtre (victime, suspect,
+recherche libre…) on se rabat sur un $dateTrunc sur la collection brute.
+
+L'agrégat est versionné comme les tuiles : meta "serie_jour".generation
+doit égaler la génération courante du jeu de données pour être utilisé.
+Après un chargement incrémental, seuls les jours touchés par le delta sont
+recalculés (update_rollup) ; sinon l'agrégat est reconstruit en entier.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from cache import META_COLL_NAME
+
+ROLLUP_COLL_NAME = "serie_jour"
+ROLLUP_META_ID = "serie_jour"
+ROLLUP_DIMENSIONS = ["boro_nm", "law_cat_cd", "ofns_desc", "crm_atpt_cptd_cd"]
+ROLLUP_DAYS_BATCH = 500  # jours recalculés par agrégation (update_rollup)
+ROLLUP_RECHECK_S = 5  # agrégat absent : meta relu au plus toutes les N secondes
+
+# granularite (API) -> unité $dateTrunc
+GRANULARITES = {"jour": "day", "semaine": "week", "mois": "month", "annee": "year"}
+START_OF_WEEK = "monday"
+
+
+# ------------------------------------------------------------
+# Construction de l'agrégat (scripts/load_csv_to_mongo.py)
+# ------------------------------------------------------------
+def rollup_pipeline(match=None):
+    """Agrégat journalier de toute la collection ($out : remplacement
+    atomique), ou des seules plaintes de `match` ($merge dans l'agrégat)."""
+    group_id = {"date": {"$dateTrunc": {"date": "$cmplnt_fr_dt", "unit": "day"}}}
+    group_id.update({d: f"${d}" for d in ROLLUP_DIMENSIONS})
+    return [
+        {"$match": match or {"cmplnt_fr_dt": {"$type": "date"}}},
+        {"$group": {"_id": group_id, "count": {"$sum": 1}}},
+        {"$project": dict(
+            {"_id": 0, "date": "$_id.date", "count": 1},
+            **{d: f"$_id.{d}" for d in ROLLUP_DIMENSIONS}
+        )},
+        {"$merge": {"into": ROLLUP_COLL_NAME, "whenMatched": "replace", "whenNotMatched": "insert"}}
+        if match else {"$out": ROLLUP_COLL_NAME},
+    ]
+
+
+def rollup_generation(db):
+    """Génération à laquelle correspond l'agrégat actuel (None : aucun)."""
+    return (db[META_COLL_NAME].find_one({"_id": ROLLUP_META_ID}, {"generation": 1}) or {}).get("generation")
+
+
+def _stamp(db, generation):
+    n = db[ROLLUP_COLL_NAME].estimated_document_count()
+    db[META_COLL_NAME].replace_one(
+        {"_id": ROLLUP_META_ID},
+        {"_id": ROLLUP_META_ID, "generation": generation, "docs": n, "built_at": datetime.utcnow()},
+        upsert=True,
+    )
+    return n
+
+
+def build_rollup(coll, generation):
+    """(Re)construit `serie_jour` depuis `coll` et l'associe à `generation`."""
+    db = coll.database
+    list(coll.aggregate(rollup_pipeline(), allowDiskUse=True))
+    rollup = db[ROLLUP_COLL_NAME]
+    rollup.create_index([("date", 1)])
+    for d in ROLLUP_DIMENSIONS:
+        rollup.create_index([(d, 1), ("date", 1)])
+    return _stamp(db, generation)
+
+
+def update_rollup(coll, generation, days):
+    """Recalcule dans `serie_jour` les seuls jours `days` (datetimes à
+    minuit) et associe l'agrégat à `generation`.
+
+    L'agrégat doit être à jour pour le reste des jours (celui de la
+    génération précédente). Pendant la mise à jour, meta porte encore
+    l'ancienne génération : le backend ne lit pas un agrégat partiel."""
+    db = coll.database
+    rollup = db[ROLLUP_COLL_NAME]
+    days = sorted(set(days))
+    for i in range(0, len(days), ROLLUP_DAYS_BATCH):
+        batch = days[i:i + ROLLUP_DAYS_BATCH]
+        rollup.delete_many({"date": {"$in": batch}})
+        ranges = [{"cmplnt_fr_dt": {"$gte": d, "$lt": d + timedelta(days=1)}} for d in batch]
+        list(coll.aggregate(rollup_pipeline({"$or": ranges}), allowDiskUse=True))
+    return _stamp(db, generation)
+
+
+# ------------------------------------------------------------
+# Requêtes
+# ------------------------------------------------------------
+def rollup_match(filters: dict):
+    """Filtre équivalent sur l'agrégat, ou None s'il ne peut pas le servir.
+
+    `filters` : sortie de query_utils.build_filters (champ -> clause).
+    """
+    clauses = []
+    for field, clause in filters.items():
+        if field in ROLLUP_DIMENSIONS:
+            clauses.append(clause)
+        elif field == "cmplnt_fr_dt":
+            clauses.append({"date": clause["cmplnt_fr_dt"]})
+        else:
+            return None
+    return {"$and": clauses} if clauses else {}
+
+
+def series_pipeline(match, unit, date_field, count, par=None):
+    """[$match] + $group par date tronquée (et `par`) + tri chronologique.
+    `count` : 1 (plaintes) ou "$count" (documents d'agrégat)."""
+    trunc = {"date": f"${date_field}", "unit": unit}
+    if unit == "week":
+        trunc["startOfWeek"] = START_OF_WEEK
+    group_id = {"date": {"$dateTrunc": trunc}}
+    if par:
+        group_id[par] = f"${par}"
+    pipeline = [{"$match": match}] if match else []
+    pipeline += [
+        {"$group": {"_id": group_id, "count": {"$sum": count}}},
+        {"$sort": {"_id.date": 1}},
+    ]
+    return pipeline
+
+
+def _points(cursor, par=None):
+    out = []
+    for d in cursor:
+        if d["_id"]["date"] is None:
+            continue
+        p = {"date": d["_id"]["date"], "count": d["count"]}
+        if par:
+            p[par] = d["_id"].get(par)
+        out.append(p)
+    return out
+
+
+class DailyRollup:
+    """Accès à l'agrégat journalier, utilisé seulement s'il est à jour.
+
+    Un agrégat à jour le reste pour toute la génération. Un agrégat absent
+    ou en retard (génération changée avant la fin de sa construction) est
+    revérifié toutes les ROLLUP_RECHECK_S secondes : il est utilisé dès
+    qu'il est prêt, même si le loader n'a pas pu prévenir le backend."""
+
+    def __init__(self, db, generation, recheck=ROLLUP_RECHECK_S):
+        self.db = db
+        self.generation = generation
+        self.recheck = recheck
+        self._gen = object()  # sentinelle : rien en cache
+        self._ready = False
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def ready(self):
+        gen = self.generation.current()
+        now = time.monotonic()
+        with self._lock:
+            if gen != self._gen or (not self._ready and now - self._checked >= self.recheck):
+                meta = self.db[META_COLL_NAME].find_one({"_id": ROLLUP_META_ID}, {"generation": 1}) or {}
+                self._ready = gen is not None and meta.get("generation") == gen
+                self._gen, self._checked = gen, now
+            return self._ready
+
+    def clear(self):
+        with self._lock:
+            self._gen, self._ready, self._checked = object(), False, 0.0
+
+    def serves(self, filters):
+        """L'agrégat peut-il servir ces filtres (sinon : collection brute) ?"""
+        return self.ready() and rollup_match(filters) is not None
+
+    def series(self, coll, filters, q, unit, par=None):
+        """(points, source) ; source = "rollup" ou "complaints".
+        `par` : None ou une dimension de ROLLUP_DIMENSIONS (une série par valeur)."""
+        match = rollup_match(filters) if self.ready() else None
+        if match is not None:
+            pipeline = series_pipeline(match, unit, "date", "$count", par)
+            return _points(self.db[ROLLUP_COLL_NAME].aggregate(pipeline), par), "rollup"
+        pipeline = series_pipeline(q, unit, "cmplnt_fr_dt", 1, par)
+        return _points(coll.aggregate(pipeline, allowDiskUse=True), par), "complaints"
@@ -0,0 +1,78 @@
+"""
+Coalescence des requêtes identiques simultanées (« single-flight »).
+
+Quand N requêtes de même clé canonique arrivent pendant qu'un calcul est
+déjà en cours (lien partagé, recherche par défaut ouverte par tout le
+monde au même moment…), une seule exécution a lieu : les N-1 autres
+attendent son résultat (ou son exception) et le partagent. MongoDB voit un
+count / scan / $facet au lieu de N, sans qu'il faille garder le résultat
+en cache plus longtemps.
+
+Compteurs par groupe (exposés par /api/metrics et /api/cache) :
+- nyc_singleflight_executions_total : calculs réellement lancés ;
+- nyc_singleflight_coalesced_total  : requêtes servies par un calcul déjà en vol.
+"""
+
+import threading
+
+from metriques import registre, Compteur
+
+executions = registre.ajouter(Compteur(
+    "nyc_singleflight_executions_total", "Calculs lancés (une exécution par clé en vol)", ("groupe",),
+))
+coalesced = registre.ajouter(Compteur(
+    "nyc_singleflight_coalesced_total", "Requêtes ayant attendu un calcul identique déjà en vol", ("groupe",),
+))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, groupe):
+        self.groupe = groupe
+        self._calls = {}  # clé -> _Call en cours
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Résultat de fn(), partagé avec les appels concurrents de même `key`
+        (chaîne canonique, cf. cache.canonical_key)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            coalesced.inc(groupe=self.groupe)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        executions.inc(groupe=self.groupe)
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            en_vol = len(self._calls)
+        return {
+            "executions": executions.valeur(groupe=self.groupe),
+            "coalesced": coalesced.valeur(groupe=self.groupe),
+            "in_flight": en_vol,
+        }
@@ -0,0 +1,184 @@
+"""
+Agrégation spatiale (binning) pour la carte de densité.
+
+Plutôt que d'envoyer des millions de points au navigateur, on compte les
+plaintes par cellule :
+- carrés : $group directement dans MongoDB (aucun point ne quitte la base)
+- hexagones : passe NumPy vectorisée sur les lat/lon lues par lots
+
+La taille de cellule (en degrés) se déduit du niveau de zoom web-mercator :
+une tuile de 256 px couvre 360 / 2^zoom degrés de longitude, découpée en
+CELLS_PER_TILE cellules.
+"""
+
+import math
+
+import numpy as np
+
+from formats import batched, STREAM_BATCH_SIZE
+
+CELLS_PER_TILE = 16
+MIN_CELL = 0.0005   # ~50 m : borne le nombre de cellules renvoyées
+MAX_CELL = 1.0
+LAT_REF = 40.7      # latitude de NYC : corrige l'étirement des hexagones
+
+_SQRT3 = math.sqrt(3.0)
+_KX = math.cos(math.radians(LAT_REF))
+_KEY_OFFSET = 1 << 30
+_KEY_MULT = 1 << 31
+
+
+def cell_size_for_zoom(zoom: int) -> float:
+    """Largeur de cellule (degrés) adaptée à un niveau de zoom."""
+    cell = 360.0 / (2 ** zoom) / CELLS_PER_TILE
+    return min(max(cell, MIN_CELL), MAX_CELL)
+
+
+# ------------------------------------------------------------
+# Tuiles web-mercator (pyramide précalculée, cf. scripts/build_tiles.py)
+# ------------------------------------------------------------
+TILES_COLL_NAME = "tuiles"
+TILE_Z_MIN = 9
+TILE_Z_MAX = 15
+TILE_BINS = 16      # cellules par côté de tuile (puissance de 2)
+
+
+def lonlat_to_global_bins(lon, lat, zoom: int, bins: int = TILE_BINS):
+    """Indices globaux de cellule (gx, gy) au zoom donné (vectorisé).
+
+    Tuile = g // bins, cellule dans la tuile = g % bins.
+    """
+    n = (2 ** zoom) * bins
+    lat_r = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+    xn = (np.asarray(lon) + 180.0) / 360.0
+    yn = (1.0 - np.log(np.tan(lat_r) + 1.0 / np.cos(lat_r)) / math.pi) / 2.0
+    gx = np.clip(np.floor(xn * n), 0, n - 1).astype(np.int64)
+    gy = np.clip(np.floor(yn * n), 0, n - 1).astype(np.int64)
+    return gx, gy
+
+
+def global_bin_bounds(gx: int, gy: int, zoom: int, bins: int = TILE_BINS):
+    """(ouest, sud, est, nord) en degrés d'une cellule globale."""
+    n = (2 ** zoom) * bins
+
+    def lon(i):
+        return i / n * 360.0 - 180.0
+
+    def lat(j):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * j / n))))
+
+    return lon(gx), lat(gy + 1), lon(gx + 1), lat(gy)
+
+
+def tile_geojson(doc, boros=None, laws=None, years=None):
+    """FeatureCollection (polygones de cellules + count) d'une tuile précalculée,
+    restreinte aux facettes demandées (None = toutes)."""
+    features = []
+    if doc:
+        z, x, y = doc["z"], doc["x"], doc["y"]
+        counts = {}
+        for px, py, boro, law, year, count in doc["cells"]:
+            if boros and boro not in boros:
+                continue
+            if laws and law not in laws:
+                continue
+            if years and year not in years:
+                continue
+            counts[(px, py)] = counts.get((px, py), 0) + count
+        for (px, py), count in counts.items():
+            w, s, e, n = global_bin_bounds(x * TILE_BINS + px, y * TILE_BINS + py, z)
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Polygon", "coordinates": [[[w, s], [e, s], [e, n], [w, n], [w, s]]]},
+                # alpha : opacité log-échelonnée, prête pour le rendu deck.gl
+                "properties": {"count": count, "alpha": min(255, int(40 + 30 * math.log2(1 + count)))},
+            })
+    return {"type": "FeatureCollection", "features": features}
+
+
+# ------------------------------------------------------------
+# Carrés : agrégation MongoDB
+# ------------------------------------------------------------
+def square_pipeline(q: dict, cell: float):
+    return [
+        {"$match": q},
+        {"$group": {
+            "_id": {
+                "x": {"$floor": {"$divide": ["$longitude", cell]}},
+                "y": {"$floor": {"$divide": ["$latitude", cell]}},
+            },
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"_id.x": {"$ne": None}, "_id.y": {"$ne": None}}},
+    ]
+
+
+def square_bins(coll, q: dict, cell: float):
+    cells = []
+    for d in coll.aggregate(square_pipeline(q, cell), allowDiskUse=True):
+        cells.append({
+            "lat": (d["_id"]["y"] + 0.5) * cell,
+            "lon": (d["_id"]["x"] + 0.5) * cell,
+            "count": d["count"],
+        })
+    return cells
+
+
+# ------------------------------------------------------------
+# Hexagones : NumPy
+# ------------------------------------------------------------
+def _hex_axial(lat, lon, size):
+    """Coordonnées axiales (q, r) de l'hexagone (pointe en haut) contenant chaque point."""
+    x = lon * _KX
+    y = lat
+    qf = (_SQRT3 / 3.0 * x - y / 3.0) / size
+    rf = (2.0 / 3.0 * y) / size
+    sf = -qf - rf
+
+    q = np.round(qf)
+    r = np.round(rf)
+    s = np.round(sf)
+    dq = np.abs(q - qf)
+    dr = np.abs(r - rf)
+    ds = np.abs(s - sf)
+
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    q = np.where(fix_q, -r - s, q)
+    r = np.where(fix_r, -q - s, r)
+    return q.astype(np.int64), r.astype(np.int64)
+
+
+def hex_bins(coll, q: dict, cell: float):
+    """Compte les points par hexagone de largeur `cell` degrés."""
+    size = cell / _SQRT3
+    keys_parts = []
+    counts_parts = []
+
+    cursor = coll.find(q, {"_id": 0, "latitude": 1, "longitude": 1}).batch_size(STREAM_BATCH_SIZE)
+    for batch in batched(cursor):
+        lat = np.array([d.get("latitude") for d in batch], dtype=np.float64)
+        lon = np.array([d.get("longitude") for d in batch], dtype=np.float64)
+        ok = ~(np.isnan(lat) | np.isnan(lon))
+        hq, hr = _hex_axial(lat[ok], lon[ok], size)
+        keys = (hq + _KEY_OFFSET) * _KEY_MULT + (hr + _KEY_OFFSET)
+        # réduction par lot : la mémoire suit le nombre de cellules, pas de points
+        k, c = np.unique(keys, return_counts=True)
+        keys_parts.append(k)
+        counts_parts.append(c)
+
+    if not keys_parts:
+        return []
+
+    keys, inverse = np.unique(np.concatenate(keys_parts), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate(counts_parts)).astype(np.int64)
+
+    hq = keys // _KEY_MULT - _KEY_OFFSET
+    hr = keys % _KEY_MULT - _KEY_OFFSET
+    cx = size * (_SQRT3 * hq + _SQRT3 / 2.0 * hr)
+    cy = size * (1.5 * hr)
+
+    return [
+        {"lat": float(la), "lon": float(lo), "count": int(n)}
+        for la, lo, n in zip(cy, cx / _KX, counts)
+    ]
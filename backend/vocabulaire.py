@@ -0,0 +1,36 @@
+"""
+Vocabulaire des champs de recherche libre (valeurs distinctes).
+
+ofns_desc, prem_typ_desc et boro_nm sont de faible cardinalité (quelques
+dizaines à centaines de libellés). En confrontant le mot-clé à ce
+vocabulaire côté Python, query_utils transforme une recherche $regex
+(scan complet) en $in exacts, servis par les index simples.
+
+Rechargé uniquement quand la génération du jeu de données change.
+"""
+
+import threading
+
+from query_utils import TEXT_SEARCH_FIELDS
+
+
+class Vocabulary:
+    def __init__(self, coll, generation):
+        self.coll = coll
+        self.generation = generation
+        self._gen = object()  # sentinelle : rien en cache
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        gen = self.generation.current()
+        with self._lock:
+            if gen != self._gen:
+                # distinct sur un champ indexé : lecture de l'index seul
+                self._value = {f: self.coll.distinct(f) for f in TEXT_SEARCH_FIELDS}
+                self._gen = gen
+            return self._value
+
+    def clear(self):
+        with self._lock:
+            self._gen, self._value = object(), None
@@ -0,0 +1,8 @@
+"""
+Point d'entrée WSGI de production (app.run ne sert qu'au développement).
+
+    cd backend
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import app  # noqa: F401
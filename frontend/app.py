@@ -6,17 +6,35 @@ Explorateur Streamlit — Plainte NYC
 - Filtres Victime & Suspect (sexe, âge classes, race brute)
 - Plage de dates via calendrier
 - Pagination stable : seul tableau change de page
+- Pagination par curseur (keyset) : Précédent/Suivant à coût constant,
+  « Aller à la page N » reste possible mais coûte O(N) côté Mongo
+- Pages N-1 / N+1 préchargées en arrière-plan ; pages et points de la carte
+  dans un cache borné partagé par toutes les sessions (donnees.py)
 - Pas d'erreur si aucun résultat (pas de StreamlitValueAboveMaxError)
-- Carte = tous les points filtrés (⚠️ peut être lourd)
-- Âges dans tableau : champs dérivés age_vic_approx / age_susp_approx (borne basse de la tranche)
+- Carte = tous les points filtrés, ou densité agrégée côté serveur
+  (/api/densite) au-delà de SEUIL_POINTS_CARTE points
+- Évolution temporelle par borough (/api/serie, jour/semaine/mois/année)
+- Âges dans tableau : age_vic_approx / age_susp_approx (borne basse de la tranche),
+  stockés par le loader (vic_age_approx…) ou, à défaut, déduits du groupe
 """
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import requests
 import datetime
+import json
+import pydeck as pdk
+import pyarrow as pa
+from urllib.parse import urlencode
+
+from donnees import CacheBorne, Prechargeur
 
 API_BASE = "http://localhost:5000"
+SEUIL_POINTS_CARTE = 100_000  # au-delà : couche de densité agrégée
+ZOOM_CARTE = 11               # vue d'ensemble de NYC
+CACHE_DONNEES_MAX_OCTETS = 256 << 20  # pages + points de carte, toutes sessions
+CACHE_DONNEES_TTL = 600
 
 st.set_page_config(page_title="Visualisation interactive des plaintes enregistrées par la NYPD", layout="wide")
 st.title("🔎 Visualisation interactive des plaintes enregistrées par la NYPD")
@@ -61,15 +79,36 @@ if "filtres" not in st.session_state:
     st.session_state.filtres = {}
 if "page_actuelle" not in st.session_state:
     st.session_state.page_actuelle = 1
+if "curseur" not in st.session_state:
+    st.session_state.curseur = None  # ("after"|"before", jeton) ou None
 if "lignes_page" not in st.session_state:
     st.session_state.lignes_page = 1000
-if "map_df" not in st.session_state:
-    st.session_state.map_df = None
 if "total_resultats" not in st.session_state:
     st.session_state.total_resultats = 0
 if "total_pages" not in st.session_state:
     st.session_state.total_pages = 1
 
+# ------------------------------------------------------------------
+# Effectifs croisés : pour chaque option, le nombre de cas sous les
+# AUTRES filtres appliqués (/api/facettes/filtrees)
+# ------------------------------------------------------------------
+@st.cache_data(ttl=600, show_spinner=False)
+def charger_facettes_filtrees(filtres: dict):
+    try:
+        r = requests.get(f"{API_BASE}/api/facettes/filtrees", params=filtres)
+        return r.json() if r.status_code == 200 else {}
+    except Exception:
+        return {}
+
+facettes_filtrees = charger_facettes_filtrees(st.session_state.filtres) if st.session_state.filtres else {}
+
+def _avec_compte(nom):
+    """format_func affichant l'effectif croisé à côté de chaque option."""
+    if nom not in facettes_filtrees:
+        return str
+    comptes = {f["_id"]: f["count"] for f in facettes_filtrees[nom]}
+    return lambda v: f"{v} ({comptes.get(v, 0):,})"
+
 # ------------------------------------------------------------------
 # Date range from state
 # ------------------------------------------------------------------
@@ -99,24 +138,28 @@ with st.sidebar.form("filtres_form"):
     boroughs = st.multiselect(
         "Borough(s)",
         _vals("boro_nm"),
+        format_func=_avec_compte("boro_nm"),
         default=st.session_state.filtres.get("borough", "").split(",") if st.session_state.filtres.get("borough") else []
     )
 
     ofns = st.multiselect(
         "Infraction (top 100)",
         _vals("ofns_desc"),
+        format_func=_avec_compte("ofns_desc"),
         default=st.session_state.filtres.get("ofns_desc", "").split(",") if st.session_state.filtres.get("ofns_desc") else []
     )
 
     law_cats = st.multiselect(
         "Catégorie légale",
         _vals("law_cat_cd"),
+        format_func=_avec_compte("law_cat_cd"),
         default=st.session_state.filtres.get("law_cat_cd", "").split(",") if st.session_state.filtres.get("law_cat_cd") else []
     )
 
     crm_status = st.multiselect(
         "Statut de l'affaire",
         _vals("crm_atpt_cptd_cd"),
+        format_func=_avec_compte("crm_atpt_cptd_cd"),
         default=st.session_state.filtres.get("crm_atpt_cptd_cd", "").split(",") if st.session_state.filtres.get("crm_atpt_cptd_cd") else []
     )
 
@@ -142,6 +185,7 @@ with st.sidebar.form("filtres_form"):
     vic_race = st.multiselect(
         "Origine victime (brut)",
         _vals("vic_race"),
+        format_func=_avec_compte("vic_race"),
         default=vic_race_default,
     )
 
@@ -167,6 +211,7 @@ with st.sidebar.form("filtres_form"):
         susp_race = st.multiselect(
             "Origine suspect (brut)",
             _vals("susp_race"),  # backend fournit facette suspect
+            format_func=_avec_compte("susp_race"),
             default=susp_race_default,
         )
 
@@ -244,33 +289,160 @@ if soumis:
     st.session_state.filtres = _build_params()
     st.session_state.lignes_page = int(lignes_page)
     st.session_state.page_actuelle = 1
+    st.session_state.curseur = None
     st.session_state.run_search = True
-    st.session_state.map_df = None  # Forcer reload carte
 
 # ------------------------------------------------------------------
 # API calls
 # ------------------------------------------------------------------
-def api_recherche_table(filtres: dict, page: int, page_size: int):
+@st.cache_resource
+def couche_donnees():
+    """Cache borné + préchargeur, uniques pour le processus (toutes sessions)."""
+    cache = CacheBorne(CACHE_DONNEES_MAX_OCTETS, ttl=CACHE_DONNEES_TTL)
+    return cache, Prechargeur(cache)
+
+cache_donnees, prechargeur = couche_donnees()
+
+def _cle(nom: str, filtres: dict, *args):
+    return (nom, json.dumps(filtres, sort_keys=True)) + args
+
+def _fetch_recherche(filtres: dict, page: int, page_size: int, curseur=None):
     params = filtres.copy()
     params["page"] = page
     params["page_size"] = page_size
     params["mode"] = "table"
+    params["pagination"] = "keyset"
+    if curseur:
+        sens, jeton = curseur
+        params[sens] = jeton
+    params["format"] = "arrow"
     r = requests.get(f"{API_BASE}/api/recherche", params=params)
     r.raise_for_status()
-    return r.json()
+    # Arrow : page déjà en colonnes typées ; l'enveloppe (total, jetons…)
+    # est dans les métadonnées du schéma
+    table = pa.ipc.open_stream(r.content).read_all()
+    payload = json.loads(table.schema.metadata[b"meta"])
+    payload["data"] = table.to_pandas()
+    return payload
+
+def api_recherche_table(filtres: dict, page: int, page_size: int, curseur=None):
+    cle = _cle("recherche", filtres, page, page_size, curseur)
+    return cache_donnees.get_or_fetch(cle, lambda: _fetch_recherche(filtres, page, page_size, curseur))
+
+def precharger_pages_voisines(filtres: dict, page: int, page_size: int, payload: dict):
+    """Pages N+1 et N-1 (mêmes jetons que les boutons) chargées en arrière-plan."""
+    voisines = []
+    if payload.get("next") and page < payload["total_pages"]:
+        voisines.append((page + 1, ("after", payload["next"])))
+    if payload.get("prev") and page > 1:
+        voisines.append((page - 1, ("before", payload["prev"])))
+    for p, curseur in voisines:
+        prechargeur.precharger(
+            _cle("recherche", filtres, p, page_size, curseur),
+            lambda p=p, curseur=curseur: _fetch_recherche(filtres, p, page_size, curseur),
+        )
+
+def _fetch_carte_coords(filtres: dict):
+    # Coordonnées seules : float32 (lon, lat) little-endian, 8 octets/point,
+    # vues directement par NumPy (np.frombuffer, sans copie ni parsing)
+    r = requests.get(f"{API_BASE}/api/carte/coords", params=filtres)
+    r.raise_for_status()
+    n = int(r.headers.get("X-Points", 0))
+    xy = np.frombuffer(r.content, dtype="<f4", count=2 * n).reshape(n, 2)
+    return pd.DataFrame({"lon": xy[:, 0], "lat": xy[:, 1]})
+
+def api_carte_coords(filtres: dict):
+    return cache_donnees.get_or_fetch(_cle("coords", filtres), lambda: _fetch_carte_coords(filtres))
 
-@st.cache_data(show_spinner=False)
-def api_carte_full_cached(filtres: dict):
+@st.cache_data(ttl=600, show_spinner=False)
+def api_serie_cached(filtres: dict, granularite: str):
     params = filtres.copy()
-    r = requests.get(f"{API_BASE}/api/carte", params=params)
+    params["granularite"] = granularite
+    params["par"] = "boro_nm"
+    r = requests.get(f"{API_BASE}/api/serie", params=params)
     r.raise_for_status()
-    data = r.json()
-    df = pd.DataFrame(data)
-    if not df.empty and "latitude" in df.columns and "longitude" in df.columns:
-        df = df.dropna(subset=["latitude", "longitude"])
-        df["lat"] = df["latitude"].astype(float)
-        df["lon"] = df["longitude"].astype(float)
-    return df
+    df = pd.DataFrame(r.json()["points"], columns=["date", "count", "boro_nm"])
+    if df.empty:
+        return df
+    df["date"] = pd.to_datetime(df["date"])
+    # une colonne par borough pour st.line_chart
+    return df.pivot_table(index="date", columns="boro_nm", values="count", aggfunc="sum", fill_value=0)
+
+def _fetch_densite(filtres: dict, zoom: int):
+    params = filtres.copy()
+    params["zoom"] = zoom
+    params["shape"] = "hex"
+    r = requests.get(f"{API_BASE}/api/densite", params=params)
+    r.raise_for_status()
+    return pd.DataFrame(r.json()["cells"], columns=["lat", "lon", "count"])
+
+def api_densite(filtres: dict, zoom: int):
+    return cache_donnees.get_or_fetch(_cle("densite", filtres, zoom), lambda: _fetch_densite(filtres, zoom))
+
+def afficher_densite(df_cells: pd.DataFrame):
+    """Carte de chaleur pondérée par les comptes de chaque cellule."""
+    couche = pdk.Layer(
+        "HeatmapLayer",
+        data=df_cells,
+        get_position=["lon", "lat"],
+        get_weight="count",
+        radius_pixels=30,
+    )
+    vue = pdk.ViewState(
+        latitude=float(df_cells["lat"].mean()),
+        longitude=float(df_cells["lon"].mean()),
+        zoom=ZOOM_CARTE - 1,
+    )
+    st.pydeck_chart(pdk.Deck(layers=[couche], initial_view_state=vue))
+
+# ------------------------------------------------------------------
+# Tuiles précalculées (scripts/build_tiles.py) : le navigateur charge
+# /api/tuiles/{z}/{x}/{y} au fil des déplacements, sans toucher la
+# collection brute. Seuls borough / law_cat_cd / années complètes sont
+# précalculés ; sinon on retombe sur /api/densite.
+# ------------------------------------------------------------------
+FILTRES_TUILES = {"borough", "law_cat_cd", "start", "end"}
+
+@st.cache_data(ttl=600)
+def charger_meta_tuiles():
+    try:
+        r = requests.get(f"{API_BASE}/api/tuiles/meta")
+        return r.json() if r.status_code == 200 else {}
+    except Exception:
+        return {}
+
+def _params_tuiles(filtres: dict):
+    """Paramètres /api/tuiles équivalents aux filtres, ou None si non servables."""
+    if not charger_meta_tuiles().get("a_jour"):
+        return None
+    if set(filtres) - FILTRES_TUILES:
+        return None
+    p = {k: filtres[k] for k in ("borough", "law_cat_cd") if k in filtres}
+    if "start" in filtres:
+        sd = datetime.date.fromisoformat(filtres["start"])
+        ed = datetime.date.fromisoformat(filtres["end"])
+        # les tuiles sont ventilées par année entière uniquement
+        if (sd.month, sd.day) != (1, 1) or (ed.month, ed.day) != (12, 31):
+            return None
+        p["year"] = ",".join(str(a) for a in range(sd.year, ed.year + 1))
+    return p
+
+def afficher_tuiles(params: dict):
+    meta = charger_meta_tuiles()
+    url = f"{API_BASE}/api/tuiles/{{z}}/{{x}}/{{y}}"
+    if params:
+        url += "?" + urlencode(params)
+    couche = pdk.Layer(
+        "TileLayer",
+        data=url,
+        min_zoom=meta["z_min"],
+        max_zoom=meta["z_max"],
+        get_fill_color="[220, 60, 20, properties.alpha]",
+        stroked=False,
+        pickable=True,
+    )
+    vue = pdk.ViewState(latitude=40.70, longitude=-73.95, zoom=ZOOM_CARTE - 1)
+    st.pydeck_chart(pdk.Deck(layers=[couche], initial_view_state=vue, tooltip={"text": "{count}"}))
 
 # ------------------------------------------------------------------
 # Fonctions d'aide pour approx âge (front)
@@ -293,7 +465,7 @@ if st.session_state.run_search:
 
     # Table (page courante)
     try:
-        payload = api_recherche_table(filtres, page, page_size)
+        payload = api_recherche_table(filtres, page, page_size, st.session_state.curseur)
     except Exception as e:
         st.error(f"Erreur API /recherche : {e}")
         st.stop()
@@ -302,26 +474,58 @@ if st.session_state.run_search:
     total_pages = payload["total_pages"]
     st.session_state.total_resultats = total
     st.session_state.total_pages = total_pages
-
-    # Carte (full)
-    if st.session_state.map_df is None:
+    # Précédent / Suivant instantanés : chargés pendant le rendu de la page
+    precharger_pages_voisines(filtres, page, page_size, payload)
+
+    # Carte (full, ou densité agrégée si trop de points) : cache partagé,
+    # un changement de page ne la retélécharge pas
+    carte_agregee = total > SEUIL_POINTS_CARTE
+    params_tuiles = _params_tuiles(filtres) if carte_agregee else None
+    if params_tuiles is not None:
+        df_map = None  # tuiles chargées par le navigateur
+    else:
         try:
-            df_map = api_carte_full_cached(filtres)
+            if carte_agregee:
+                df_map = api_densite(filtres, ZOOM_CARTE)
+            else:
+                df_map = api_carte_coords(filtres)
         except Exception as e:
             st.error(f"Erreur API /carte : {e}")
             df_map = pd.DataFrame()
-        st.session_state.map_df = df_map
-    else:
-        df_map = st.session_state.map_df
 
-    st.subheader(f"Total des cas correspondants : {total:,}")
-    if df_map.empty:
+    prefixe = "≥ " if payload.get("total_type") == "capped" else ("≈ " if payload.get("approximate") else "")
+    st.subheader(f"Total des cas correspondants : {prefixe}{total:,}")
+    if df_map is None:
+        st.caption(f"Plus de {SEUIL_POINTS_CARTE:,} points : tuiles de densité précalculées.")
+        afficher_tuiles(params_tuiles)
+    elif df_map.empty:
         st.warning("Aucune donnée géolocalisable (ou aucun résultat).")
+    elif "count" in df_map.columns:
+        st.caption(
+            f"Plus de {SEUIL_POINTS_CARTE:,} points : densité agrégée côté serveur "
+            f"({len(df_map):,} cellules)."
+        )
+        afficher_densite(df_map)
     else:
-        if len(df_map) > 100_000:
-            st.caption(f"⚠️ {len(df_map):,} points à afficher — cela peut ralentir le navigateur.")
         st.map(df_map[["lat", "lon"]])
 
+    # Évolution temporelle (agrégat journalier côté serveur)
+    st.markdown("---")
+    st.subheader("Évolution dans le temps")
+    granularite = st.radio(
+        "Granularité", ["jour", "semaine", "mois", "annee"], index=2, horizontal=True,
+        format_func=lambda g: {"jour": "Jour", "semaine": "Semaine", "mois": "Mois", "annee": "Année"}[g],
+    )
+    try:
+        df_serie = api_serie_cached(filtres, granularite)
+    except Exception as e:
+        st.error(f"Erreur API /serie : {e}")
+        df_serie = pd.DataFrame()
+    if df_serie.empty:
+        st.info("Aucune date pour les filtres sélectionnés.")
+    else:
+        st.line_chart(df_serie)
+
     # Tableau
     st.markdown("---")
     st.subheader("Tableau des cas")
@@ -331,12 +535,15 @@ if st.session_state.run_search:
     else:
         st.write(f"Page {page} / {total_pages} — Lignes/page : {page_size}")
 
-        df_table = pd.DataFrame(payload["data"])
+        # copie superficielle : la page en cache est partagée entre sessions
+        df_table = payload["data"].copy(deep=False)
 
-        # Ajouter colonnes âge approx
-        if "vic_age_group" in df_table.columns:
+        # Colonnes âge approx : stockées par le loader, sinon déduites du groupe
+        df_table = df_table.rename(columns={"vic_age_approx": "age_vic_approx",
+                                            "susp_age_approx": "age_susp_approx"})
+        if "age_vic_approx" not in df_table.columns and "vic_age_group" in df_table.columns:
             df_table["age_vic_approx"] = approx_from_group(df_table["vic_age_group"])
-        if "susp_age_group" in df_table.columns:
+        if "age_susp_approx" not in df_table.columns and "susp_age_group" in df_table.columns:
             df_table["age_susp_approx"] = approx_from_group(df_table["susp_age_group"])
 
         # Option: masquer les colonnes group si tu préfères
@@ -349,24 +556,30 @@ if st.session_state.run_search:
         if total_pages > 1:
             col_prev, col_page, col_next = st.columns([1,2,1])
             with col_prev:
-                if st.button("⬅ Précédent", disabled=page <= 1):
+                if st.button("⬅ Précédent", disabled=page <= 1 or not payload.get("prev")):
                     st.session_state.page_actuelle = page - 1
+                    st.session_state.curseur = ("before", payload["prev"])
                     st.rerun()
             with col_page:
+                # sans `key` : le widget suit `value`, donc la page courante
+                # après un Précédent/Suivant (une valeur gardée en session
+                # ramènerait à l'ancienne page et jetterait le curseur)
                 page_val = st.number_input(
                     "Aller à la page",
                     min_value=1,
                     max_value=total_pages,
                     value=page,
                     step=1,
-                    key="page_input_number"
                 )
                 if page_val != page:
+                    # Saut direct : repli sur skip côté API (coût O(page))
                     st.session_state.page_actuelle = page_val
+                    st.session_state.curseur = None
                     st.rerun()
             with col_next:
-                if st.button("Suivant ➡", disabled=page >= total_pages):
+                if st.button("Suivant ➡", disabled=page >= total_pages or not payload.get("next")):
                     st.session_state.page_actuelle = page + 1
+                    st.session_state.curseur = ("after", payload["next"])
                     st.rerun()
 
 else:
@@ -0,0 +1,136 @@
+"""
+frontend/donnees.py
+
+Couche de données partagée entre toutes les sessions Streamlit :
+- un seul cache LRU par processus, borné en octets, au lieu d'une copie
+  par session dans st.session_state ou d'une copie désérialisée par appel
+  comme st.cache_data : la mémoire du serveur ne croît pas avec le nombre
+  d'utilisateurs ; les entrées expirent (ttl) pour suivre les rechargements
+  de données ;
+- un appel déjà en cours pour la même clé est attendu, pas relancé (une
+  page demandée pendant son préchargement n'est pas téléchargée deux fois) ;
+- préchargement en arrière-plan (pages N-1 / N+1 du tableau) sur un petit
+  pool de threads.
+
+Les valeurs mises en cache sont partagées : ne jamais les modifier en place.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+
+
+def poids(valeur) -> int:
+    """Taille approximative en octets (DataFrame, bytes, ou dict avec "data")."""
+    if isinstance(valeur, pd.DataFrame):
+        return int(valeur.memory_usage(deep=True).sum())
+    if isinstance(valeur, (bytes, bytearray)):
+        return len(valeur)
+    if isinstance(valeur, dict) and "data" in valeur:
+        return poids(valeur["data"]) + 1024
+    return 1024
+
+
+class CacheBorne:
+    """LRU thread-safe borné en octets, partagé entre sessions."""
+
+    def __init__(self, max_octets: int, ttl: float = 600):
+        self.max_octets = max_octets
+        self.ttl = ttl
+        self._entrees = OrderedDict()  # clé -> (valeur, poids, expiration)
+        self._en_cours = {}            # clé -> Future
+        self._octets = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def _lire(self, cle):
+        """Entrée valide ou None (appelant sous verrou)."""
+        entree = self._entrees.get(cle)
+        if entree is None:
+            return None
+        if entree[2] < time.monotonic():
+            self._octets -= entree[1]
+            del self._entrees[cle]
+            return None
+        self._entrees.move_to_end(cle)
+        return entree
+
+    def contient(self, cle) -> bool:
+        with self._lock:
+            return self._lire(cle) is not None or cle in self._en_cours
+
+    def get_or_fetch(self, cle, fetch):
+        """Valeur en cache, ou résultat de `fetch()` (un seul appel par clé
+        à la fois ; les exceptions sont propagées et rien n'est mis en cache)."""
+        with self._lock:
+            entree = self._lire(cle)
+            if entree is not None:
+                self.hits += 1
+                return entree[0]
+            futur = self._en_cours.get(cle)
+            proprietaire = futur is None
+            if proprietaire:
+                futur = self._en_cours[cle] = Future()
+                self.misses += 1
+        if not proprietaire:
+            return futur.result()
+
+        try:
+            valeur = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._en_cours[cle]
+            futur.set_exception(e)
+            raise
+        self._put(cle, valeur)
+        futur.set_result(valeur)
+        return valeur
+
+    def _put(self, cle, valeur):
+        p = poids(valeur)
+        with self._lock:
+            self._en_cours.pop(cle, None)
+            if p > self.max_octets:
+                return  # trop gros : servi, mais pas conservé
+            if cle in self._entrees:
+                self._octets -= self._entrees.pop(cle)[1]
+            self._entrees[cle] = (valeur, p, time.monotonic() + self.ttl)
+            self._octets += p
+            while self._octets > self.max_octets:
+                _, (_, q, _) = self._entrees.popitem(last=False)
+                self._octets -= q
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entrees": len(self._entrees),
+                "octets": self._octets,
+                "max_octets": self.max_octets,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class Prechargeur:
+    """Remplit un CacheBorne en arrière-plan ; les erreurs sont ignorées
+    (la page sera simplement chargée normalement si elle est demandée)."""
+
+    def __init__(self, cache: CacheBorne, threads: int = 2):
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="prechargement")
+
+    def precharger(self, cle, fetch):
+        if self.cache.contient(cle):
+            return
+        self._pool.submit(self._run, cle, fetch)
+
+    def _run(self, cle, fetch):
+        try:
+            self.cache.get_or_fetch(cle, fetch)
+        except Exception:
+            pass
@@ -0,0 +1,360 @@
+"""
+Benchmark reproductible de l'ingestion et de l'API.
+
+1. Données : CSV synthétique à graine fixe (scripts/generer_plaintes.py),
+   réutilisé s'il existe déjà, ou --csv pour un fichier existant.
+2. Ingestion chronométrée :
+   - scripts/load_csv_to_mongo.py dans une base dédiée (--db, défaut
+     nyc_crime_bench : la base de l'API n'est pas touchée), pour toutes
+     les cibles ; avec la cible memoire, seulement si un mongod répond ;
+   - cible memoire : en plus, scripts/csv_to_parquet.py puis chargement du
+     moteur en mémoire (backend/memoire.py) : aucun mongod nécessaire.
+   Les durées (et les lignes/s) sont mesurées dans le processus de chaque
+   script (--rapport) : le démarrage de Python et les imports n'y sont pas ;
+   la durée du processus entier est donnée à part (*_processus_s).
+3. Charge fixe : chaque mélange de filtres (MELANGES, paramètres de
+   build_query) sur /api/recherche, /api/carte et /api/facettes(/filtrees),
+   en processus (client de test Flask) ou contre un backend lancé (--url).
+   Premier passage = « froid » (caches vides), répétitions = « chaud ».
+4. Sortie JSON : p50 / p95 / p99 / moyenne (ms) et débit (req/s) par
+   endpoint et par mélange ; --comparer ancien.json affiche les écarts de
+   p95 et sort en erreur (code 1) au-delà de --tolerance.
+
+Usage :
+    python scripts/bench_api.py --lignes 100k --cible memoire --sortie bench.json
+    python scripts/bench_api.py --lignes 1m --cible mongo --rapide --comparer bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from pymongo import MongoClient
+
+from generer_plaintes import generer, TAILLES, GRAINE
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(SCRIPTS_DIR, "..", "backend")
+
+MONGO_URI = "mongodb://localhost:27017"
+DB_BENCH = "nyc_crime_bench"
+
+REPETITIONS = 20  # passages « chauds » par (endpoint, mélange)
+CLIENTS = 4       # requêtes simultanées
+TOLERANCE = 0.20  # --comparer : régression si p95 > ancien × (1 + tolérance)
+
+# Mélanges de filtres fixes (paramètres de query_utils.build_query)
+MELANGES = {
+    "sans_filtre": {},
+    "borough": {"borough": "BROOKLYN"},
+    "borough_categorie": {"borough": "BRONX,QUEENS", "law_cat_cd": "FELONY"},
+    "infraction": {"ofns_desc": "ROBBERY,BURGLARY"},
+    "victime": {"vic_sex": "F", "vic_age": "18-24,25-44"},
+    "suspect_race": {"susp_sex": "M", "susp_race": "BLACK HISPANIC,WHITE HISPANIC"},
+    "dates_annee": {"start": "2019-01-01", "end": "2019-12-31"},
+    "dates_borough": {"start": "2015-06-01", "end": "2015-08-31", "borough": "MANHATTAN"},
+    "texte": {"q": "larceny"},
+    "mixte": {"borough": "BROOKLYN", "law_cat_cd": "MISDEMEANOR", "vic_sex": "M",
+              "start": "2010-01-01", "end": "2020-12-31"},
+}
+
+# endpoint -> (paramètres fixes, mélanges exécutés ; None = tous)
+# /api/carte renvoie tous les points : limité aux mélanges sélectifs
+ENDPOINTS = {
+    "/api/recherche": ({"page_size": 100, "pagination": "keyset", "mode": "table"}, None),
+    "/api/carte": ({}, ["borough_categorie", "infraction", "dates_borough", "mixte"]),
+    "/api/facettes": ({}, ["sans_filtre"]),
+    "/api/facettes/filtrees": ({}, None),
+}
+
+
+# ------------------------------------------------------------
+# Données et ingestion
+# ------------------------------------------------------------
+def preparer_csv(opts):
+    if opts.csv:
+        return opts.csv
+    lignes = TAILLES.get(opts.lignes.lower()) or int(opts.lignes)
+    chemin = os.path.join("data", f"synthetique_{lignes}_{opts.graine}.csv")
+    if not os.path.exists(chemin):
+        print(f"Génération de {chemin}...")
+        generer(chemin, lignes, opts.graine)
+    return chemin
+
+
+def _script(nom, *args):
+    """Lance un script avec --rapport : (durée du processus entier, rapport
+    JSON du script, c.-à-d. les durées mesurées à l'intérieur)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        chemin = os.path.join(tmp, "rapport.json")
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, nom), *args, "--rapport", chemin], check=True)
+        processus = time.perf_counter() - t0
+        with open(chemin) as f:
+            return processus, json.load(f)
+
+
+def _mongo_joignable(uri):
+    try:
+        MongoClient(uri, serverSelectionTimeoutMS=2000).admin.command("ping")
+        return True
+    except Exception:
+        return False
+
+
+def _debit(lignes, secondes):
+    return round(lignes / secondes) if secondes else None
+
+
+def ingerer(opts, csv):
+    """Durées d'ingestion (s) ; prépare l'environnement du backend."""
+    lignes = _compter_lignes(csv)
+    out = {"lignes_csv": lignes}
+    if not opts.sans_ingestion:
+        if opts.cible == "mongo" or _mongo_joignable(opts.mongo_uri):
+            args = ["--csv", csv, "--mongo-uri", opts.mongo_uri, "--db", opts.db]
+            if opts.rapide:
+                args.append("--rapide")
+            if opts.bitmaps:
+                args.append("--bitmaps")
+            processus, r = _script("load_csv_to_mongo.py", *args)
+            out.update(
+                load_csv_to_mongo_s=r["chargement_s"],
+                load_csv_to_mongo_finalisation_s=r["finalisation_s"],
+                load_csv_to_mongo_processus_s=processus,
+                load_csv_to_mongo_lignes_par_s=_debit(lignes, r["chargement_s"]),
+            )
+        else:
+            print("(mongod injoignable : load_csv_to_mongo.py non chronométré)")
+    if opts.cible == "mongo":
+        os.environ["NYC_CRIME_MONGO_URI"] = opts.mongo_uri
+        os.environ["NYC_CRIME_DB"] = opts.db
+    else:
+        parquet = os.path.splitext(csv)[0] + ".parquet"
+        if not (opts.sans_ingestion and os.path.exists(parquet)):
+            processus, r = _script("csv_to_parquet.py", csv, parquet)
+            out.update(
+                csv_to_parquet_s=r["conversion_s"],
+                csv_to_parquet_processus_s=processus,
+                csv_to_parquet_lignes_par_s=_debit(lignes, r["conversion_s"]),
+            )
+        os.environ["NYC_CRIME_BACKEND"] = "memoire"
+        os.environ["NYC_CRIME_SOURCE"] = os.path.abspath(parquet)
+    return out
+
+
+def _compter_lignes(csv):
+    with open(csv, "rb") as f:
+        return sum(1 for _ in f) - 1
+
+
+# ------------------------------------------------------------
+# Clients : en processus (Flask) ou HTTP
+# ------------------------------------------------------------
+class ClientLocal:
+    def __init__(self):
+        sys.path.insert(0, BACKEND_DIR)
+        t0 = time.perf_counter()
+        import app as backend  # noqa: E402  (env du backend positionné avant)
+        self.demarrage_s = time.perf_counter() - t0  # inclut le chargement en mémoire
+        self.app = backend.app
+        self._local = threading.local()
+
+    def get(self, chemin, params):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        r = client.get(chemin, query_string=params)
+        r.get_data()
+        return r.status_code
+
+
+class ClientHTTP:
+    demarrage_s = None
+
+    def __init__(self, url):
+        import requests
+        self.url = url.rstrip("/")
+        self._requests = requests
+        self._local = threading.local()
+        self._requests.post(f"{self.url}/api/cache/invalider", timeout=30)
+
+    def get(self, chemin, params):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        r = session.get(self.url + chemin, params=params, timeout=300)
+        return r.status_code
+
+
+# ------------------------------------------------------------
+# Charge
+# ------------------------------------------------------------
+def requetes():
+    """[(endpoint, mélange, paramètres)] dans un ordre fixe."""
+    out = []
+    for endpoint, (fixes, melanges) in ENDPOINTS.items():
+        for nom in melanges or MELANGES:
+            out.append((endpoint, nom, dict(MELANGES[nom], **fixes)))
+    return out
+
+
+def _mesurer(client, endpoint, params):
+    t = time.perf_counter()
+    status = client.get(endpoint, params)
+    ms = (time.perf_counter() - t) * 1000
+    if status != 200:
+        raise RuntimeError(f"{endpoint} {params} -> HTTP {status}")
+    return ms
+
+
+def executer(client, repetitions, clients):
+    liste = requetes()
+
+    # froid : chaque requête une fois, séquentiellement, caches vides
+    froid = {(e, m): [_mesurer(client, e, p)] for e, m, p in liste}
+
+    # chaud : `repetitions` passages répartis sur `clients` threads
+    chaud = {(e, m): [] for e, m, _ in liste}
+    taches = [(e, m, p) for _ in range(repetitions) for e, m, p in liste]
+    verrou = threading.Lock()
+    erreurs = []
+
+    def travailleur(i):
+        for e, m, p in taches[i::clients]:
+            try:
+                ms = _mesurer(client, e, p)
+            except Exception as exc:
+                erreurs.append(exc)
+                return
+            with verrou:
+                chaud[(e, m)].append(ms)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=travailleur, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duree = time.perf_counter() - t0
+    if erreurs:
+        raise erreurs[0]
+    return froid, chaud, len(taches) / duree
+
+
+def stats(ms, duree_s=None):
+    a = np.asarray(ms, dtype=float)
+    out = {
+        "n": int(a.size),
+        "p50_ms": round(float(np.percentile(a, 50)), 2),
+        "p95_ms": round(float(np.percentile(a, 95)), 2),
+        "p99_ms": round(float(np.percentile(a, 99)), 2),
+        "moyenne_ms": round(float(a.mean()), 2),
+    }
+    if duree_s:
+        out["req_par_s"] = round(a.size / duree_s, 1)
+    return out
+
+
+def rapport(froid, chaud, debit):
+    par_endpoint = {}
+    for endpoint in ENDPOINTS:
+        f = [v for (e, _), ms in froid.items() if e == endpoint for v in ms]
+        c = [v for (e, _), ms in chaud.items() if e == endpoint for v in ms]
+        par_endpoint[endpoint] = {"froid": stats(f), "chaud": stats(c)}
+    par_melange = {
+        f"{e} {m}": {"froid_ms": round(froid[(e, m)][0], 2), "chaud": stats(chaud[(e, m)])}
+        for (e, m) in froid
+    }
+    return {"debit_req_par_s": round(debit, 1), "endpoints": par_endpoint, "melanges": par_melange}
+
+
+# ------------------------------------------------------------
+# Comparaison entre deux exécutions
+# ------------------------------------------------------------
+def comparer(ancien, nouveau, tolerance):
+    """Affiche les écarts de p95 (chaud et froid) ; True si régression."""
+    regression = False
+    print(f"\n{'endpoint':<26} {'phase':<6} {'p95 avant':>10} {'p95 après':>10} {'écart':>8}")
+    for endpoint, phases in nouveau["charge"]["endpoints"].items():
+        for phase, s in phases.items():
+            avant = ancien.get("charge", {}).get("endpoints", {}).get(endpoint, {}).get(phase)
+            if not avant:
+                continue
+            ecart = s["p95_ms"] / avant["p95_ms"] - 1 if avant["p95_ms"] else 0.0
+            alerte = ecart > tolerance
+            regression |= alerte
+            print(f"{endpoint:<26} {phase:<6} {avant['p95_ms']:>10.1f} {s['p95_ms']:>10.1f} "
+                  f"{ecart:>+7.0%}{'  ⚠' if alerte else ''}")
+    return regression
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion + API")
+    parser.add_argument("--lignes", default="100k", help="100k / 1m / 10m ou un nombre")
+    parser.add_argument("--graine", type=int, default=GRAINE)
+    parser.add_argument("--csv", help="CSV existant (au lieu du synthétique)")
+    parser.add_argument("--cible", choices=["mongo", "memoire"], default="mongo")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--db", default=DB_BENCH)
+    parser.add_argument("--rapide", action="store_true", help="loader en mode --rapide")
+    parser.add_argument("--bitmaps", action="store_true", help="loader avec --bitmaps (index des totaux)")
+    parser.add_argument("--sans-ingestion", action="store_true", help="réutiliser les données déjà chargées")
+    parser.add_argument("--url", help="backend déjà lancé (sinon : en processus)")
+    parser.add_argument("--repetitions", type=int, default=REPETITIONS)
+    parser.add_argument("--clients", type=int, default=CLIENTS)
+    parser.add_argument("--sortie", help="fichier JSON (sinon : sortie standard)")
+    parser.add_argument("--comparer", help="JSON d'une exécution précédente")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    opts = parser.parse_args()
+
+    csv = preparer_csv(opts)
+    ingestion = ingerer(opts, csv)
+
+    client = ClientHTTP(opts.url) if opts.url else ClientLocal()
+    if client.demarrage_s is not None:
+        ingestion["demarrage_backend_s"] = round(client.demarrage_s, 2)
+    froid, chaud, debit = executer(client, opts.repetitions, opts.clients)
+
+    resultat = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "csv": csv,
+            "graine": None if opts.csv else opts.graine,
+            "cible": opts.cible,
+            "url": opts.url,
+            "repetitions": opts.repetitions,
+            "clients": opts.clients,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "ingestion": {k: round(v, 2) if isinstance(v, float) else v for k, v in ingestion.items()},
+        "charge": rapport(froid, chaud, debit),
+    }
+
+    texte = json.dumps(resultat, indent=2, ensure_ascii=False)
+    if opts.sortie:
+        with open(opts.sortie, "w", encoding="utf-8") as f:
+            f.write(texte)
+        print(f"✅ Résultats : {opts.sortie}")
+    else:
+        print(texte)
+
+    if opts.comparer:
+        with open(opts.comparer, encoding="utf-8") as f:
+            ancien = json.load(f)
+        if comparer(ancien, resultat, opts.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
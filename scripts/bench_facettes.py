@@ -0,0 +1,105 @@
+"""
+Facettes : une passe $facet ou une agrégation par facette en parallèle ?
+
+Pour chaque mélange de filtres du benchmark (bench_api.MELANGES) et pour
+les facettes globales, mesure les deux chemins sur la même base :
+- $facet   : facettes.facet_pipeline / crossfilter_pipeline ;
+- fan-out  : facettes.facet_pipelines / crossfilter_pipelines sur le pool
+             de concurrence.py (celui de l'API, NYC_CRIME_POOL).
+puis affiche le p50 de chacun, le gagnant, et le chemin que choisit l'API
+(facettes.should_fan_out, d'après les index existants) : la colonne « ok »
+signale les mélanges où l'heuristique ne prend pas le plus rapide.
+
+Les deux chemins sont exécutés en alternance, après un passage à vide,
+pour qu'aucun ne profite seul du cache de MongoDB.
+
+Usage : python scripts/bench_facettes.py [--db nyc_crime_bench] [--repetitions 10] [--sortie facettes.json]
+        (après bench_api.py --cible mongo, ou sur la base de l'API avec --db nyc_crime)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from pymongo import MongoClient
+
+from bench_api import MONGO_URI, DB_BENCH, MELANGES, stats
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from cache import META_COLL_NAME, DATASET_META_ID  # noqa: E402
+from concurrence import en_parallele_dict, POOL_SIZE  # noqa: E402
+from facettes import (  # noqa: E402
+    IndexCatalog, facet_pipeline, facet_pipelines, crossfilter_pipeline, crossfilter_pipelines,
+    run_pipelines, should_fan_out,
+)
+from query_utils import build_filters  # noqa: E402
+
+COLL_NAME = "complaints"
+REPETITIONS = 10
+
+
+def chemins(coll, filters):
+    """(fonction $facet, fonction fan-out) pour ces filtres ({} : globales)."""
+    if filters:
+        unique = lambda: next(coll.aggregate(crossfilter_pipeline(filters), allowDiskUse=True))  # noqa: E731
+        eclate = lambda: run_pipelines(coll, crossfilter_pipelines(filters), en_parallele_dict)  # noqa: E731
+    else:
+        unique = lambda: next(coll.aggregate(facet_pipeline(), allowDiskUse=True))  # noqa: E731
+        eclate = lambda: run_pipelines(coll, facet_pipelines(), en_parallele_dict)  # noqa: E731
+    return unique, eclate
+
+
+def chronometrer(fn):
+    t = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t) * 1000
+
+
+def mesurer(coll, filters, repetitions):
+    unique, eclate = chemins(coll, filters)
+    unique(), eclate()  # passage à vide
+    ms = {"facet": [], "fan_out": []}
+    for _ in range(repetitions):
+        ms["facet"].append(chronometrer(unique))
+        ms["fan_out"].append(chronometrer(eclate))
+    return {k: stats(v) for k, v in ms.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Facettes : $facet contre fan-out")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--db", default=DB_BENCH)
+    parser.add_argument("--repetitions", type=int, default=REPETITIONS)
+    parser.add_argument("--sortie", help="fichier JSON (en plus du tableau)")
+    opts = parser.parse_args()
+
+    db = MongoClient(opts.mongo_uri, maxPoolSize=POOL_SIZE + 2)[opts.db]
+    coll = db[COLL_NAME]
+    dataset = db[META_COLL_NAME].find_one({"_id": DATASET_META_ID}) or {}
+    std_fields = bool(dataset.get("champs_std"))
+    indexed = IndexCatalog(coll).leading()
+    print(f"{coll.estimated_document_count()} documents, pool {POOL_SIZE}, "
+          f"index sur : {', '.join(sorted(indexed))}\n")
+
+    resultats = {}
+    print(f"{'mélange':<20} {'$facet p50':>11} {'fan-out p50':>12} {'gagnant':>8} {'API':>8}  ok")
+    for nom, params in MELANGES.items():
+        filters = build_filters(params, None, std_fields=std_fields)
+        r = mesurer(coll, filters, opts.repetitions)
+        gagnant = "fan_out" if r["fan_out"]["p50_ms"] < r["facet"]["p50_ms"] else "facet"
+        choix = "fan_out" if should_fan_out(filters, indexed) else "facet"
+        r.update(gagnant=gagnant, choix_api=choix)
+        resultats[nom] = r
+        print(f"{nom:<20} {r['facet']['p50_ms']:>11.1f} {r['fan_out']['p50_ms']:>12.1f} "
+              f"{gagnant:>8} {choix:>8}  {'✓' if gagnant == choix else '✗'}")
+
+    if opts.sortie:
+        with open(opts.sortie, "w", encoding="utf-8") as f:
+            json.dump({"index": sorted(indexed), "pool": POOL_SIZE, "melanges": resultats}, f, indent=2)
+        print(f"\n✅ Résultats : {opts.sortie}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compare les modes de recherche libre (q_mode) de query_utils :
+- regex : $regex insensible à la casse, non ancré (scan complet)
+- vocab : mot-clé confronté au vocabulaire -> $in exacts (index simples)
+- text  : index texte via $text (sémantique différente : mots entiers,
+          racinisation, et boro_nm non couvert)
+
+Pour chaque mot-clé et chaque mode : temps médian de count_documents,
+documents / clés examinés (explain executionStats) et total trouvé.
+
+Usage : python scripts/bench_recherche_texte.py [mot-clé ...]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from query_utils import build_query, TEXT_SEARCH_FIELDS  # noqa: E402
+
+MONGO_URI = "mongodb://localhost:27017"
+DB_NAME = "nyc_crime"
+COLL_NAME = "complaints"
+
+MODES = ["regex", "vocab", "text"]
+DEFAULT_KEYWORDS = ["ASSAULT", "larceny", "STREET", "BROOKLYN", "burglary", "subway"]
+REPEAT = 5
+
+
+def execution_stats(db, q):
+    explain = db.command(
+        "explain",
+        {"find": COLL_NAME, "filter": q},
+        verbosity="executionStats",
+    )
+    stats = explain["executionStats"]
+    return stats["totalDocsExamined"], stats["totalKeysExamined"]
+
+
+def main():
+    keywords = sys.argv[1:] or DEFAULT_KEYWORDS
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    coll = db[COLL_NAME]
+
+    t0 = time.perf_counter()
+    vocab = {f: coll.distinct(f) for f in TEXT_SEARCH_FIELDS}
+    print(f"Vocabulaire chargé en {(time.perf_counter() - t0) * 1000:.0f} ms "
+          f"({sum(len(v) for v in vocab.values())} valeurs)\n")
+
+    print(f"{'mot-clé':<12} {'mode':<6} {'total':>10} {'médiane ms':>11} {'docs exam.':>11} {'clés exam.':>11}")
+    for kw in keywords:
+        for mode in MODES:
+            q = build_query({"q": kw, "q_mode": mode}, vocab=vocab)
+            try:
+                timings = []
+                for _ in range(REPEAT):
+                    t = time.perf_counter()
+                    total = coll.count_documents(q)
+                    timings.append((time.perf_counter() - t) * 1000)
+                docs, keys = execution_stats(db, q)
+            except Exception as e:  # ex. index texte absent
+                print(f"{kw:<12} {mode:<6} erreur : {e}")
+                continue
+            print(f"{kw:<12} {mode:<6} {total:>10} {statistics.median(timings):>11.1f} {docs:>11} {keys:>11}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
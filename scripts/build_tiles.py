@@ -0,0 +1,154 @@
+"""
+Précalcule la pyramide de tuiles de la carte (collection `tuiles`).
+
+Pour chaque zoom TILE_Z_MIN..TILE_Z_MAX et chaque tuile web-mercator
+(z/x/y), on stocke les comptes par cellule (TILE_BINS x TILE_BINS) ventilés
+par les facettes principales : boro_nm, law_cat_cd, année de cmplnt_fr_dt.
+
+Le niveau le plus fin est calculé en une passe sur les points `location`
+de la collection complaints ; chaque niveau inférieur est obtenu en
+regroupant le précédent (gx >> 1, gy >> 1), sans relire les plaintes.
+
+/api/tuiles/{z}/{x}/{y} sert ensuite ces documents par simple lecture
+d'_id : la carte ne touche plus jamais la collection brute.
+
+Usage : python scripts/build_tiles.py [--mongo-uri URI] [--db BASE]   (après load_csv_to_mongo.py)
+Par défaut, la même base que le backend (NYC_CRIME_MONGO_URI / NYC_CRIME_DB).
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from spatial import (  # noqa: E402
+    TILES_COLL_NAME, TILE_Z_MIN, TILE_Z_MAX, TILE_BINS, lonlat_to_global_bins,
+)
+
+MONGO_URI = os.environ.get("NYC_CRIME_MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("NYC_CRIME_DB", "nyc_crime")
+COLL_NAME = "complaints"
+META_COLL_NAME = "meta"
+READ_BATCH = 200_000
+WRITE_BATCH = 500
+
+FACETS = ["boro_nm", "law_cat_cd", "year"]
+
+
+def read_base_level(coll):
+    """Comptes par (cellule globale au zoom max, facettes), lus par lots."""
+    projection = {"_id": 0, "location.coordinates": 1, "boro_nm": 1, "law_cat_cd": 1, "cmplnt_fr_dt": 1}
+    cursor = coll.find({"location": {"$exists": True}}, projection).batch_size(READ_BATCH)
+
+    parts = []
+    batch = []
+    n = 0
+
+    def flush(batch):
+        coords = np.array([d["location"]["coordinates"] for d in batch], dtype=np.float64)
+        gx, gy = lonlat_to_global_bins(coords[:, 0], coords[:, 1], TILE_Z_MAX)
+        dts = pd.to_datetime(pd.Series([d.get("cmplnt_fr_dt") for d in batch]), errors="coerce")
+        df = pd.DataFrame({
+            "gx": gx,
+            "gy": gy,
+            "boro_nm": [d.get("boro_nm") for d in batch],
+            "law_cat_cd": [d.get("law_cat_cd") for d in batch],
+            "year": dts.dt.year.astype("Int64"),
+        })
+        # réduction par lot : la mémoire suit le nombre de cellules distinctes
+        return df.groupby(["gx", "gy"] + FACETS, dropna=False).size().rename("count").reset_index()
+
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= READ_BATCH:
+            parts.append(flush(batch))
+            n += len(batch)
+            batch = []
+            print(f"...{n} points lus")
+    if batch:
+        parts.append(flush(batch))
+        n += len(batch)
+
+    if not parts:
+        return pd.DataFrame(columns=["gx", "gy"] + FACETS + ["count"]), n
+    base = pd.concat(parts, ignore_index=True)
+    base = base.groupby(["gx", "gy"] + FACETS, dropna=False)["count"].sum().reset_index()
+    return base, n
+
+
+def level_docs(df, z):
+    """Documents de tuiles d'un niveau : cells = [px, py, boro, law, year, count]."""
+    df = df.assign(
+        x=df["gx"] // TILE_BINS, y=df["gy"] // TILE_BINS,
+        px=df["gx"] % TILE_BINS, py=df["gy"] % TILE_BINS,
+    )
+    for (x, y), g in df.groupby(["x", "y"], sort=False):
+        cells = [
+            [int(px), int(py), boro, law, None if pd.isna(year) else int(year), int(count)]
+            for px, py, boro, law, year, count in zip(
+                g["px"], g["py"], g["boro_nm"], g["law_cat_cd"], g["year"], g["count"]
+            )
+        ]
+        yield {"_id": f"{z}/{int(x)}/{int(y)}", "z": z, "x": int(x), "y": int(y), "cells": cells}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Précalcule la pyramide de tuiles de la carte.")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--db", default=DB_NAME)
+    opts = parser.parse_args()
+
+    client = MongoClient(opts.mongo_uri)
+    db = client[opts.db]
+    coll = db[COLL_NAME]
+    staging = db[TILES_COLL_NAME + "_tmp"]
+    staging.drop()
+
+    dataset = db[META_COLL_NAME].find_one({"_id": "dataset"}) or {}
+
+    t0 = time.time()
+    print("Lecture des points...")
+    level, n_points = read_base_level(coll)
+    print(f"{n_points} points -> {len(level)} cellules au zoom {TILE_Z_MAX} ({time.time() - t0:.1f}s)")
+
+    n_tiles = 0
+    for z in range(TILE_Z_MAX, TILE_Z_MIN - 1, -1):
+        if z < TILE_Z_MAX:
+            # niveau parent : 2x2 cellules filles -> 1 cellule
+            level = level.assign(gx=level["gx"] // 2, gy=level["gy"] // 2)
+            level = level.groupby(["gx", "gy"] + FACETS, dropna=False)["count"].sum().reset_index()
+        buf = []
+        for doc in level_docs(level, z):
+            buf.append(doc)
+            if len(buf) >= WRITE_BATCH:
+                staging.insert_many(buf, ordered=False)
+                n_tiles += len(buf)
+                buf = []
+        if buf:
+            staging.insert_many(buf, ordered=False)
+            n_tiles += len(buf)
+        print(f"zoom {z} : {len(level)} cellules, total tuiles écrites {n_tiles}")
+
+    # Bascule atomique : /api/tuiles ne voit jamais une pyramide partielle
+    if n_tiles:
+        staging.rename(TILES_COLL_NAME, dropTarget=True)
+    db[META_COLL_NAME].update_one(
+        {"_id": TILES_COLL_NAME},
+        {"$set": {
+            "generation": dataset.get("generation"),
+            "z_min": TILE_Z_MIN, "z_max": TILE_Z_MAX, "bins": TILE_BINS,
+            "tiles": n_tiles, "built_at": datetime.utcnow(),
+        }},
+        upsert=True,
+    )
+    print(f"✅ Pyramide construite : {n_tiles} tuiles en {time.time() - t0:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
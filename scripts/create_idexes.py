@@ -1,29 +1,240 @@
-from pymongo import MongoClient, TEXT, ASCENDING, GEOSPHERE
+"""
+Création des index MongoDB + conseiller d'index (index advisor).
 
-# 1. Connect to your MongoDB instance
-client = MongoClient("mongodb://localhost:27017/")  # Replace with your URI if needed
+    python scripts/create_idexes.py              # index de base (comme avant)
+    python scripts/create_idexes.py --conseil    # analyse les formes de requêtes
+    python scripts/create_idexes.py --appliquer  # ... et crée les index proposés
+    python scripts/create_idexes.py --lentes     # formes les plus coûteuses (slow_queries)
 
-# 2. Select the database and collection
-db = client["nyc_crime"]
-collection = db["complaints"]
+Base : celle du backend par défaut (NYC_CRIME_MONGO_URI / NYC_CRIME_DB),
+ou --mongo-uri / --db.
 
-# 3. Create indexes
+Le conseiller lit les formes de requêtes enregistrées par le backend
+(collection `query_shapes`, cf. backend/formes.py) ou, à défaut, rejoue
+une charge type (SAMPLE_WORKLOAD). Pour chaque forme il exécute
+explain("executionStats"), propose un index composé ordonné ESR
+(Égalité, tri/Sort, puis Range) et, avec --appliquer, le crée puis
+compare le ratio clés/docs examinés par document renvoyé avant/après.
+
+--lentes classe les formes du journal des requêtes lentes (collection
+`slow_queries`, cf. backend/requetes_lentes.py) par temps total, avec le
+plan capturé : les COLLSCAN en tête de liste sont à indexer d'abord.
+"""
+
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient, TEXT, ASCENDING, DESCENDING, GEOSPHERE
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from query_utils import build_filters, combine_filters, TEXT_SEARCH_FIELDS  # noqa: E402
+from pagination import SORT_NEXT  # noqa: E402
+from formes import SHAPES_COLL_NAME  # noqa: E402
+from cache import META_COLL_NAME, DATASET_META_ID  # noqa: E402
+from requetes_lentes import SLOW_COLL_NAME, plan_stages, ranking  # noqa: E402
+
+MONGO_URI = os.environ.get("NYC_CRIME_MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("NYC_CRIME_DB", "nyc_crime")
+COLL_NAME = "complaints"
+
+# Index de base
 indexes = [
+    ("cmplnt_num", ASCENDING),  # upsert du chargement incrémental
     ("boro_nm", ASCENDING),
     ("cmplnt_fr_dt", ASCENDING),
     ("law_cat_cd", ASCENDING),
     ("vic_age_group", ASCENDING),
     ("vic_sex", ASCENDING),
     ("vic_race", ASCENDING),
+    ("crm_atpt_cptd_cd", ASCENDING),
+    ("susp_age_group", ASCENDING),
+    ("susp_sex", ASCENDING),
+    ("susp_race", ASCENDING),
+    ("vic_sex_std", ASCENDING),  # champs standardisés du loader (filtres sexe / âge)
+    ("vic_age_std", ASCENDING),
+    ("susp_sex_std", ASCENDING),
+    ("susp_age_std", ASCENDING),
     ("ofns_desc", ASCENDING),
+    ("prem_typ_desc", ASCENDING),  # recherche libre q_mode=vocab ($in exacts)
+    ([("cmplnt_fr_dt", ASCENDING), ("_id", ASCENDING)], None),  # Pagination keyset (parcourue à rebours)
     ([("ofns_desc", TEXT), ("prem_typ_desc", TEXT)], None),  # Text index
     ("location", GEOSPHERE)  # Geospatial index
 ]
 
-for index in indexes:
-    if isinstance(index[0], list):  # for compound text index
-        collection.create_index(index[0])
+
+def create_base_indexes(collection):
+    for index in indexes:
+        if isinstance(index[0], list):  # for compound indexes (text, keyset)
+            collection.create_index(index[0])
+        else:
+            collection.create_index([(index[0], index[1])])
+
+    print("✅ Indexes created successfully.")
+
+
+# ------------------------------------------------------------
+# Conseiller d'index
+# ------------------------------------------------------------
+# Charge type rejouée si aucune forme n'a encore été enregistrée
+SAMPLE_WORKLOAD = [
+    {"borough": "BROOKLYN", "pagination": "keyset"},
+    {"borough": "BROOKLYN", "law_cat_cd": "FELONY", "start": "2020-01-01", "end": "2020-12-31", "pagination": "keyset"},
+    {"borough": "MANHATTAN,BRONX", "law_cat_cd": "MISDEMEANOR", "start": "2019-01-01", "end": "2019-06-30"},
+    {"vic_sex": "F", "vic_age": "18-24", "borough": "QUEENS", "pagination": "keyset"},
+    {"susp_sex": "M", "susp_age": "25-44", "susp_race": "BLACK", "start": "2021-01-01", "end": "2021-12-31"},
+    {"ofns_desc": "FELONY ASSAULT", "crm_atpt_cptd_cd": "ATTEMPTED", "pagination": "keyset"},
+    {"q": "LARCENY", "borough": "BROOKLYN", "pagination": "keyset"},
+]
+
+PAGE_SIZE = 1000
+# Champs non indexables dans un composé ESR (intervalle déjà géré / $or)
+_NON_EQUALITY = {"cmplnt_fr_dt", "q"}
+
+
+def load_shapes(db, top):
+    shapes = list(db[SHAPES_COLL_NAME].find().sort("count", DESCENDING).limit(top))
+    if shapes:
+        return shapes
+    print("(aucune forme enregistrée : charge type SAMPLE_WORKLOAD)")
+    return [
+        {"_id": "|".join(sorted(a)), "count": 0, "endpoint": "recherche",
+         "keyset": a.get("pagination") == "keyset", "example": a}
+        for a in SAMPLE_WORKLOAD
+    ]
+
+
+def explain_shape(collection, shape, q):
+    db = collection.database
+    cmd = {"find": collection.name, "filter": q}
+    if shape.get("endpoint") == "recherche":
+        cmd["limit"] = PAGE_SIZE
+        if shape.get("keyset"):
+            cmd["sort"] = dict(SORT_NEXT)
+    res = db.command("explain", cmd, verbosity="executionStats")
+    stats = res["executionStats"]
+    returned = max(stats["nReturned"], 1)
+    return {
+        "keys": stats["totalKeysExamined"],
+        "docs": stats["totalDocsExamined"],
+        "returned": stats["nReturned"],
+        "ratio": (stats["totalKeysExamined"] + stats["totalDocsExamined"]) / returned,
+        "plan": " > ".join(plan_stages(res["queryPlanner"]["winningPlan"])),
+    }
+
+
+def propose_index(shape, filters):
+    """Index composé ESR : égalités, puis tri keyset, puis intervalle de dates.
+    Le champ indexé est celui de la clause (ex. vic_sex_std pour vic_sex)."""
+    keys = [(next(iter(c)), ASCENDING) for f, c in filters.items() if f not in _NON_EQUALITY]
+    if shape.get("keyset"):
+        keys += list(SORT_NEXT)
+    elif "cmplnt_fr_dt" in filters:
+        keys.append(("cmplnt_fr_dt", ASCENDING))
+    return keys if len(keys) >= 2 else None
+
+
+def _covered(keys, existing):
+    """Un index existant commence-t-il déjà par ces clés (à direction près) ?"""
+    norm = [(f, 1 if d == 1 else -1) for f, d in keys]
+    flipped = [(f, -d) for f, d in norm]
+    for spec in existing:
+        prefix = [(f, d) for f, d in spec[:len(norm)]]
+        if prefix in (norm, flipped):
+            return True
+    return False
+
+
+def _existing_indexes(collection):
+    return [list(info["key"]) for info in collection.index_information().values()]
+
+
+def _fmt(stats):
+    return (f"clés {stats['keys']:>9}  docs {stats['docs']:>9}  renvoyés {stats['returned']:>6}  "
+            f"ratio {stats['ratio']:>9.1f}  [{stats['plan']}]")
+
+
+def advise(collection, top, apply):
+    db = collection.database
+    vocab = {f: collection.distinct(f) for f in TEXT_SEARCH_FIELDS}
+    meta = db[META_COLL_NAME].find_one({"_id": DATASET_META_ID}) or {}
+    std_fields = bool(meta.get("champs_std"))
+    shapes = load_shapes(db, top)
+    existing = _existing_indexes(collection)
+
+    report = []
+    proposals = []
+    for shape in shapes:
+        args = shape["example"]
+        filters = build_filters(args, vocab, std_fields)
+        q = combine_filters(filters.values())
+        before = explain_shape(collection, shape, q)
+        keys = propose_index(shape, filters)
+        if keys and (_covered(keys, existing) or keys in proposals):
+            keys = None
+        if keys:
+            proposals.append(keys)
+        report.append((shape, q, before, keys))
+
+    for shape, _, before, keys in report:
+        print(f"\n● {shape['_id']}  (vu {shape.get('count', 0)} fois)")
+        print(f"  avant : {_fmt(before)}")
+        print(f"  index proposé : {keys or '— (déjà couvert ou non applicable)'}")
+
+    if not apply or not proposals:
+        return
+
+    print("\nCréation des index proposés...")
+    for keys in proposals:
+        name = collection.create_index(keys)
+        print(f"  + {name}")
+
+    print("\nAprès création :")
+    for shape, q, before, _ in report:
+        after = explain_shape(collection, shape, q)
+        print(f"● {shape['_id']}")
+        print(f"  avant : {_fmt(before)}")
+        print(f"  après : {_fmt(after)}")
+
+
+def slow_report(db, top):
+    shapes = ranking(db[SLOW_COLL_NAME], top)
+    if not shapes:
+        print("Aucune requête lente enregistrée (seuil : NYC_CRIME_SLOW_MS côté backend).")
+        return
+    for d in shapes:
+        print(f"\n● {d['command']} {d['collection']}  total {d['total_ms']:.0f} ms  "
+              f"({d['count']} fois, moy. {d['avg_ms']:.0f} ms, max {d['max_ms']:.0f} ms)"
+              f"  {', '.join(d['endpoints'])}")
+        print(f"  forme : {d['shape']}")
+        e = d["explain"]
+        if e and "error" not in e:
+            alerte = "  ⚠ COLLSCAN" if e["collscan"] else ""
+            print(f"  plan : {e['plan']}{alerte}")
+            print(f"  clés {e['keys_examined']}  docs {e['docs_examined']}  renvoyés {e['n_returned']}")
+        elif e:
+            print(f"  explain : {e['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conseil", action="store_true", help="analyser les formes de requêtes (explain)")
+    parser.add_argument("--appliquer", action="store_true", help="créer les index proposés et comparer avant/après")
+    parser.add_argument("--top", type=int, default=20, help="nombre de formes analysées (les plus fréquentes)")
+    parser.add_argument("--lentes", action="store_true", help="classer les formes des requêtes lentes par temps total")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--db", default=DB_NAME)
+    opts = parser.parse_args()
+
+    db = MongoClient(opts.mongo_uri)[opts.db]
+    collection = db[COLL_NAME]
+    if opts.lentes:
+        slow_report(db, opts.top)
+    elif opts.conseil or opts.appliquer:
+        advise(collection, opts.top, opts.appliquer)
     else:
-        collection.create_index([(index[0], index[1])])
+        create_base_indexes(collection)
+
 
-print("✅ Indexes created successfully.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Convertit une fois le CSV NYPD en fichier Parquet typé (colonnaire).
+
+- lecture en flux par le lecteur CSV multithreadé de pyarrow ;
+- seules les colonnes KEEP_COLS du loader sont conservées ;
+- '(null)' et les champs vides deviennent de vrais null ;
+- CMPLNT_FR_DT est parsée en timestamp (dates invalides -> null) ;
+- CMPLNT_NUM en entier, ADDR_PCT_CD / Latitude / Longitude en float64 ;
+- colonnes catégorielles (borough, infraction, sexe, âge…) encodées en
+  dictionnaire, ce qui réduit fortement la taille et la mémoire à la relecture.
+
+Les chargements suivants relisent ce fichier par lots, sans reparser le
+texte : python scripts/load_csv_to_mongo.py --csv data/NYPD_Complaint_Data_Historic.parquet
+
+Usage : python scripts/csv_to_parquet.py [csv] [parquet] [--rapport durees.json]
+"""
+
+import argparse
+import json
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from load_csv_to_mongo import CSV_PATH, KEEP_COLS, DATE_FORMAT
+
+PARQUET_PATH = "data/NYPD_Complaint_Data_Historic.parquet"
+BLOCK_SIZE = 64 << 20  # octets de CSV par bloc lu (un bloc -> un lot Arrow)
+
+# Mêmes types que ceux déduits par pandas sur le CSV (ADDR_PCT_CD a des vides)
+NUMERIC_TYPES = {
+    "CMPLNT_NUM": pa.int64(),
+    "ADDR_PCT_CD": pa.float64(),
+    "Latitude": pa.float64(),
+    "Longitude": pa.float64(),
+}
+
+# Colonnes de faible cardinalité -> dictionary<int32, string>
+DICT_COLS = [
+    "OFNS_DESC", "LAW_CAT_CD", "CRM_ATPT_CPTD_CD", "BORO_NM",
+    "VIC_AGE_GROUP", "VIC_SEX", "VIC_RACE",
+    "SUSP_AGE_GROUP", "SUSP_SEX", "SUSP_RACE",
+    "PREM_TYP_DESC",
+]
+
+
+def convert_batch(batch: pa.RecordBatch) -> pa.RecordBatch:
+    columns = []
+    names = []
+    for name, col in zip(batch.schema.names, batch.columns):
+        if name == "CMPLNT_FR_DT":
+            col = pc.strptime(col, format=DATE_FORMAT, unit="s", error_is_null=True)
+        elif name in DICT_COLS:
+            col = pc.dictionary_encode(col)
+        columns.append(col)
+        names.append(name)
+    return pa.RecordBatch.from_arrays(columns, names=names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convertit le CSV NYPD en Parquet typé.")
+    parser.add_argument("csv", nargs="?", default=CSV_PATH)
+    parser.add_argument("parquet", nargs="?", default=PARQUET_PATH)
+    parser.add_argument("--rapport", help="fichier JSON des durées mesurées (lignes, conversion)")
+    opts = parser.parse_args()
+    csv_path, parquet_path = opts.csv, opts.parquet
+
+    reader = pacsv.open_csv(
+        csv_path,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=BLOCK_SIZE),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=KEEP_COLS,
+            include_missing_columns=True,
+            null_values=["(null)", ""],
+            strings_can_be_null=True,
+            # types fixés : pas d'inférence instable d'un bloc à l'autre ;
+            # la date est lue en texte puis convertie dans convert_batch
+            column_types={c: NUMERIC_TYPES.get(c, pa.string()) for c in KEEP_COLS},
+        ),
+    )
+
+    t0 = time.perf_counter()
+    rows = 0
+    writer = None
+    try:
+        for batch in reader:
+            out = convert_batch(batch)
+            if writer is None:
+                writer = pq.ParquetWriter(parquet_path, out.schema, compression="zstd")
+            writer.write_batch(out)
+            rows += out.num_rows
+            print(f"...{rows} lignes converties")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    dt = time.perf_counter() - t0
+    print(f"✅ {parquet_path} : {rows} lignes en {dt:.1f}s ({rows / dt:,.0f} lignes/s).")
+    if opts.rapport:
+        with open(opts.rapport, "w") as f:
+            json.dump({"lignes": rows, "conversion_s": round(dt, 3)}, f)
+
+
+if __name__ == "__main__":
+    main()
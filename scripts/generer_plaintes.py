@@ -0,0 +1,213 @@
+"""
+Génère un CSV synthétique au format NYPD (mêmes colonnes que KEEP_COLS,
+mêmes conventions : dates MM/DD/YYYY, '(null)', variantes brutes de sexe
+et d'âge), reproductible à graine fixe. Sert aux benchmarks
+(scripts/bench_api.py) sans décompresser le vrai fichier.
+
+Distributions calquées sur le jeu réel :
+- borough, infraction (avec sa catégorie légale), lieu ;
+- tranches d'âge / sexe / race victime et suspect, y compris les valeurs
+  aberrantes ('-948', 'E', 'D'…) et les absents ;
+- dates 2006-2024 avec saisonnalité estivale, heures plus denses le soir ;
+- coordonnées autour du centre de chaque borough, bornées à NYC, ~0,3 %
+  de plaintes sans coordonnées (ignorées par le loader).
+
+Génération vectorisée par blocs : 10 M lignes en quelques minutes.
+
+Usage : python scripts/generer_plaintes.py --lignes 1000000 [--graine 42] [--sortie data/synthetique_1000000.csv]
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from load_csv_to_mongo import KEEP_COLS, DATE_FORMAT
+
+GRAINE = 42
+BLOC = 500_000
+TAILLES = {"100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# borough -> (part, lat centre, lon centre, écart lat, écart lon, précincts)
+BOROUGHS = {
+    "BROOKLYN": (0.30, 40.650, -73.950, 0.040, 0.045, range(60, 95)),
+    "MANHATTAN": (0.24, 40.780, -73.970, 0.045, 0.020, range(1, 35)),
+    "BRONX": (0.22, 40.840, -73.880, 0.030, 0.035, range(40, 53)),
+    "QUEENS": (0.20, 40.720, -73.820, 0.045, 0.065, range(100, 116)),
+    "STATEN ISLAND": (0.04, 40.590, -74.130, 0.035, 0.045, range(120, 124)),
+}
+NYC_BBOX = (40.49, 40.92, -74.26, -73.70)  # lat min, lat max, lon min, lon max
+
+# infraction -> (part, catégorie légale)
+INFRACTIONS = {
+    "PETIT LARCENY": (0.18, "MISDEMEANOR"),
+    "HARRASSMENT 2": (0.14, "VIOLATION"),
+    "ASSAULT 3 & RELATED OFFENSES": (0.11, "MISDEMEANOR"),
+    "CRIMINAL MISCHIEF & RELATED OF": (0.09, "MISDEMEANOR"),
+    "GRAND LARCENY": (0.08, "FELONY"),
+    "FELONY ASSAULT": (0.05, "FELONY"),
+    "OFF. AGNST PUB ORD SENSBLTY &": (0.05, "MISDEMEANOR"),
+    "DANGEROUS DRUGS": (0.05, "MISDEMEANOR"),
+    "ROBBERY": (0.03, "FELONY"),
+    "BURGLARY": (0.03, "FELONY"),
+    "MISCELLANEOUS PENAL LAW": (0.03, "FELONY"),
+    "VEHICLE AND TRAFFIC LAWS": (0.02, "MISDEMEANOR"),
+    "GRAND LARCENY OF MOTOR VEHICLE": (0.02, "FELONY"),
+    "SEX CRIMES": (0.02, "MISDEMEANOR"),
+    "DANGEROUS WEAPONS": (0.02, "MISDEMEANOR"),
+    "OFFENSES AGAINST PUBLIC ADMINI": (0.02, "MISDEMEANOR"),
+    "CRIMINAL TRESPASS": (0.02, "MISDEMEANOR"),
+    "THEFT-FRAUD": (0.01, "FELONY"),
+    "FORGERY": (0.01, "FELONY"),
+    "INTOXICATED & IMPAIRED DRIVING": (0.01, "MISDEMEANOR"),
+    "RAPE": (0.005, "FELONY"),
+    "MURDER & NON-NEGL. MANSLAUGHTER": (0.002, "FELONY"),
+    "KIDNAPPING & RELATED OFFENSES": (0.003, "FELONY"),
+}
+LIEUX = {
+    "STREET": 0.32, "RESIDENCE - APT. HOUSE": 0.21, "RESIDENCE-HOUSE": 0.10,
+    "RESIDENCE - PUBLIC HOUSING": 0.08, "COMMERCIAL BUILDING": 0.03,
+    "CHAIN STORE": 0.03, "TRANSIT - NYC SUBWAY": 0.03, "DEPARTMENT STORE": 0.02,
+    "GROCERY/BODEGA": 0.02, "RESTAURANT/DINER": 0.02, "PARK/PLAYGROUND": 0.01,
+    "(null)": 0.13,
+}
+AGES_VICTIME = {
+    "25-44": 0.38, "45-64": 0.20, "18-24": 0.10, "<18": 0.05, "65+": 0.05,
+    "UNKNOWN": 0.19, "(null)": 0.025, "-948": 0.002, "1014": 0.002, "-55": 0.001,
+}
+AGES_SUSPECT = {
+    "25-44": 0.30, "18-24": 0.10, "45-64": 0.10, "<18": 0.04, "65+": 0.01,
+    "UNKNOWN": 0.25, "(null)": 0.198, "2019": 0.001, "-962": 0.001,
+}
+SEXES_VICTIME = {"F": 0.40, "M": 0.35, "E": 0.12, "D": 0.10, "L": 0.005, "(null)": 0.025}
+SEXES_SUSPECT = {"M": 0.45, "F": 0.15, "U": 0.20, "(null)": 0.20}
+RACES = {
+    "BLACK": 0.30, "WHITE HISPANIC": 0.22, "WHITE": 0.11, "UNKNOWN": 0.17,
+    "ASIAN / PACIFIC ISLANDER": 0.08, "BLACK HISPANIC": 0.08,
+    "AMERICAN INDIAN/ALASKAN NATIVE": 0.01, "(null)": 0.03,
+}
+ANNEE_MIN, ANNEE_MAX = 2006, 2024
+PART_SANS_COORDS = 0.003
+PART_SANS_DATE = 0.001
+PART_TENTATIVE = 0.02
+
+
+def _choix(rng, table, n):
+    """Tirage pondéré dans {valeur: poids} (poids renormalisés)."""
+    valeurs = np.array(list(table), dtype=object)
+    poids = np.array([v[0] if isinstance(v, tuple) else v for v in table.values()], dtype=float)
+    return valeurs[rng.choice(len(valeurs), size=n, p=poids / poids.sum())]
+
+
+def _dates(rng, n):
+    """Jours 2006-2024, plus de plaintes l'été (±15 %)."""
+    debut = np.datetime64(f"{ANNEE_MIN}-01-01")
+    jours = (np.datetime64(f"{ANNEE_MAX + 1}-01-01") - debut).astype(int)
+    tirage = rng.integers(0, jours, size=n * 2)
+    saison = 1 + 0.15 * np.sin(2 * np.pi * ((tirage % 365.25) / 365.25 - 0.3))
+    garde = rng.random(n * 2) < saison / 1.15
+    tirage = tirage[garde][:n]
+    if len(tirage) < n:  # (très improbable) complément uniforme
+        tirage = np.concatenate([tirage, rng.integers(0, jours, size=n - len(tirage))])
+    # une chaîne par jour possible, puis indexation (strftime ligne à ligne : lent)
+    libelles = pd.date_range(debut, periods=jours, freq="D").strftime(DATE_FORMAT).to_numpy(dtype=object)
+    dates = libelles[tirage]
+    dates[rng.random(n) < PART_SANS_DATE] = "(null)"
+    return dates
+
+
+_HEURES = np.array([f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)], dtype=object)
+
+
+def _heures(rng, n):
+    h = np.clip(rng.normal(15, 6, size=n), 0, 23.99)
+    secondes = (h * 3600).astype(int)
+    return _HEURES[secondes]
+
+
+def _coordonnees(rng, boroughs):
+    n = len(boroughs)
+    lat = np.empty(n)
+    lon = np.empty(n)
+    pct = np.empty(n, dtype=np.int64)
+    for nom, (_, clat, clon, slat, slon, precincts) in BOROUGHS.items():
+        m = boroughs == nom
+        k = int(m.sum())
+        lat[m] = rng.normal(clat, slat, size=k)
+        lon[m] = rng.normal(clon, slon, size=k)
+        pct[m] = rng.choice(list(precincts), size=k)
+    lat_min, lat_max, lon_min, lon_max = NYC_BBOX
+    lat = np.clip(lat, lat_min, lat_max).round(6)
+    lon = np.clip(lon, lon_min, lon_max).round(6)
+    sans = rng.random(n) < PART_SANS_COORDS
+    lat[sans] = np.nan
+    lon[sans] = np.nan
+    return lat, lon, pct
+
+
+def bloc(rng, debut, n):
+    """DataFrame de n plaintes synthétiques (colonnes KEEP_COLS)."""
+    boroughs = _choix(rng, {b: v[0] for b, v in BOROUGHS.items()}, n)
+    infractions = _choix(rng, INFRACTIONS, n)
+    categories = np.array([INFRACTIONS[o][1] for o in INFRACTIONS], dtype=object)
+    index_infraction = {o: i for i, o in enumerate(INFRACTIONS)}
+    law_cat = categories[[index_infraction[o] for o in infractions]]
+    lat, lon, pct = _coordonnees(rng, boroughs)
+    dates = _dates(rng, n)
+
+    df = pd.DataFrame({
+        "CMPLNT_NUM": np.arange(debut, debut + n) + 100_000_000,
+        "CMPLNT_FR_DT": dates,
+        "CMPLNT_FR_TM": _heures(rng, n),
+        "CMPLNT_TO_DT": np.where(rng.random(n) < 0.7, "(null)", dates),
+        "CMPLNT_TO_TM": "(null)",
+        "OFNS_DESC": infractions,
+        "LAW_CAT_CD": law_cat,
+        "CRM_ATPT_CPTD_CD": np.where(rng.random(n) < PART_TENTATIVE, "ATTEMPTED", "COMPLETED"),
+        "BORO_NM": boroughs,
+        "ADDR_PCT_CD": pct,
+        "VIC_AGE_GROUP": _choix(rng, AGES_VICTIME, n),
+        "VIC_SEX": _choix(rng, SEXES_VICTIME, n),
+        "VIC_RACE": _choix(rng, RACES, n),
+        "SUSP_AGE_GROUP": _choix(rng, AGES_SUSPECT, n),
+        "SUSP_SEX": _choix(rng, SEXES_SUSPECT, n),
+        "SUSP_RACE": _choix(rng, RACES, n),
+        "PREM_TYP_DESC": _choix(rng, LIEUX, n),
+        "Latitude": lat,
+        "Longitude": lon,
+    })
+    return df[KEEP_COLS]
+
+
+def generer(chemin, lignes, graine=GRAINE):
+    """Écrit `lignes` plaintes dans `chemin` ; même graine -> même fichier."""
+    os.makedirs(os.path.dirname(chemin) or ".", exist_ok=True)
+    rng = np.random.default_rng(graine)
+    ecrites = 0
+    while ecrites < lignes:
+        n = min(BLOC, lignes - ecrites)
+        bloc(rng, ecrites, n).to_csv(chemin, mode="w" if ecrites == 0 else "a",
+                                      header=ecrites == 0, index=False)
+        ecrites += n
+    return chemin
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV NYPD synthétique (benchmarks)")
+    parser.add_argument("--lignes", default="100k",
+                        help="nombre de lignes, ou 100k / 1m / 10m")
+    parser.add_argument("--graine", type=int, default=GRAINE)
+    parser.add_argument("--sortie", default=None)
+    opts = parser.parse_args()
+
+    lignes = TAILLES.get(opts.lignes.lower()) or int(opts.lignes)
+    sortie = opts.sortie or f"data/synthetique_{lignes}_{opts.graine}.csv"
+    t0 = time.perf_counter()
+    generer(sortie, lignes, opts.graine)
+    print(f"✅ {sortie} : {lignes} lignes en {time.perf_counter() - t0:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
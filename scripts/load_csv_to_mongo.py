@@ -1,13 +1,33 @@
 import pandas as pd
-from pymongo import MongoClient
+import numpy as np
+from pymongo import MongoClient, ReplaceOne
 from datetime import datetime
-import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import uuid
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from normalization_maps import SEX_RAW_TO_STD, AGE_RAW_TO_STD, parse_age_group_to_bounds  # noqa: E402
+from serie import build_rollup, update_rollup, rollup_generation, ROLLUP_COLL_NAME  # noqa: E402
+from bitmaps import build_and_save, bitmap_dir, bitmap_path  # noqa: E402
 
 CSV_PATH = "data/NYPD_Complaint_Data_Historic_20250716.csv"  # adjust if needed
 MONGO_URI = "mongodb://localhost:27017"
 DB_NAME = "nyc_crime"
 COLL_NAME = "complaints"
+META_COLL_NAME = "meta"  # tampon de génération lu par le backend (caches)
+BACKEND_URL = "http://localhost:5000"  # prévenu à la fin du chargement (si lancé)
 CHUNK_SIZE = 100_000  # adjust; 500k rows -> ~5 chunks
+DATE_FORMAT = "%m/%d/%Y"  # format NYPD : évite l'inférence ligne à ligne (dateutil)
+INSERT_BATCH = 10_000  # --rapide : documents par insert_many envoyé à un worker
+STAGING_SUFFIX = "_staging"  # --staging : collection chargée puis renommée
 
 # Columns we keep (subset for performance)
 KEEP_COLS = [
@@ -20,32 +40,127 @@ KEEP_COLS = [
     "Latitude","Longitude"
 ]
 
-client = MongoClient(MONGO_URI)
-coll = client[DB_NAME][COLL_NAME]
+# Champs standardisés calculés au chargement (filtres de l'API sans $in
+# sur toutes les variantes brutes) : champ brut -> (champ std, table)
+STD_FIELDS = {
+    "vic_sex": ("vic_sex_std", SEX_RAW_TO_STD),
+    "vic_age_group": ("vic_age_std", AGE_RAW_TO_STD),
+    "susp_sex": ("susp_sex_std", SEX_RAW_TO_STD),
+    "susp_age_group": ("susp_age_std", AGE_RAW_TO_STD),
+}
+# Tranche d'âge brute -> préfixe des champs <préfixe>_min / _max / _approx
+AGE_BOUNDS_FIELDS = {"vic_age_group": "vic_age", "susp_age_group": "susp_age"}
+
+
+def bump_generation(db, **fields):
+    """Change le tampon de génération : les caches du backend
+    (totaux, facettes…) indexés dessus sont invalidés.
+    `fields` : autres informations du document meta (ex. champs_std).
+    Retourne le nouveau tampon."""
+    generation = uuid.uuid4().hex
+    db[META_COLL_NAME].update_one(
+        {"_id": "dataset"},
+        {"$set": {"generation": generation, "updated_at": datetime.utcnow(), **fields}},
+        upsert=True,
+    )
+    return generation
+
+
+def current_generation(db):
+    return (db[META_COLL_NAME].find_one({"_id": "dataset"}, {"generation": 1}) or {}).get("generation")
+
+
+def finish_load(db, coll, generation=None, days=None, bitmaps=False):
+    """Fin commune des chargements : nouvelle génération (sauf si
+    `generation` est fournie : déjà changée par swap_staging, ou conservée
+    quand les données n'ont pas changé), agrégat journalier de /api/serie
+    (et, si `bitmaps`, index bitmap) reconstruits pour elle, puis caches du
+    backend invalidés.
+
+    days : jours touchés par un chargement incrémental ; seuls ceux-là sont
+    recalculés dans l'agrégat s'il était à jour avant le chargement.
+    bitmaps : l'index relit toute la collection (--bitmaps) ; sans lui, le
+    backend n'a pas d'index pour la nouvelle génération et compte dans
+    MongoDB."""
+    previous = current_generation(db)
+    if generation is None:
+        generation = bump_generation(db, champs_std=has_std_fields(coll))
+    if days is not None and previous is not None and rollup_generation(db) == previous:
+        print(f"Updating daily rollup ({ROLLUP_COLL_NAME}) for {len(days)} days...")
+        n = update_rollup(coll, generation, days)
+    else:
+        print(f"Building daily rollup ({ROLLUP_COLL_NAME})...")
+        n = build_rollup(coll, generation)
+    print(f"...{n} rollup docs")
+    if bitmaps:
+        print("Building bitmap indexes...")
+        directory = bitmap_dir(db.name)
+        index = build_and_save(coll, generation, directory)
+        print(f"...{sum(len(v) for v in index.bitmaps.values())} bitmaps -> {bitmap_path(generation, directory)}")
+    notify_backend()
+
+
+def has_std_fields(coll):
+    """Tous les documents portent-ils les champs standardisés ? (le backend
+    ne filtre dessus que si c'est le cas, cf. meta champs_std)"""
+    return coll.find_one({"vic_sex_std": {"$exists": False}}, {"_id": 1}) is None
 
-# Clear existing (CAUTION!)
-print("Dropping existing documents...")
-coll.delete_many({})
 
-# Read in chunks
-print("Loading CSV in chunks...")
-chunk_iter = pd.read_csv(
-    CSV_PATH,
-    usecols=lambda c: c in KEEP_COLS,  # filter on load
-    chunksize=CHUNK_SIZE,
-    low_memory=False
-)
+def notify_backend():
+    """Invalidation immédiate des caches du backend (sinon : sous quelques
+    secondes, à la prochaine relecture du tampon de génération)."""
+    try:
+        req = urllib.request.Request(f"{BACKEND_URL}/api/cache/invalider", method="POST")
+        urllib.request.urlopen(req, timeout=5)
+    except Exception:
+        print("(backend non joignable : caches invalidés via la génération)")
 
-total_inserted = 0
 
-for i, chunk in enumerate(chunk_iter, start=1):
-    print(f"Processing chunk {i}...")
+# ------------------------------------------------------------
+# Lecture / nettoyage (communs aux deux modes)
+# ------------------------------------------------------------
+def read_chunks(path, raw_text=False, skip_chunks=0):
+    """Chunks pandas du fichier source : CSV brut, ou Parquet produit par
+    scripts/csv_to_parquet.py (déjà typé, lu par lots sans reparser le texte).
 
+    raw_text : CSV lu en texte (dtype=str), cf. mode incrémental.
+    skip_chunks : nombre de chunks déjà traités (reprise). Ils sont relus
+    et ignorés, pas sautés par numéro de ligne : un champ entre guillemets
+    peut contenir des retours à la ligne.
+    """
+    if path.endswith(".parquet"):
+        chunks = _parquet_chunks(path)
+    else:
+        chunks = pd.read_csv(
+            path,
+            usecols=lambda c: c in KEEP_COLS,  # filter on load
+            chunksize=CHUNK_SIZE,
+            low_memory=False,
+            dtype=str if raw_text else None,
+        )
+    return itertools.islice(chunks, skip_chunks, None)
+
+
+def _parquet_chunks(path):
+    import pyarrow.parquet as pq  # optionnel : seulement pour une source Parquet
+
+    pf = pq.ParquetFile(path)
+    cols = [c for c in pf.schema_arrow.names if c in KEEP_COLS]
+    for batch in pf.iter_batches(batch_size=CHUNK_SIZE, columns=cols):
+        chunk = batch.to_pandas()
+        # colonnes encodées en dictionnaire -> Categorical ; retour à des
+        # chaînes Python pour des documents identiques à ceux du CSV
+        cat_cols = [c for c in chunk.columns if isinstance(chunk[c].dtype, pd.CategoricalDtype)]
+        chunk[cat_cols] = chunk[cat_cols].astype(object)
+        yield chunk
+
+
+def clean_chunk(chunk):
     # Normalize '(null)' -> None
     chunk = chunk.replace("(null)", None)
 
     # Parse date
-    chunk["CMPLNT_FR_DT"] = pd.to_datetime(chunk["CMPLNT_FR_DT"], errors="coerce")
+    chunk["CMPLNT_FR_DT"] = pd.to_datetime(chunk["CMPLNT_FR_DT"], format=DATE_FORMAT, errors="coerce")
 
     # Drop rows w/o coords
     chunk = chunk.dropna(subset=["Latitude", "Longitude"])
@@ -57,7 +172,39 @@ for i, chunk in enumerate(chunk_iter, start=1):
 
     # Lowercase field names for DB consistency
     chunk.columns = [c.lower() for c in chunk.columns]
+    return add_std_fields(chunk)
+
+
+def _per_value(series, fn):
+    """fn appliquée une fois par valeur DISTINCTE (colonnes de faible
+    cardinalité), puis redistribuée par codes : (codes, résultats).
+    Le dernier résultat est celui d'une valeur manquante (code -1)."""
+    codes, uniques = pd.factorize(series)
+    return codes, [fn(u) for u in uniques] + [fn(None)]
+
+
+def add_std_fields(chunk):
+    """Sexe / âge standardisés (F/M/U, 0-17…INCONNU) et bornes d'âge
+    (parse_age_group_to_bounds) ; valeurs brutes inconnues -> null."""
+    out = {}
+    for raw, (std, table) in STD_FIELDS.items():
+        if raw in chunk.columns:
+            codes, values = _per_value(chunk[raw], table.get)
+            out[std] = np.array(values, dtype=object)[codes]
+    for raw, prefix in AGE_BOUNDS_FIELDS.items():
+        if raw in chunk.columns:
+            codes, values = _per_value(chunk[raw], parse_age_group_to_bounds)
+            bounds = np.array(values, dtype=object)[codes]
+            for i, suffix in enumerate(("min", "max", "approx")):
+                out[f"{prefix}_{suffix}"] = bounds[:, i]
+    # dtype object : None conservé (pas de NaN), entiers Python
+    return chunk.assign(**{k: pd.Series(v, index=chunk.index, dtype=object) for k, v in out.items()})
+
 
+# ------------------------------------------------------------
+# Construction des documents
+# ------------------------------------------------------------
+def build_docs_rowwise(chunk):
     # Build docs row‑by‑row (convert row Series -> dict)
     records = []
     for doc in chunk.to_dict(orient="records"):
@@ -74,10 +221,359 @@ for i, chunk in enumerate(chunk_iter, start=1):
         else:
             doc["cmplnt_fr_dt"] = None
         records.append(doc)
+    return records
+
+
+def build_docs_vectorized(chunk):
+    """Mêmes documents que build_docs_rowwise, colonnes dérivées calculées
+    en bloc (NumPy) avant un unique to_dict."""
+    lat = chunk["latitude"].to_numpy(dtype=np.float64).tolist()
+    lon = chunk["longitude"].to_numpy(dtype=np.float64).tolist()
+
+    dt = chunk["cmplnt_fr_dt"]
+    py_dt = np.array(dt.dt.to_pydatetime(), dtype=object)
+    py_dt[dt.isna().to_numpy()] = None
+
+    chunk = chunk.assign(
+        # dtype object : sinon pandas re-déduit datetime64 -> pd.Timestamp
+        cmplnt_fr_dt=pd.Series(py_dt, index=chunk.index, dtype=object),
+        location=[{"type": "Point", "coordinates": [x, y]} for x, y in zip(lon, lat)],
+    )
+    return chunk.to_dict(orient="records")
+
+
+# ------------------------------------------------------------
+# Modes de chargement
+# ------------------------------------------------------------
+def load_sequential(coll, csv_path):
+    """Mode historique : un chunk, puis un insert_many bloquant."""
+    total_inserted = 0
+    for i, chunk in enumerate(read_chunks(csv_path), start=1):
+        print(f"Processing chunk {i}...")
+        records = build_docs_rowwise(clean_chunk(chunk))
+        if records:
+            coll.insert_many(records, ordered=False)
+            total_inserted += len(records)
+            print(f"...inserted {len(records)} docs (running total: {total_inserted})")
+    return total_inserted
+
+
+def _insert_batch(coll, docs):
+    t = time.perf_counter()
+    coll.insert_many(docs, ordered=False, bypass_document_validation=True)
+    return len(docs), time.perf_counter() - t
+
+
+def load_pipelined(coll, csv_path, workers):
+    """Mode --rapide : pendant que `workers` threads envoient des
+    insert_many non ordonnés (connexions du pool), le thread principal
+    lit et prépare le chunk suivant. Le nombre de lots en vol est borné
+    (2 par worker) pour que la mémoire ne grossisse pas si Mongo ralentit.
+    """
+    timings = {"parse": 0.0, "build": 0.0, "insert": 0.0}
+    rows = {"parse": 0, "build": 0, "insert": 0}
+    inflight = deque()
+
+    def drain(limit):
+        while len(inflight) > limit:
+            n, dt = inflight.popleft().result()
+            rows["insert"] += n
+            timings["insert"] += dt
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        chunks = iter(read_chunks(csv_path))
+        i = 0
+        while True:
+            t = time.perf_counter()
+            chunk = next(chunks, None)
+            timings["parse"] += time.perf_counter() - t
+            if chunk is None:
+                break
+            i += 1
+            rows["parse"] += len(chunk)
+
+            t = time.perf_counter()
+            records = build_docs_vectorized(clean_chunk(chunk))
+            timings["build"] += time.perf_counter() - t
+            rows["build"] += len(records)
+
+            for start in range(0, len(records), INSERT_BATCH):
+                inflight.append(pool.submit(_insert_batch, coll, records[start:start + INSERT_BATCH]))
+            drain(2 * workers)
+            print(f"chunk {i} : {rows['build']} docs préparés, {rows['insert']} insérés")
+        drain(0)
+    wall = time.perf_counter() - t_start
+
+    def rate(stage, seconds):
+        return f"{rows[stage] / seconds:,.0f} lignes/s" if seconds > 0 else "-"
+
+    print("Débits :")
+    print(f"  lecture CSV   : {rate('parse', timings['parse'])}")
+    print(f"  construction  : {rate('build', timings['build'])}")
+    print(f"  insertion     : {rate('insert', timings['insert'])} par worker, x{workers} workers")
+    print(f"  global        : {rows['insert'] / wall:,.0f} lignes/s ({wall:.1f}s)")
+    return rows["insert"]
+
+
+# ------------------------------------------------------------
+# Mode incrémental : upsert par cmplnt_num, lignes inchangées ignorées
+# ------------------------------------------------------------
+def checkpoint_path(csv_path):
+    return csv_path + ".checkpoint.json"
+
+
+def _csv_signature(csv_path):
+    st = os.stat(csv_path)
+    return {"csv": os.path.abspath(csv_path), "size": st.st_size, "mtime": st.st_mtime}
+
+
+def read_checkpoint(csv_path, target):
+    """Reprise possible seulement sur le même fichier, la même cible et la
+    même taille de chunk (le point de reprise est un index de chunk)."""
+    try:
+        with open(checkpoint_path(csv_path)) as f:
+            cp = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cp.get("target") != target or cp.get("chunk_size") != CHUNK_SIZE or any(cp.get(k) != v for k, v in _csv_signature(csv_path).items()):
+        return None
+    return cp
+
+
+def write_checkpoint(csv_path, target, chunks_done, rows_done, days=(), stats=None):
+    cp = dict(_csv_signature(csv_path), target=target, chunk_size=CHUNK_SIZE,
+              chunks_done=chunks_done, rows_done=rows_done, stats=stats or {},
+              days=sorted(d.strftime("%Y-%m-%d") for d in days))
+    tmp = checkpoint_path(csv_path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cp, f)
+    os.replace(tmp, checkpoint_path(csv_path))  # écriture atomique
+
+
+def content_hash(chunk):
+    """Empreinte 64 bits de chaque ligne brute (texte du CSV, donc stable
+    d'un fichier à l'autre quel que soit le typage déduit par pandas).
+
+    Une source Parquet est déjà typée : ses empreintes sont stables d'un
+    Parquet à l'autre mais diffèrent de celles du CSV ; passer d'une source
+    à l'autre réécrit donc une fois toute la collection."""
+    h = pd.util.hash_pandas_object(chunk[sorted(chunk.columns)], index=False)
+    return h.to_numpy().view(np.int64)
+
+
+def _day(dt):
+    return datetime(dt.year, dt.month, dt.day)
+
+
+def load_incremental(coll, csv_path, days=None):
+    """Upsert par cmplnt_num des seules lignes nouvelles ou modifiées.
+
+    - chaque document porte `content_hash` (empreinte de la ligne CSV) ;
+      une ligne dont l'empreinte n'a pas changé n'est pas réécrite : le coût
+      en écriture suit la taille du delta, pas celle du fichier ;
+    - un point de reprise (index du dernier chunk terminé) est écrit après
+      chaque chunk ; relancé après une interruption, le chargement repart
+      du chunk suivant (les upserts rendent la reprise idempotente).
+
+    Les plaintes absentes du nouveau fichier ne sont pas supprimées
+    (utiliser --staging pour une resynchronisation complète). Les lignes
+    dont CMPLNT_NUM n'est pas numérique ne peuvent pas être upsertées :
+    elles sont comptées (par chunk et au total) et signalées en fin de
+    chargement.
+
+    Retourne le nombre de documents écrits (nouveaux + modifiés), chunks
+    d'avant une reprise compris : 0 signifie que la collection n'a pas
+    changé.
+
+    days : ensemble complété par les jours (cmplnt_fr_dt, ancien et nouveau)
+    des documents réécrits, y compris avant une reprise (point de reprise).
+    """
+    days = set() if days is None else days
+    coll.create_index("cmplnt_num")
+    target = f"{coll.database.name}.{coll.name}"
+
+    cp = read_checkpoint(csv_path, target)
+    chunks_done = rows_done = 0
+    if cp:
+        chunks_done, rows_done = cp["chunks_done"], cp["rows_done"]
+        days.update(datetime.strptime(d, "%Y-%m-%d") for d in cp.get("days", ()))
+        print(f"Reprise après le chunk {chunks_done} ({rows_done} lignes déjà traitées)")
+
+    stats = {"new": 0, "updated": 0, "unchanged": 0, "invalid": 0}
+    if cp:
+        stats.update(cp.get("stats", {}))
+    # texte brut pour l'empreinte ; conversions faites ensuite
+    for chunk in read_chunks(csv_path, raw_text=True, skip_chunks=chunks_done):
+        chunks_done += 1
+        rows_done += len(chunk)
+
+        chunk["CMPLNT_NUM"] = pd.to_numeric(chunk["CMPLNT_NUM"], errors="coerce")
+        invalid = int(chunk["CMPLNT_NUM"].isna().sum())
+        stats["invalid"] += invalid
+        chunk = chunk.dropna(subset=["CMPLNT_NUM"])
+        chunk["CMPLNT_NUM"] = chunk["CMPLNT_NUM"].astype(np.int64)
+        hashes = content_hash(chunk)
+
+        nums = chunk["CMPLNT_NUM"].tolist()
+        # un document sans champs standardisés (chargé avant leur ajout)
+        # est réécrit même si sa ligne n'a pas changé
+        known = {}
+        known_dates = {}
+        for d in coll.find({"cmplnt_num": {"$in": nums}},
+                           {"_id": 0, "cmplnt_num": 1, "content_hash": 1, "vic_sex_std": 1, "cmplnt_fr_dt": 1}):
+            known[d["cmplnt_num"]] = d.get("content_hash") if "vic_sex_std" in d else None
+            known_dates[d["cmplnt_num"]] = d.get("cmplnt_fr_dt")
+        changed = np.fromiter((known.get(n, 0) != h for n, h in zip(nums, hashes.tolist())),
+                              dtype=bool, count=len(nums))
+        stats["unchanged"] += int((~changed).sum())
+
+        delta = chunk[changed].assign(content_hash=hashes[changed])
+        if "ADDR_PCT_CD" in delta.columns:
+            delta["ADDR_PCT_CD"] = pd.to_numeric(delta["ADDR_PCT_CD"], errors="coerce")
+        records = build_docs_vectorized(clean_chunk(delta))
+        # jours à recalculer dans l'agrégat : date actuelle et date précédente
+        for d in records:
+            for dt in (d.get("cmplnt_fr_dt"), known_dates.get(d["cmplnt_num"])):
+                if dt is not None:
+                    days.add(_day(dt))
+        if records:
+            ops = [ReplaceOne({"cmplnt_num": d["cmplnt_num"]}, d, upsert=True) for d in records]
+            res = coll.bulk_write(ops, ordered=False)
+            stats["new"] += res.upserted_count
+            stats["updated"] += res.modified_count
+
+        write_checkpoint(csv_path, target, chunks_done, rows_done, days, stats)
+        ignored = f", {invalid} ignorées (CMPLNT_NUM invalide)" if invalid else ""
+        print(f"chunk {chunks_done} : {len(records)} écrits / {len(chunk)} lus{ignored} "
+              f"(total nouveaux {stats['new']}, modifiés {stats['updated']}, inchangés {stats['unchanged']})")
+
+    if os.path.exists(checkpoint_path(csv_path)):
+        os.remove(checkpoint_path(csv_path))
+    if stats["invalid"]:
+        print(f"⚠️ {stats['invalid']} lignes ignorées : CMPLNT_NUM absent ou non numérique.")
+    return stats["new"] + stats["updated"]
+
+
+def swap_staging(db, staging):
+    """Renomme la collection de staging en collection principale (atomique
+    côté MongoDB), après y avoir recréé les index de la collection actuelle.
+
+    La génération change aussitôt après le renommage, et le backend en est
+    prévenu : ses caches ne servent pas de résultats de l'ancienne
+    collection pendant la reconstruction de l'agrégat et des bitmaps.
+    Retourne la nouvelle génération."""
+    current = db[COLL_NAME]
+    for name, info in current.index_information().items():
+        if name == "_id_":
+            continue
+        keys = info.pop("key")
+        opts = {k: v for k, v in info.items() if k not in ("v", "ns")}
+        staging.create_index(keys, **opts)
+    staging.rename(COLL_NAME, dropTarget=True)
+    generation = bump_generation(db, champs_std=has_std_fields(db[COLL_NAME]))
+    notify_backend()
+    return generation
+
+
+def write_report(path, mode, documents, t_start, t_loaded):
+    """--rapport : durées mesurées dans ce processus, donc sans le démarrage
+    de l'interpréteur ni les imports (cf. scripts/bench_api.py).
+    chargement_s : lecture + écriture des documents ; finalisation_s :
+    génération, agrégat journalier, bitmaps."""
+    t_end = time.perf_counter()
+    report = {
+        "mode": mode,
+        "documents": documents,
+        "chargement_s": round(t_loaded - t_start, 3),
+        "finalisation_s": round(t_end - t_loaded, 3),
+        "total_s": round(t_end - t_start, 3),
+    }
+    with open(path, "w") as f:
+        json.dump(report, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Charge le CSV NYPD dans MongoDB.")
+    parser.add_argument("--csv", default=CSV_PATH,
+                        help="chemin du CSV, ou du .parquet produit par scripts/csv_to_parquet.py")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--rapide", action="store_true",
+                        help="documents construits en bloc + insertions parallèles pipelinées")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                        help="--rapide : nombre d'insertions simultanées")
+    parser.add_argument("--incremental", action="store_true",
+                        help="upsert par cmplnt_num des lignes modifiées, avec reprise sur interruption")
+    parser.add_argument("--staging", action="store_true",
+                        help="charger dans une collection de staging puis la substituer atomiquement")
+    parser.add_argument("--serie", action="store_true",
+                        help="ne rien charger : reconstruire seulement l'agrégat journalier de /api/serie "
+                             "(et l'index bitmap avec --bitmaps)")
+    parser.add_argument("--bitmaps", action="store_true",
+                        help="reconstruire aussi l'index bitmap des facettes et champs standardisés (relit toute la collection)")
+    parser.add_argument("--rapport", help="fichier JSON des durées mesurées (documents, chargement, finalisation)")
+    opts = parser.parse_args()
+
+    client = MongoClient(opts.mongo_uri, maxPoolSize=max(opts.workers, 1) + 2)
+    db = client[opts.db]
+    coll = db[COLL_NAME]
+    t_start = time.perf_counter()
+
+    def report(mode, documents, t_loaded):
+        if opts.rapport:
+            write_report(opts.rapport, mode, documents, t_start, t_loaded)
+
+    if opts.serie:
+        # données inchangées : même génération, caches du backend conservés
+        finish_load(db, coll, current_generation(db), bitmaps=opts.bitmaps)
+        report("serie", 0, t_start)
+        print("✅ Done.")
+        return
+
+    if opts.staging:
+        # L'API continue de servir l'ancienne collection pendant tout le chargement
+        staging = db[COLL_NAME + STAGING_SUFFIX]
+        if not read_checkpoint(opts.csv, f"{db.name}.{staging.name}"):
+            staging.drop()
+        print(f"Loading CSV into {staging.name}...")
+        total_inserted = load_incremental(staging, opts.csv)
+        generation = swap_staging(db, staging)
+        t_loaded = time.perf_counter()
+        finish_load(db, db[COLL_NAME], generation, bitmaps=opts.bitmaps)
+        report("staging", total_inserted, t_loaded)
+        print(f"✅ Done. {staging.name} -> {COLL_NAME} ({total_inserted} docs).")
+        return
+
+    if opts.incremental:
+        print("Incremental load (upsert by cmplnt_num)...")
+        days = set()
+        total_inserted = load_incremental(coll, opts.csv, days)
+        t_loaded = time.perf_counter()
+        # aucun document écrit : la génération (et les caches) restent valides
+        generation = current_generation(db) if total_inserted == 0 else None
+        finish_load(db, coll, generation, days=days, bitmaps=opts.bitmaps)
+        report("incremental", total_inserted, t_loaded)
+        print(f"✅ Done. Upserted: {total_inserted} docs.")
+        return
+
+    # Clear existing (CAUTION!)
+    print("Dropping existing documents...")
+    coll.delete_many({})
+    bump_generation(db)
+
+    # Read in chunks
+    print("Loading CSV in chunks...")
+    if opts.rapide:
+        total_inserted = load_pipelined(coll, opts.csv, max(opts.workers, 1))
+    else:
+        total_inserted = load_sequential(coll, opts.csv)
+
+    t_loaded = time.perf_counter()
+    finish_load(db, coll, bitmaps=opts.bitmaps)
+    report("rapide" if opts.rapide else "sequentiel", total_inserted, t_loaded)
+    print(f"✅ Done. Inserted total: {total_inserted} docs.")
 
-    if records:
-        coll.insert_many(records, ordered=False)
-        total_inserted += len(records)
-        print(f"...inserted {len(records)} docs (running total: {total_inserted})")
 
-print(f"✅ Done. Inserted total: {total_inserted} docs.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()